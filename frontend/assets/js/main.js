@@ -17,7 +17,7 @@ import { showToast, preventDuplicateClick, adjustTextareaHeight, parseMarkdown }
 class SmartIdeologyApp {
     constructor() {
         this.componentLoader = new ComponentLoader();
-        this.modalManager = new ModalManager();
+        this.modalManager = new ModalManager(this.componentLoader);
         this.loadingManager = new LoadingManager();
         this.agentServices = new AgentServices();
         this.isInitialized = false;
@@ -123,8 +123,7 @@ class SmartIdeologyApp {
      */
     async loadAgentTemplates() {
         try {
-            const response = await fetch('agent-templates.html');
-            const templateHtml = await response.text();
+            const templateHtml = await this.componentLoader.fetchTemplate('agent-templates.html');
 
             // 创建临时div来解析模板
             const tempDiv = document.createElement('div');
@@ -144,6 +143,10 @@ class SmartIdeologyApp {
      * 打开智能体弹窗（全局函数）
      */
     openAgent(agentType) {
+        if (agentType === 'policy') {
+            // 弹窗重新打开时是新的对话
+            this.agentServices.resetPolicySession();
+        }
         return this.modalManager.openAgent(agentType);
     }
 
@@ -786,16 +789,20 @@ class SmartIdeologyApp {
             musicPreview.style.display = 'block';
 
             // 设置自定义播放器
-            this.setupCustomAudioPlayer(data.music_url, data.audio_captions);
+            this.setupCustomAudioPlayer(data.music_url, data.captions_url);
         }
     }
 
     /**
      * 设置自定义音频播放器
      * @param {string} audioUrl - 音频URL
-     * @param {Object} audioCaptions - 歌词数据
+     * @param {string} captionsUrl - 歌词地址
      */
-    setupCustomAudioPlayer(audioUrl, audioCaptions) {
+    setupCustomAudioPlayer(audioUrl, captionsUrl) {
+        // 歌词与音频并行加载
+        const captionsPromise = captionsUrl
+            ? fetch(captionsUrl).then(response => response.ok ? response.json() : null).catch(() => null)
+            : Promise.resolve(null);
         const audio = document.getElementById('music-audio-element');
         const playPauseBtn = document.getElementById('play-pause-btn');
         const playIcon = document.getElementById('play-icon');
@@ -1010,13 +1017,15 @@ class SmartIdeologyApp {
             }
 
             // 处理和显示歌词
-            if (audioCaptions) {
-                this.displayLyrics(audioCaptions);
-                const lyricsContainer = document.getElementById('lyrics-container');
-                if (lyricsContainer) {
-                    lyricsContainer.style.display = 'block';
+            captionsPromise.then(captions => {
+                if (captions) {
+                    this.displayLyrics(captions);
+                    const lyricsContainer = document.getElementById('lyrics-container');
+                    if (lyricsContainer) {
+                        lyricsContainer.style.display = 'block';
+                    }
                 }
-            }
+            });
         });
 
         // 音频加载错误处理
@@ -1033,14 +1042,13 @@ class SmartIdeologyApp {
 
     /**
      * 显示歌词
-     * @param {Object} audioCaptions - 歌词数据
+     * @param {Object} captionsData - 列式歌词数据，lines 中按列存放每行的开始、结束时间和文本
      */
-    displayLyrics(audioCaptions) {
+    displayLyrics(captionsData) {
         try {
-            // 解析歌词数据
-            const captionsData = typeof audioCaptions === 'string' ? JSON.parse(audioCaptions) : audioCaptions;
+            const lines = captionsData.lines;
 
-            if (captionsData.utterances && captionsData.utterances.length > 0) {
+            if (lines && lines.text.length > 0) {
                 const lyricsContent = document.getElementById('lyrics-content');
                 if (!lyricsContent) return;
 
@@ -1048,14 +1056,13 @@ class SmartIdeologyApp {
                 const lyricsLines = [];
                 const lyricsMap = [];
 
-                captionsData.utterances.forEach((utterance, originalIndex) => {
-                    const text = utterance.text || '';
+                lines.text.forEach((text, originalIndex) => {
                     // 过滤掉方括号中的音乐标记
                     if (text && !text.match(/^\[.*\]$/)) {
                         lyricsLines.push({
                             text: text,
-                            startTime: utterance.start_time || utterance.startTime,
-                            endTime: utterance.end_time || utterance.endTime,
+                            startTime: lines.start[originalIndex],
+                            endTime: lines.end[originalIndex],
                             originalIndex: originalIndex
                         });
                     }
@@ -1111,15 +1118,20 @@ class SmartIdeologyApp {
         audioElement.addEventListener('timeupdate', function() {
             const currentTime = this.currentTime * 1000; // 转换为毫秒
 
-            // 找到当前应该高亮的歌词
-            let activeIndex = -1;
-            for (let i = lyricsLines.length - 1; i >= 0; i--) {
-                const lyric = lyricsLines[i];
-                if (lyric.startTime <= currentTime && currentTime <= lyric.endTime) {
-                    activeIndex = i;
-                    break;
+            // 二分查找最后一行开始时间不晚于当前时间的歌词，歌词按开始时间排列
+            let low = 0, high = lyricsLines.length - 1, activeIndex = -1;
+            while (low <= high) {
+                const mid = (low + high) >> 1;
+                if (lyricsLines[mid].startTime <= currentTime) {
+                    activeIndex = mid;
+                    low = mid + 1;
+                } else {
+                    high = mid - 1;
                 }
             }
+            if (activeIndex >= 0 && currentTime > lyricsLines[activeIndex].endTime) {
+                activeIndex = -1;
+            }
 
             // 更新歌词高亮
             const lyricLines_dom = document.querySelectorAll('.lyric-line');
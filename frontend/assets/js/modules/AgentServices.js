@@ -7,6 +7,15 @@ import { showToast } from '../utils/helpers.js';
 export class AgentServices {
     constructor() {
         this.baseURL = CONSTANTS.API_BASE_URL;
+        // 政策问答的服务端会话id，由 X-Session-Id 响应头返回
+        this.policySessionId = null;
+    }
+
+    /**
+     * 开始新的政策问答对话
+     */
+    resetPolicySession() {
+        this.policySessionId = null;
     }
 
     /**
@@ -44,26 +53,23 @@ export class AgentServices {
     /**
      * 政策智能问答
      * @param {string} message - 用户消息
-     * @param {Array} contextMessages - 上下文消息
+     * @param {Array} contextMessages - 上下文消息，只在建立新会话时上传
      * @param {Function} onMessage - 消息回调函数
      * @param {Function} onError - 错误回调函数
      */
     async sendPolicyMessage(message, contextMessages, onMessage, onError) {
         try {
-            const response = await fetch(this.baseURL + '/policy_agent/ask', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    user_input: message,
-                    context_messages: contextMessages
-                })
-            });
+            let response = await this.askPolicy(message, contextMessages);
+            if (response.status === 404 && this.policySessionId) {
+                // 会话已过期，用页面上的对话历史建立新会话
+                this.policySessionId = null;
+                response = await this.askPolicy(message, contextMessages);
+            }
 
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
+            this.policySessionId = response.headers.get('X-Session-Id') || this.policySessionId;
 
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
@@ -131,6 +137,24 @@ export class AgentServices {
         }
     }
 
+    /**
+     * 发送政策问答请求，已有会话时只上传新消息
+     * @param {string} message - 用户消息
+     * @param {Array} contextMessages - 上下文消息
+     */
+    askPolicy(message, contextMessages) {
+        const body = this.policySessionId
+            ? { user_input: message, session_id: this.policySessionId }
+            : { user_input: message, context_messages: contextMessages };
+        return fetch(this.baseURL + '/policy_agent/ask', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(body)
+        });
+    }
+
     /**
      * 生成组织生活方案
      * @param {Object} params - 参数对象
@@ -33,8 +33,7 @@ export class ComponentLoader {
         }
 
         try {
-            const response = await fetch(this.basePath + component.template);
-            const html = await response.text();
+            const html = await this.fetchTemplate(this.basePath + component.template);
             this.templates[name] = html;
 
             // 插入到DOM
@@ -52,6 +51,19 @@ export class ComponentLoader {
         }
     }
 
+    /**
+     * 读取模板，优先使用服务端构建时内联到页面中的 <template>
+     * @param {string} path - 模板路径
+     */
+    async fetchTemplate(path) {
+        const inlined = document.querySelector(`template[data-path="${path.replace(/^\//, '')}"]`);
+        if (inlined) {
+            return inlined.innerHTML;
+        }
+        const response = await fetch(path);
+        return await response.text();
+    }
+
     /**
      * 加载所有组件
      */
@@ -2,7 +2,11 @@
  * 模态框管理器
  */
 export class ModalManager {
-    constructor() {
+    /**
+     * @param {ComponentLoader} componentLoader - 用于读取智能体模板
+     */
+    constructor(componentLoader) {
+        this.componentLoader = componentLoader;
         this.currentAgent = null;
         this.isModalOpen = false;
         this.init();
@@ -51,15 +55,7 @@ export class ModalManager {
 
         // 加载对应的模板内容
         try {
-            const response = await fetch('agent-templates.html');
-            const templateHtml = await response.text();
-
-            // 创建临时div来解析模板
-            const tempDiv = document.createElement('div');
-            tempDiv.innerHTML = templateHtml;
-
-            // 查找对应的模板
-            const template = tempDiv.querySelector(`#${agentType}-template`);
+            const template = await this.findTemplate(agentType);
             if (template) {
                 modalBody.innerHTML = template.innerHTML;
             } else {
@@ -79,6 +75,23 @@ export class ModalManager {
         document.body.style.overflow = 'hidden';
     }
 
+    /**
+     * 查找智能体模板，页面初始化时已放入隐藏容器中，尚未放入时再读取模板文件
+     * @param {string} agentType - 智能体类型
+     */
+    async findTemplate(agentType) {
+        const template = document.getElementById(`${agentType}-template`);
+        if (template) {
+            return template;
+        }
+        const templateHtml = await this.componentLoader.fetchTemplate('agent-templates.html');
+
+        // 创建临时div来解析模板
+        const tempDiv = document.createElement('div');
+        tempDiv.innerHTML = templateHtml;
+        return tempDiv.querySelector(`#${agentType}-template`);
+    }
+
     /**
      * 关闭弹窗
      */
@@ -6,6 +6,7 @@ let isModalOpen = false;
 const baseURL = ''; // 基础URL，根据部署环境配置
 let userScrolledUp = false; // 用户是否向上滚动
 let lastScrollTop = 0; // 记录上次滚动位置
+let policySessionId = null; // 政策问答的服务端会话id，由 X-Session-Id 响应头返回
 
 // 页面加载完成后的初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -70,8 +71,9 @@ document.addEventListener('DOMContentLoaded', function() {
 // 加载智能体模板
 async function loadAgentTemplates() {
     try {
-        const response = await fetch('agent-templates.html');
-        const templateHtml = await response.text();
+        // 服务端构建时已内联到页面中的直接使用
+        const inlined = document.querySelector('template[data-path="agent-templates.html"]');
+        const templateHtml = inlined ? inlined.innerHTML : await (await fetch('agent-templates.html')).text();
 
         // 创建临时div来解析模板
         const tempDiv = document.createElement('div');
@@ -89,6 +91,10 @@ async function loadAgentTemplates() {
 // 打开智能体弹窗
 function openAgent(agentType) {
     currentAgent = agentType;
+    if (agentType === 'policy') {
+        // 弹窗重新打开时是新的对话
+        policySessionId = null;
+    }
     const modal = document.getElementById('agentModal');
     const modalTitle = document.getElementById('modalTitle');
     const modalBody = document.getElementById('modalBody');
@@ -466,6 +472,20 @@ function smartScrollToBottom(container) {
     }
 }
 
+// 发送政策问答请求，已有会话时只上传新消息，对话历史只在建立新会话时上传
+function askPolicy(message, context_messages) {
+    const requestData = policySessionId
+        ? { user_input: message, session_id: policySessionId }
+        : { user_input: message, context_messages: context_messages };
+    return fetch(baseURL + '/policy_agent/ask', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(requestData)
+    });
+}
+
 // 政策智能问答功能
 async function sendPolicyMessage() {
     const input = document.getElementById('policy-input');
@@ -562,24 +582,18 @@ async function sendPolicyMessage() {
 
         messages.addEventListener('scroll', handleUserScroll, { passive: true });
 
-        // 准备请求数据
-        const requestData = {
-            user_input: message,
-            context_messages: context_messages
-        };
-
         // 发送流式请求
-        const response = await fetch(baseURL + '/policy_agent/ask', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(requestData)
-        });
+        let response = await askPolicy(message, context_messages);
+        if (response.status === 404 && policySessionId) {
+            // 会话已过期，用页面上的对话历史建立新会话
+            policySessionId = null;
+            response = await askPolicy(message, context_messages);
+        }
 
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
+        policySessionId = response.headers.get('X-Session-Id') || policySessionId;
 
         const reader = response.body.getReader();
         const decoder = new TextDecoder();
@@ -1001,7 +1015,7 @@ async function generateMusic() {
                 musicPreview.style.display = 'block';
 
                 // 直接显示本地缓存的音频和歌词
-                displayLocalCachedAudio(data.music_url, data.audio_captions);
+                displayLocalCachedAudio(data.music_url, data.captions_url);
             }
 
             // 显示成功提示（非阻塞式，屏幕正中间）
@@ -1045,7 +1059,7 @@ async function generateMusic() {
 }
 
 // 显示本地缓存的音频（后端已处理缓存）
-function displayLocalCachedAudio(audioUrl, audioCaptions) {
+function displayLocalCachedAudio(audioUrl, captionsUrl) {
     console.log('显示本地缓存的音频:', audioUrl);
 
     // 更新UI显示音频播放器
@@ -1072,10 +1086,17 @@ function displayLocalCachedAudio(audioUrl, audioCaptions) {
         cacheStatusDiv.fontWeight = 'bold';
     }
 
-    // 处理和显示歌词
-    if (audioCaptions && lyricsContainer) {
-        displayLyrics(audioCaptions);
-        lyricsContainer.style.display = 'block';
+    // 处理和显示歌词（歌词单独请求）
+    if (captionsUrl && lyricsContainer) {
+        fetch(captionsUrl)
+            .then(response => response.ok ? response.json() : null)
+            .then(captions => {
+                if (captions) {
+                    displayLyrics(captions);
+                    lyricsContainer.style.display = 'block';
+                }
+            })
+            .catch(error => console.error('加载歌词失败:', error));
     }
 
     // 显示加载成功提示
@@ -1303,12 +1324,12 @@ function setupCustomAudioPlayer() {
 }
 
 // 显示歌词
-function displayLyrics(audioCaptions) {
+function displayLyrics(captionsData) {
     try {
-        // 解析歌词数据
-        const captionsData = typeof audioCaptions === 'string' ? JSON.parse(audioCaptions) : audioCaptions;
+        // 列式歌词数据，lines 中按列存放每行的开始、结束时间和文本
+        const lines = captionsData.lines;
 
-        if (captionsData.utterances && captionsData.utterances.length > 0) {
+        if (lines && lines.text.length > 0) {
             const lyricsContent = document.getElementById('lyrics-content');
             if (!lyricsContent) return;
 
@@ -1317,14 +1338,13 @@ function displayLyrics(audioCaptions) {
             const lyricsLines = [];
             const lyricsMap = []; // 存储歌词行在原始utterances中的索引
 
-            captionsData.utterances.forEach((utterance, originalIndex) => {
-                const text = utterance.text || '';
+            lines.text.forEach((text, originalIndex) => {
                 // 过滤掉方括号中的音乐标记
                 if (text && !text.match(/^\[.*\]$/)) {
                     lyricsLines.push({
                         text: text,
-                        startTime: utterance.start_time || utterance.startTime,
-                        endTime: utterance.end_time || utterance.endTime,
+                        startTime: lines.start[originalIndex],
+                        endTime: lines.end[originalIndex],
                         originalIndex: originalIndex
                     });
                 }
@@ -1 +1 @@
-git pull && uv sync && uv run uvicorn src.main:app --port 8002 --host 0.0.0.0
\ No newline at end of file
+git pull && uv sync && uv run python -m src.main
\ No newline at end of file
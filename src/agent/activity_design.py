@@ -1,20 +1,139 @@
-from langchain_openai import ChatOpenAI
-from src.conf.env import settings
-from src.agent.prompt import activity_design_prompt_template
+import logging
+from collections.abc import AsyncIterator
+from src.agent.llm_pool import llm_registry
+from src.agent.prefix_cache import prefix_cache
+from src.agent.resilience import ResilientStreamer
+from src.agent.prompt import activity_design_prompt_template, activity_design_retrieval_prompt_template, activity_design_system_prompt
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers.json import JsonOutputParser
-from src.utils import constant
+from pydantic import ValidationError
+from src.conf.env import settings
+from src.utils.admission import Priority, ark_limiter
+from src.utils.redis_client import get_redis
+from src.utils.result_cache import ResultCache, make_key, normalize_text
+from src.utils.single_flight import SingleFlight
+from src.utils.knowledge.chunking import content_hash, split_sections
+from src.utils.knowledge.embedding import Embedder
+from src.utils.knowledge.hybrid import HybridRetriever
 from src.model.activity import ActivityDesignInput, ActivityDesignOutput
+from src.model.knowledge import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+activity_design_cache = ResultCache(
+    "activity_design",
+    ttl=settings.ACTIVITY_CACHE_TTL,
+    maxsize=settings.ACTIVITY_CACHE_SIZE,
+    redis=get_redis(),
+)
+# 合并同时到达的相同活动设计请求
+activity_design_flight = SingleFlight("activity_design", cumulative=True)
+activity_streamer = ResilientStreamer("activity_design", limiter=ark_limiter, priority=Priority.ACTIVITY)
+
+
+def build_section_retriever() -> HybridRetriever:
+    """把三会一课制度按小节建立检索索引，第一个小节是总述"""
+    chunks = [
+        DocumentChunk(doc_id="三会一课", title="太原理工大学“三会一课”制度", position=index, content=section, content_hash=content_hash(section))
+        for index, section in enumerate(split_sections(activity_design_system_prompt))
+    ]
+    return HybridRetriever(chunks, Embedder(), embed_timeout=settings.ACTIVITY_RETRIEVAL_EMBED_TIMEOUT)
+
+
+_section_retriever: HybridRetriever | None = None
+
+
+def get_section_retriever() -> HybridRetriever:
+    """第一次使用时才切分制度全文、建立索引，全文模式和只导入模块时不需要"""
+    global _section_retriever
+    if _section_retriever is None:
+        _section_retriever = build_section_retriever()
+    return _section_retriever
+
+
+def activity_cache_key(user_input: ActivityDesignInput) -> str:
+    # 两种提示词生成的结果不同，切换模式后不使用另一种模式缓存的结果
+    return make_key(
+        normalize_text(user_input.theme), user_input.minute, normalize_text(user_input.participant), settings.ACTIVITY_PROMPT_MODE
+    )
 
 
 class ActivityDesignAgent:
     def __init__(self):
-        self.llm =ChatOpenAI(temperature=0.2, model="kimi-k2-250905", base_url=constant.VE_BASE_URL, api_key=settings.VE_KEY)
+        self.llm = llm_registry.get(temperature=0.2)
+        self.model_name = getattr(self.llm, "model_name", "")
+
+    async def generate(self, user_input: ActivityDesignInput, use_cache: bool = True):
+        key = activity_cache_key(user_input)
+        if use_cache:
+            cached = await activity_design_cache.get(key)
+            if cached is not None:
+                try:
+                    return self._replay(ActivityDesignOutput.model_validate_json(cached))
+                except ValueError as e:
+                    # 旧版本写入或损坏的缓存，删除后按未命中重新生成
+                    logger.warning(f"活动方案缓存无法解析，已删除: {str(e)}")
+                    await activity_design_cache.delete(key)
 
-    async def generate(self, user_input: ActivityDesignInput):
+            # 相同参数的请求正在生成时加入同一个流，不再单独调用大模型
+            return await activity_design_flight.stream(key, lambda: self._open(key, user_input))
+        return await self._open(key, user_input)
+
+    async def _open(self, key: str, user_input: ActivityDesignInput) -> AsyncIterator[dict]:
         parser = JsonOutputParser(pydantic_object=ActivityDesignOutput)
-        chain = self.llm | parser
-        stream = chain.astream(activity_design_prompt_template.format(theme=user_input.theme, minute=user_input.minute, participant=user_input.participant))
-        return stream
+        messages = await self.build_messages(user_input)
+        if settings.ACTIVITY_PROMPT_MODE == "full":
+            # 第一条是固定的三会一课制度说明，作为上游上下文缓存的前缀
+            stream = await activity_streamer.open(
+                lambda: prefix_cache.astream(self.llm, messages[:1], messages[1:]), self.model_name
+            )
+        else:
+            stream = await activity_streamer.open(lambda: prefix_cache.astream(self.llm, [], messages), self.model_name)
+        return self._store(key, parser.atransform(stream))
+
+    @staticmethod
+    async def build_messages(user_input: ActivityDesignInput, mode: str = settings.ACTIVITY_PROMPT_MODE) -> list[BaseMessage]:
+        """
+        组装提示词
+
+        Args:
+            user_input: 活动设计参数
+            mode: full 放入三会一课制度全文；retrieval 只放入总述和与主题、参与对象最相关的小节
+        """
+        variables = {"theme": user_input.theme, "minute": user_input.minute, "participant": user_input.participant}
+        if mode == "full":
+            return activity_design_prompt_template.format_messages(**variables)
+        retriever = get_section_retriever()
+        results = await retriever.search(f"{user_input.theme} {user_input.participant}", settings.ACTIVITY_RETRIEVAL_TOP_K + 1)
+        chunks = [result.chunk for result in results if result.chunk.position != 0][:settings.ACTIVITY_RETRIEVAL_TOP_K]
+        chunks = [retriever.chunks[0]] + sorted(chunks, key=lambda chunk: chunk.position)
+        sections = "\n\n".join(chunk.content for chunk in chunks)
+        return activity_design_retrieval_prompt_template.format_messages(sections=sections, **variables)
+
+    @staticmethod
+    async def _replay(output: ActivityDesignOutput) -> AsyncIterator[dict]:
+        # 缓存命中时一次性返回完整结果，与流式输出的最后一个分块相同
+        yield output.model_dump()
+
+    @staticmethod
+    async def _store(key: str, stream: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        # 流正常结束且结果完整时才写入缓存；输出被截断时解析器同样正常结束，只是缺少字段
+        last_chunk = None
+        async for chunk in stream:
+            last_chunk = chunk
+            yield chunk
+        if last_chunk is None:
+            return
+        try:
+            output = ActivityDesignOutput.model_validate(last_chunk)
+        except ValidationError as e:
+            logger.warning(f"活动方案格式不正确，不写入缓存: {str(e)}")
+            return
+        missing = [name for name in ActivityDesignOutput.model_fields if not last_chunk.get(name)]
+        if missing:
+            logger.warning(f"活动方案不完整，缺少{'、'.join(missing)}，不写入缓存")
+            return
+        await activity_design_cache.set(key, output.model_dump_json())
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字和全角符号大约一个字一个 token，其余字符按四个一个 token 估算
+_WIDE_CHARS = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "以下是本次对话早期内容的摘要，回答时可作为背景参考：\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """不依赖分词器的 token 数估算，偏保守"""
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def render_dialogue(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{'助手' if isinstance(message, AIMessage) else '用户'}：{message.content}" for message in messages)
+
+
+@dataclass
+class ContextStats:
+    """一次请求的上下文裁剪结果"""
+    original_tokens: int
+    sent_tokens: int
+    kept_messages: int
+    folded_messages: int
+    summarized_messages: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.sent_tokens
+
+
+class ContextWindow:
+    """
+    按 token 预算裁剪对话历史
+
+    从最新的消息往前保留，直到用完预算；更早的消息折叠成一段摘要放在前面。
+    摘要在后台生成，不阻塞当前请求：本次请求使用已有的、覆盖最长前缀的摘要，
+    尚未被摘要覆盖的早期消息这一轮先丢弃，下一轮即可用上新摘要。
+    摘要按历史前缀的滚动哈希缓存，新摘要在旧摘要基础上增量合并，多轮之间复用。
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str, str], Awaitable[str]],
+        budget: int,
+        min_recent: int,
+        cache_size: int,
+    ):
+        """
+        Args:
+            summarize: 摘要函数，参数为 (已有摘要, 新增对话文本)，返回新摘要
+            budget: 原样保留的历史消息 token 预算，不含摘要
+            min_recent: 无论预算多少都原样保留的最近消息条数
+            cache_size: 进程内缓存的摘要条目上限
+        """
+        self.summarize = summarize
+        self.budget = budget
+        self.min_recent = min_recent
+        self.cache_size = cache_size
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        self._pending: dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.original_tokens = 0
+        self.sent_tokens = 0
+        self.summaries_generated = 0
+        self.summary_failures = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.sent_tokens
+
+    def build(self, history: list[BaseMessage], keep_from: int | None = None) -> tuple[list[BaseMessage], ContextStats]:
+        """
+        裁剪历史消息
+
+        Args:
+            history: 完整的历史消息
+            keep_from: 上一轮的折叠位置（服务端会话中保存）。剩余消息仍在预算内时沿用，
+                使发送给模型的消息前缀保持不变以命中上游前缀缓存；超出时重新折叠到预算的一半，
+                留出后续几轮的增长空间
+
+        Returns:
+            tuple: (发送给模型的历史消息, 本次裁剪统计)，新的折叠位置为 stats.folded_messages
+        """
+        tokens = [message_tokens(message) for message in history]
+        if keep_from is None or keep_from > len(history) or sum(tokens[keep_from:]) > self.budget:
+            budget = self.budget if keep_from is None else self.budget // 2
+            keep_from = self._fold_point(tokens, budget)
+
+        folded = history[:keep_from]
+        messages = history[keep_from:]
+        summarized = 0
+        if folded:
+            digests = self._prefix_digests(folded)
+            summary, summarized = self._lookup(digests)
+            if summarized < len(folded):
+                self._schedule(digests[-1], summary, folded[summarized:])
+            if summary:
+                messages = [SystemMessage(content=SUMMARY_HEADER + summary)] + messages
+
+        stats = ContextStats(
+            original_tokens=sum(tokens),
+            sent_tokens=sum(message_tokens(message) for message in messages),
+            kept_messages=len(history) - keep_from,
+            folded_messages=keep_from,
+            summarized_messages=summarized,
+        )
+        self.requests += 1
+        self.original_tokens += stats.original_tokens
+        self.sent_tokens += stats.sent_tokens
+        if folded:
+            logger.info(
+                f"对话历史裁剪: {stats.original_tokens} -> {stats.sent_tokens} tokens, "
+                f"节省 {stats.saved_tokens}, 折叠 {stats.folded_messages} 条（摘要覆盖 {summarized} 条）"
+            )
+        return messages, stats
+
+    def _fold_point(self, tokens: list[int], budget: int) -> int:
+        """从最新的消息往前保留，返回第一条保留消息的下标"""
+        keep_from = len(tokens)
+        used = 0
+        while keep_from > 0:
+            cost = tokens[keep_from - 1]
+            if len(tokens) - keep_from >= self.min_recent and used + cost > budget:
+                break
+            used += cost
+            keep_from -= 1
+        return keep_from
+
+    @staticmethod
+    def _prefix_digests(messages: list[BaseMessage]) -> list[str]:
+        """每个前缀的滚动哈希，digests[i] 对应 messages[:i + 1]"""
+        digests = []
+        digest = b""
+        for message in messages:
+            role = b"a" if isinstance(message, AIMessage) else b"u"
+            digest = hashlib.sha256(digest + role + message.content.encode("utf-8")).digest()
+            digests.append(digest.hex())
+        return digests
+
+    def _lookup(self, digests: list[str]) -> tuple[str, int]:
+        """查找覆盖最长前缀的摘要，返回 (摘要, 覆盖的消息条数)"""
+        for index in range(len(digests) - 1, -1, -1):
+            summary = self._summaries.get(digests[index])
+            if summary is not None:
+                self._summaries.move_to_end(digests[index])
+                return summary, index + 1
+        return "", 0
+
+    def _schedule(self, digest: str, summary: str, messages: list[BaseMessage]):
+        if digest in self._pending:
+            return
+        task = asyncio.create_task(self._summarize(digest, summary, render_dialogue(messages)))
+        self._pending[digest] = task
+        task.add_done_callback(lambda _: self._pending.pop(digest, None))
+
+    async def _summarize(self, digest: str, summary: str, dialogue: str):
+        try:
+            new_summary = (await self.summarize(summary or "（无）", dialogue)).strip()
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"生成对话摘要失败: {str(e)}")
+            return
+        if not new_summary:
+            return
+        self.summaries_generated += 1
+        self._summaries[digest] = new_summary
+        self._summaries.move_to_end(digest)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    async def aclose(self):
+        """取消尚未完成的摘要任务"""
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
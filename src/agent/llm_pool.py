@@ -0,0 +1,130 @@
+import logging
+import importlib.util
+import time
+
+import httpx
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
+
+from src.conf.env import settings
+from src.utils import constant
+from src.utils.metrics import upstream_request_duration
+
+logger = logging.getLogger(__name__)
+
+
+async def _mark_start(request: httpx.Request):
+    request.extensions["started_at"] = time.perf_counter()
+
+
+async def _observe_latency(response: httpx.Response):
+    request = response.request
+    started_at = request.extensions.get("started_at")
+    if started_at is not None:
+        # 按接口路径区分，如 chat/completions、context/create、embeddings
+        operation = request.url.path.partition("/api/v3/")[2] or request.url.path
+        upstream_request_duration.observe(time.perf_counter() - started_at, "ark", operation)
+
+
+class LLMClientRegistry:
+    """
+    进程级的大模型客户端注册表
+
+    按 (base_url, model, temperature) 复用 ChatOpenAI 实例，每个配置共享一个
+    保持长连接的 httpx 连接池，避免每次请求重新握手。
+    生命周期跟随 FastAPI 的 lifespan，关闭时统一释放连接。
+    """
+
+    def __init__(
+        self,
+        max_connections: int = settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = settings.LLM_KEEPALIVE_EXPIRY,
+        http2: bool = settings.LLM_HTTP2,
+        timeout: float = settings.LLM_TIMEOUT,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # HTTP/2 依赖 h2 包（pip install "httpx[http2]"），启用了但未安装时退回 HTTP/1.1
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("LLM_HTTP2已启用但未安装h2，大模型客户端退回HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.timeout = timeout
+        self._clients: dict[tuple[str, str, float], ChatOpenAI] = {}
+        self._openai_clients: dict[str, AsyncOpenAI] = {}
+        # (base_url, 连接池)
+        self._http_clients: list[tuple[str, httpx.AsyncClient]] = []
+
+    def _http_client(self, base_url: str) -> httpx.AsyncClient:
+        http_client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            event_hooks={"request": [_mark_start], "response": [_observe_latency]},
+        )
+        self._http_clients.append((base_url, http_client))
+        return http_client
+
+    def get(
+        self,
+        model: str = constant.VE_LLM_MODEL,
+        temperature: float = 1.0,
+        base_url: str = settings.VE_BASE_URL,
+        api_key: str | None = None,
+    ) -> ChatOpenAI:
+        """获取 (base_url, model, temperature) 对应的共享 ChatOpenAI 实例"""
+        key = (base_url, model, temperature)
+        llm = self._clients.get(key)
+        if llm is None:
+            http_client = self._http_client(base_url)
+            llm = ChatOpenAI(
+                temperature=temperature,
+                model=model,
+                base_url=base_url,
+                api_key=api_key or settings.VE_KEY,
+                http_async_client=http_client,
+                # 流式响应的最后一个分块带上 usage，用于统计缓存命中的 token
+                stream_usage=True,
+                # 重试由 resilience 统一处理，限流由准入控制处理，不使用客户端内置的重试
+                max_retries=0,
+            )
+            self._clients[key] = llm
+            logger.info(f"创建大模型连接池: {key}")
+        return llm
+
+    def get_openai_client(self, base_url: str = settings.VE_BASE_URL, api_key: str | None = None) -> AsyncOpenAI:
+        """获取 base_url 对应的共享 OpenAI 客户端，用于向量化等非对话接口"""
+        client = self._openai_clients.get(base_url)
+        if client is None:
+            http_client = self._http_client(base_url)
+            client = AsyncOpenAI(base_url=base_url, api_key=api_key or settings.VE_KEY, http_client=http_client)
+            self._openai_clients[base_url] = client
+            logger.info(f"创建OpenAI客户端连接池: {base_url}")
+        return client
+
+    async def connect(self):
+        """
+        预先与各客户端的上游建立连接并留在连接池中，第一个请求不再等待 TCP/TLS 握手
+
+        只为建立连接，响应状态码（如未授权、不存在）不影响结果；连接失败只记录日志。
+        """
+        for base_url, http_client in self._http_clients:
+            try:
+                await http_client.get(f"{base_url.rstrip('/')}/models")
+            except httpx.HTTPError as e:
+                logger.warning(f"预先连接 {base_url} 失败: {str(e)}")
+
+    async def aclose(self):
+        """关闭所有连接池"""
+        for _, http_client in self._http_clients:
+            await http_client.aclose()
+        self._http_clients.clear()
+        self._clients.clear()
+        self._openai_clients.clear()
+
+
+llm_registry = LLMClientRegistry()
@@ -1,19 +1,58 @@
-from langchain_openai import ChatOpenAI
+from src.agent.context_window import ContextWindow, ContextStats
+from src.agent.llm_pool import llm_registry
+from src.agent.prefix_cache import prefix_cache
+from src.agent.resilience import ResilientStreamer, retry_transient
+from src.agent.prompt import policy_qa_system_prompt, policy_qa_summary_prompt_template
 from src.conf.env import settings
-from src.agent.prompt import policy_qa_system_prompt
 from datetime import datetime
 from langchain_core.messages import ChatMessage, HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_core.output_parsers.json import JsonOutputParser
-from src.utils import constant
-from src.model.policy import PolicyQaMessage
+from src.utils.admission import Priority, ark_limiter
+from src.model.policy import PolicyQaMessage, PolicySession
+from src.utils.redis_client import get_redis
+from src.utils.session_store import PolicySessionStore
+
+
+async def summarize_history(summary: str, dialogue: str) -> str:
+    """把早期对话合并进已有摘要"""
+    llm = llm_registry.get(temperature=0.3)
+    messages = policy_qa_summary_prompt_template.format_messages(
+        summary=summary, dialogue=dialogue, max_chars=settings.POLICY_SUMMARY_MAX_CHARS
+    )
+    result = await ark_limiter.call(Priority.BACKGROUND, lambda: retry_transient(lambda: llm.ainvoke(messages)))
+    return result.content
+
+
+policy_context_window = ContextWindow(
+    summarize=summarize_history,
+    budget=settings.POLICY_CONTEXT_BUDGET,
+    min_recent=settings.POLICY_CONTEXT_MIN_RECENT,
+    cache_size=settings.POLICY_SUMMARY_CACHE_SIZE,
+)
+
+policy_streamer = ResilientStreamer("policy_qa", limiter=ark_limiter, priority=Priority.CHAT)
+
+policy_session_store = PolicySessionStore(
+    ttl=settings.POLICY_SESSION_TTL,
+    max_bytes=settings.POLICY_SESSION_CACHE_BYTES,
+    session_max_bytes=settings.POLICY_SESSION_MAX_BYTES,
+    redis=get_redis(),
+)
 
 
 class PolicyAgent:
     def __init__(self):
-        self.llm =ChatOpenAI(temperature=1.0, model="kimi-k2-250905", base_url=constant.VE_BASE_URL, api_key=settings.VE_KEY)
+        self.llm = llm_registry.get(temperature=1.0)
+        self.model_name = getattr(self.llm, "model_name", "")
+        self.context_stats: ContextStats | None = None
 
-    async def ask(self, user_input: str, context_messages: list[PolicyQaMessage] | None = None):
-        processed_messages: list[BaseMessage] = [SystemMessage(content=policy_qa_system_prompt)]
+    async def ask(
+        self,
+        user_input: str,
+        context_messages: list[PolicyQaMessage] | None = None,
+        context_start: int | None = None,
+    ):
+        processed_messages: list[BaseMessage] = []
         context_messages = context_messages or []
         # process ChatMessage
         def convert_to_chat_message(message: PolicyQaMessage):
@@ -23,10 +62,34 @@ class PolicyAgent:
                 return HumanMessage(content=message.content)
             else:
                 raise ValueError(f"Unknown role: {message.role}")
-        processed_messages += [convert_to_chat_message(message) for message in context_messages]
+        history = [convert_to_chat_message(message) for message in context_messages]
+        # 超出预算的早期对话折叠为摘要
+        history, self.context_stats = policy_context_window.build(history, context_start)
+        processed_messages += history
         processed_messages.append(HumanMessage(content=user_input))
-        stream = self.llm.astream(processed_messages)
-        return stream
+        # 系统提示词固定不变，作为上游上下文缓存的前缀
+        system_message = SystemMessage(content=policy_qa_system_prompt)
+        return await policy_streamer.open(
+            lambda: prefix_cache.astream(self.llm, [system_message], processed_messages), self.model_name
+        )
+
+    async def ask_in_session(self, session: PolicySession, user_input: str):
+        """在服务端会话中提问，回答完整生成后把这一轮对话追加到会话"""
+        stream = await self.ask(user_input, session.messages, session.context_start)
+        session.context_start = self.context_stats.folded_messages
+
+        async def record():
+            answer = []
+            async for chunk in stream:
+                answer.append(chunk.content)
+                yield chunk
+            await policy_session_store.append(
+                session,
+                PolicyQaMessage(role="user", content=user_input),
+                PolicyQaMessage(role="assistant", content="".join(answer)),
+            )
+
+        return record()
 
 if __name__ == "__main__":
     import asyncio
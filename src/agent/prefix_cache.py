@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+import openai
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.messages.utils import convert_to_openai_messages
+from langchain_openai import ChatOpenAI
+
+from src.agent.llm_pool import LLMClientRegistry, llm_registry
+from src.conf.env import settings
+from src.utils.result_cache import make_key
+
+logger = logging.getLogger(__name__)
+
+# 句柄剩余有效期不足 TTL 的这一比例时，在后台提前创建新句柄
+REFRESH_FRACTION = 0.1
+
+
+@dataclass
+class _Handle:
+    context_id: str
+    expires_at: float
+
+
+class PrefixCache:
+    """
+    上游上下文缓存（火山方舟 Context API）管理
+
+    为固定不变的系统提示词前缀在服务端创建上下文缓存，之后的请求只发送前缀之后的消息，
+    前缀部分按缓存命中计费。句柄按 (base_url, model, 前缀内容) 在请求间复用，创建和临近
+    过期时的刷新都在后台进行，不阻塞请求：没有可用句柄时直接发送完整消息。
+    使用句柄的请求在收到第一个分块前失败（句柄过期、模型不支持等）时，透明地退回完整消息重发。
+    同时按上游返回的 usage 统计命中缓存和未命中缓存的 prompt token 数。
+    """
+
+    def __init__(
+        self,
+        registry: LLMClientRegistry = llm_registry,
+        ttl: float = settings.PREFIX_CACHE_TTL,
+        retry_interval: float = settings.PREFIX_CACHE_RETRY_INTERVAL,
+        enabled: bool = settings.PREFIX_CACHE_ENABLED,
+    ):
+        """
+        Args:
+            registry: 大模型客户端注册表，用于获取 Context API 的客户端
+            ttl: 上下文缓存的过期时间（秒）
+            retry_interval: 创建失败后再次尝试的间隔（秒）
+            enabled: 为False时始终发送完整消息，只统计 token
+        """
+        self.registry = registry
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.enabled = enabled
+        self._handles: dict[tuple[str, str, str], _Handle] = {}
+        self._creating: dict[tuple[str, str, str], asyncio.Task] = {}
+        self._retry_at: dict[tuple[str, str, str], float] = {}
+        self.requests = 0
+        self.cached_requests = 0
+        self.fallbacks = 0
+        self.handles_created = 0
+        self.cached_tokens = 0
+        self.uncached_tokens = 0
+
+    async def astream(
+        self,
+        llm: BaseChatModel,
+        prefix: list[BaseMessage],
+        messages: list[BaseMessage],
+    ) -> AsyncIterator[AIMessageChunk]:
+        """
+        流式调用大模型，效果等同于 llm.astream(prefix + messages)
+
+        Args:
+            llm: 大模型客户端，不是 ChatOpenAI 时不使用上下文缓存
+            prefix: 固定不变的前缀消息，为空时不使用上下文缓存
+            messages: 前缀之后的消息
+        """
+        self.requests += 1
+        key = None
+        context_id = None
+        if self.enabled and prefix and isinstance(llm, ChatOpenAI):
+            key = self._key(llm, prefix)
+            context_id = self._lookup(llm, key, prefix)
+
+        if context_id is not None:
+            context_llm = self.registry.get(
+                model=llm.model_name,
+                temperature=llm.temperature,
+                base_url=f"{llm.openai_api_base.rstrip('/')}/context",
+                api_key=llm.openai_api_key.get_secret_value(),
+            ).bind(extra_body={"context_id": context_id})
+            started = False
+            try:
+                async for chunk in context_llm.astream(messages):
+                    started = True
+                    self._record(chunk)
+                    yield chunk
+                self.cached_requests += 1
+                return
+            except openai.APIError as e:
+                # 限流时不退回完整请求，避免加重上游负载
+                if started or isinstance(e, openai.RateLimitError):
+                    raise
+                self.fallbacks += 1
+                # 4xx 说明句柄已失效或不可用，丢弃后由下一次请求重新创建
+                if isinstance(e, openai.APIStatusError) and 400 <= e.status_code < 500:
+                    self._handles.pop(key, None)
+                logger.warning(f"上下文缓存请求失败，退回完整请求: {str(e)}")
+
+        async for chunk in llm.astream(prefix + messages):
+            self._record(chunk)
+            yield chunk
+
+    @staticmethod
+    def _key(llm: ChatOpenAI, prefix: list[BaseMessage]) -> tuple[str, str, str]:
+        return llm.openai_api_base, llm.model_name, make_key(*[(message.type, message.content) for message in prefix])
+
+    def _lookup(self, llm: ChatOpenAI, key: tuple[str, str, str], prefix: list[BaseMessage]) -> str | None:
+        now = time.monotonic()
+        handle = self._handles.get(key)
+        if handle is not None and handle.expires_at <= now:
+            del self._handles[key]
+            handle = None
+        if handle is None or handle.expires_at - now < self.ttl * REFRESH_FRACTION:
+            if key not in self._creating and self._retry_at.get(key, 0) <= now:
+                task = asyncio.create_task(self._create(llm, key, prefix))
+                self._creating[key] = task
+                task.add_done_callback(lambda _: self._creating.pop(key, None))
+        return handle.context_id if handle is not None else None
+
+    async def _create(self, llm: ChatOpenAI, key: tuple[str, str, str], prefix: list[BaseMessage]):
+        try:
+            result = await llm.root_async_client.post(
+                "/context/create",
+                cast_to=object,
+                body={
+                    "model": llm.model_name,
+                    "messages": convert_to_openai_messages(prefix),
+                    "mode": "common_prefix",
+                    "ttl": int(self.ttl),
+                },
+            )
+            context_id = result["id"]
+        except Exception as e:
+            self._retry_at[key] = time.monotonic() + self.retry_interval
+            logger.warning(f"创建上下文缓存失败，{self.retry_interval:.0f}秒内不再尝试: {str(e)}")
+            return
+        self._handles[key] = _Handle(context_id, time.monotonic() + self.ttl)
+        self._retry_at.pop(key, None)
+        self.handles_created += 1
+        logger.info(f"已创建上下文缓存: {context_id} ({llm.model_name})")
+
+    def _record(self, chunk: AIMessageChunk):
+        usage = chunk.usage_metadata
+        if not usage:
+            return
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        self.cached_tokens += cached
+        self.uncached_tokens += usage.get("input_tokens", 0) - cached
+
+    async def aclose(self):
+        """取消正在创建的句柄"""
+        tasks = list(self._creating.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+prefix_cache = PrefixCache()
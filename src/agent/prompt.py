@@ -1,6 +1,6 @@
 import textwrap
 
-from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from textwrap import dedent
 
 music_generate_prompt_generate_prompt_template = ChatPromptTemplate.from_template(dedent("""
@@ -126,7 +126,26 @@ policy_qa_system_prompt = dedent("""
 """).strip()
 
 
-activity_design_prompt_template = ChatPromptTemplate.from_template(textwrap.dedent("""
+policy_qa_summary_prompt_template = ChatPromptTemplate.from_template(dedent("""
+# Task
+你是对话记录整理员。请把“已有摘要”和“新增对话”合并成一份新的摘要，供后续政策问答参考。
+
+# 要求
+- 保留用户关心的问题、涉及的政策文件和关键结论
+- 保留用户的身份、背景等后续回答需要用到的信息
+- 删除寒暄和重复内容，不要编造对话中没有的信息
+- 使用中文，不超过 {max_chars} 字，直接输出摘要正文
+
+# 已有摘要
+{summary}
+
+# 新增对话
+{dialogue}
+""").strip())
+
+
+# 三会一课制度说明与用户输入无关，单独作为系统消息放在最前面，便于上游缓存
+activity_design_system_prompt = textwrap.dedent("""
 # 太原理工大学“三会一课”制度
 “三会”指定期召开支部委员会、党小组会、党员大会，“一课”指按时上好党课。“三会一课”是党组织生活的基本形式，是健全党的生活，严格党员管理，加强党员教育的重要制度，有利于加强支部建设，有利于提高党支部战斗力，凝聚力的重要保障。“三会一课”必须从制度、方法、途径上加以保证。“三会一课”制度的具体要求如下：
 
@@ -187,7 +206,10 @@ activity_design_prompt_template = ChatPromptTemplate.from_template(textwrap.dede
 
 党课教育应把握的五个要点：
 内容新、观点明、重点突出、针对性强、形式灵活。
+""").strip()
+
 
+activity_design_human_prompt = HumanMessagePromptTemplate.from_template(textwrap.dedent("""
 # 用户输入
 ## 关键主题词：{theme}
 ## 活动时长：{minute}分钟
@@ -203,3 +225,19 @@ activity_design_prompt_template = ChatPromptTemplate.from_template(textwrap.dede
 ## 活动流程建议： str[markdown] 活动的具体流程建议，如会议时间、会议地点、会议方式等。
 
 """).strip())
+
+
+activity_design_prompt_template = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(activity_design_system_prompt),
+    activity_design_human_prompt,
+])
+
+
+# 只放入与本次主题、参与对象相关的制度小节，小节由 activity_design_system_prompt 切分得到
+activity_design_retrieval_prompt_template = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(textwrap.dedent("""
+# 太原理工大学“三会一课”制度（与本次活动相关的条目）
+{sections}
+""").strip()),
+    activity_design_human_prompt,
+])
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, TypeVar
+
+import httpx
+import openai
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from src.conf.env import settings
+from src.utils.admission import Lease, Priority, UpstreamLimiter
+from src.utils.metrics import llm_time_to_first_token, llm_tokens_per_second
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 正在后台关闭的落败请求，保留引用避免任务被回收
+_closing: set[asyncio.Task] = set()
+
+# 冷启动时收集到这么多首个分块耗时之后才按分位数计算对冲等待时间
+MIN_SAMPLES = 20
+
+
+class StreamStalled(TimeoutError):
+    """流式响应在中途停止输出"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """连接错误和上游 5xx 可以重试；限流交给准入控制处理"""
+    return isinstance(error, (openai.APIConnectionError, openai.InternalServerError, httpx.TransportError))
+
+
+def retrying(
+    retries: int = settings.LLM_RETRIES,
+    max_wait: float = settings.LLM_RETRY_MAX_WAIT,
+    retry_if: Callable[[BaseException], bool] = is_transient,
+) -> AsyncRetrying:
+    """默认连接错误和 5xx 按随机指数退避重试，retry_if 指定其他可重试的错误"""
+    return AsyncRetrying(
+        stop=stop_after_attempt(retries + 1),
+        wait=wait_random_exponential(multiplier=0.5, max=max_wait),
+        retry=retry_if_exception(retry_if),
+        reraise=True,
+    )
+
+
+async def retry_transient(fn: Callable[[], Awaitable[T]]) -> T:
+    """非流式调用的重试"""
+    async for attempt in retrying():
+        with attempt:
+            return await fn()
+
+
+class ResilientStreamer:
+    """
+    大模型流式调用的容错
+
+    - 对冲：首个分块在最近首个分块耗时的 percentile 分位数内没有到达时，再发起一个相同请求，
+      先产出首个分块的一方胜出，另一方立即取消
+    - 重试：首个分块之前的连接错误和 5xx（两个请求都失败时）按随机指数退避重试
+    - 停滞：开始输出后超过 stall_timeout 没有新分块时中止，不再无限等待
+    - 准入：指定 limiter 时每个上游请求各自占用一个并发名额，对冲请求只在有空闲名额时发起
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter: UpstreamLimiter | None = None,
+        priority: Priority = Priority.CHAT,
+        hedge: bool = settings.LLM_HEDGE_ENABLED,
+        percentile: float = settings.LLM_HEDGE_PERCENTILE,
+        min_delay: float = settings.LLM_HEDGE_MIN_DELAY,
+        max_delay: float = settings.LLM_HEDGE_MAX_DELAY,
+        stall_timeout: float = settings.LLM_STALL_TIMEOUT,
+        window: int = 200,
+    ):
+        """
+        Args:
+            name: 名称，用于日志和指标
+            limiter: 上游的准入控制，为None时不限制
+            priority: 在 limiter 中排队的优先级
+            hedge: 是否发起对冲请求
+            percentile: 对冲等待时间取最近首个分块耗时的该分位数（0-100）
+            min_delay: 对冲等待时间下限（秒）
+            max_delay: 对冲等待时间上限（秒），样本不足时使用
+            stall_timeout: 两个分块之间的最长间隔（秒）
+            window: 参与计算分位数的最近样本数
+        """
+        self.name = name
+        self.limiter = limiter
+        self.priority = priority
+        self.hedge = hedge
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stall_timeout = stall_timeout
+        self.ttft: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_skipped = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.stalls = 0
+
+    def hedge_delay(self) -> float:
+        if len(self.ttft) < MIN_SAMPLES:
+            return self.max_delay
+        samples = sorted(self.ttft)
+        delay = samples[min(len(samples) - 1, int(len(samples) * self.percentile / 100))]
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[T]], model: str = "") -> AsyncIterator[T]:
+        """
+        效果等同于 open_stream()，每次调用 open_stream 都应发起一个新的上游请求
+
+        Args:
+            open_stream: 发起一次上游流式请求
+            model: 模型名称，用于指标
+        """
+        async for chunk in await self.open(open_stream, model):
+            yield chunk
+
+    async def open(self, open_stream: Callable[[], AsyncIterator[T]], model: str = "") -> AsyncIterator[T]:
+        """
+        与 astream 相同，但先取到第一个分块再返回，开始输出前的错误（包括限流）由调用方直接得到
+        """
+        self.requests += 1
+        start = time.perf_counter()
+        stream, first = await self._first_chunk(open_stream)
+        return self._follow(stream, first, start, model)
+
+    async def _follow(self, stream: AsyncIterator[T] | None, first: Any, start: float, model: str) -> AsyncIterator[T]:
+        if stream is None:
+            return
+        first_at = time.perf_counter()
+        llm_time_to_first_token.observe(first_at - start, self.name, model)
+        chunks = 1
+        output_tokens = None
+        try:
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), self.stall_timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.stalls += 1
+                    raise StreamStalled(f"{self.name}: 超过 {self.stall_timeout:g} 秒没有新的输出") from None
+                chunks += 1
+                # 最后一个分块带有上游统计的输出 token 数，没有时按分块数估计
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    output_tokens = usage.get("output_tokens")
+                yield chunk
+        finally:
+            await _close(stream)
+        elapsed = time.perf_counter() - first_at
+        if elapsed > 0:
+            llm_tokens_per_second.observe((output_tokens or chunks) / elapsed, self.name, model)
+
+    async def _first_chunk(self, open_stream: Callable[[], AsyncIterator[T]]) -> tuple[AsyncIterator[T] | None, Any]:
+        async for attempt in retrying():
+            with attempt:
+                if attempt.retry_state.attempt_number > 1:
+                    self.retries += 1
+                    logger.warning(f"{self.name}: 首个分块前出错，第 {attempt.retry_state.attempt_number - 1} 次重试")
+                return await self._race(open_stream)
+
+    async def _race(self, open_stream: Callable[[], AsyncIterator[T]]) -> tuple[AsyncIterator[T] | None, Any]:
+        primary = asyncio.create_task(self._attempt(open_stream))
+        tasks = [primary]
+        winner = None
+        try:
+            if self.hedge:
+                await asyncio.wait(tasks, timeout=self.hedge_delay())
+                if not primary.done():
+                    # 对冲请求不排队：名额已满时再发请求只会加重拥塞
+                    lease = self.limiter.try_acquire(self.priority) if self.limiter is not None else None
+                    if self.limiter is None or lease is not None:
+                        self.hedged += 1
+                        tasks.append(asyncio.create_task(self._attempt(open_stream, lease)))
+                    else:
+                        self.hedge_skipped += 1
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.index):
+                    if task.exception() is None:
+                        winner = task
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    _discard(task)
+
+    async def _attempt(
+        self, open_stream: Callable[[], AsyncIterator[T]], lease: Lease | None = None
+    ) -> tuple[AsyncIterator[T] | None, Any]:
+        start = time.monotonic()
+        try:
+            if self.limiter is not None:
+                # 名额一直持有到这个请求的流结束或被关闭
+                stream = await self.limiter.stream(self.priority, open_stream, lease=lease)
+            else:
+                stream = open_stream()
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            raise
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            return None, None
+        except BaseException:
+            await _close(stream)
+            raise
+        self.ttft.append(time.monotonic() - start)
+        return stream, first
+
+
+def _discard(task: asyncio.Task):
+    """取消落败的请求；已经拿到首个分块的关闭其上游流"""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        stream, _ = task.result()
+        if stream is not None:
+            closing = asyncio.create_task(_close(stream))
+            _closing.add(closing)
+            closing.add_done_callback(_closing.discard)
+
+
+async def _close(stream: AsyncIterator):
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -0,0 +1,114 @@
+"""
+活动设计提示词评估：制度全文 vs 检索相关小节
+
+默认只比较两种模式的提示词 token 数（估算）和组装耗时。加 --live 时实际调用大模型（需要 VE_KEY），
+额外比较首个分块延迟、总耗时、上游返回的 prompt token 数，以及输出质量的简单指标：
+结果能否通过 ActivityDesignOutput 校验、各字段条目数、流程建议字数、是否围绕主题词。
+用法: python -m src.bench.activity_prompt_eval [--live] [--repeat 1]
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from pydantic import ValidationError
+
+from src.agent.activity_design import ActivityDesignAgent, get_section_retriever
+from src.agent.context_window import estimate_tokens
+from src.agent.llm_pool import llm_registry
+from src.agent.prefix_cache import prefix_cache
+from src.conf.env import settings
+from src.model.activity import ActivityDesignInput, ActivityDesignOutput
+
+MODES = ("full", "retrieval")
+
+SAMPLES = [
+    ActivityDesignInput(theme="科技强国", minute=45, participant="预备党员"),
+    ActivityDesignInput(theme="纪律教育", minute=60, participant="支部委员"),
+    ActivityDesignInput(theme="党史学习", minute=30, participant="党小组成员"),
+    ActivityDesignInput(theme="民主评议党员", minute=90, participant="全体党员"),
+    ActivityDesignInput(theme="青年担当", minute=45, participant="入党积极分子"),
+    ActivityDesignInput(theme="二十大精神", minute=60, participant="教工党员"),
+    ActivityDesignInput(theme="发展新党员", minute=40, participant="支部党员大会"),
+    ActivityDesignInput(theme="廉洁文化", minute=30, participant="研究生党员"),
+]
+
+
+async def offline():
+    print(f"{'主题':<8}{'参与对象':<8} | " + " | ".join(f"{mode:>9} tokens" for mode in MODES) + " | 检索耗时")
+    totals = {mode: [] for mode in MODES}
+    latencies = []
+    for sample in SAMPLES:
+        row = {}
+        for mode in MODES:
+            start = time.perf_counter()
+            messages = await ActivityDesignAgent.build_messages(sample, mode)
+            if mode == "retrieval":
+                latencies.append((time.perf_counter() - start) * 1000)
+            row[mode] = sum(estimate_tokens(message.content) for message in messages)
+            totals[mode].append(row[mode])
+        print(f"{sample.theme:<8}{sample.participant:<8} | " + " | ".join(f"{row[mode]:>16}" for mode in MODES)
+              + f" | {latencies[-1]:6.2f} ms")
+    full, retrieval = np.mean(totals["full"]), np.mean(totals["retrieval"])
+    retriever = get_section_retriever()
+    print(f"平均提示词 token: full {full:.0f}, retrieval {retrieval:.0f} (减少 {1 - retrieval / full:.0%})，"
+          f"平均检索耗时 {np.mean(latencies):.2f} ms，"
+          f"向量检索 {retriever.vector_searches} 次 / 仅BM25 {retriever.bm25_only_searches} 次")
+
+
+def quality(sample: ActivityDesignInput, output: dict | None) -> dict:
+    try:
+        result = ActivityDesignOutput.model_validate(output)
+    except ValidationError:
+        return {"valid": 0.0, "materials": 0.0, "topics": 0.0, "plan_chars": 0.0, "on_theme": 0.0}
+    text = " ".join(result.学习资料 + result.讨论议题) + result.活动流程建议
+    return {
+        "valid": 1.0,
+        "materials": float(len(result.学习资料)),
+        "topics": float(len(result.讨论议题)),
+        "plan_chars": float(len(result.活动流程建议)),
+        "on_theme": float(sample.theme[:2] in text),
+    }
+
+
+async def live(repeat: int):
+    results = {mode: {"ttft": [], "total": [], "prompt_tokens": [], "quality": []} for mode in MODES}
+    for _ in range(repeat):
+        for sample in SAMPLES:
+            for mode in MODES:
+                settings.ACTIVITY_PROMPT_MODE = mode
+                tokens_before = prefix_cache.cached_tokens + prefix_cache.uncached_tokens
+                start = time.perf_counter()
+                stream = await ActivityDesignAgent().generate(sample, use_cache=False)
+                first = None
+                last = None
+                async for chunk in stream:
+                    first = first or time.perf_counter()
+                    last = chunk
+                end = time.perf_counter()
+                bucket = results[mode]
+                bucket["ttft"].append((first or end) - start)
+                bucket["total"].append(end - start)
+                bucket["prompt_tokens"].append(prefix_cache.cached_tokens + prefix_cache.uncached_tokens - tokens_before)
+                bucket["quality"].append(quality(sample, last))
+    for mode in MODES:
+        bucket = results[mode]
+        scores = {key: np.mean([item[key] for item in bucket["quality"]]) for key in bucket["quality"][0]}
+        print(f"{mode:>9}: prompt {np.mean(bucket['prompt_tokens']):6.0f} tokens | "
+              f"首个分块 p50 {np.percentile(bucket['ttft'], 50):5.2f}s | 总耗时 p50 {np.percentile(bucket['total'], 50):5.2f}s | "
+              f"有效 {scores['valid']:.0%} 学习资料 {scores['materials']:.1f} 议题 {scores['topics']:.1f} "
+              f"流程 {scores['plan_chars']:.0f}字 切题 {scores['on_theme']:.0%}")
+    await prefix_cache.aclose()
+    await llm_registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="实际调用大模型比较延迟和输出质量")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(live(args.repeat) if args.live else offline())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+活动设计 SSE 增量模式基准
+
+用 JsonOutputParser 按 token 解析一份合成的长方案，分别以完整结果模式
+（dict_stream_generator）和增量模式（delta_stream_generator）编码，
+比较发送字节数和服务端 CPU 时间，并校验增量还原的结果与完整结果一致。
+用法: python -m src.bench.delta_bench [--chars 2000 8000 32000]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from langchain_core.output_parsers.json import JsonOutputParser
+
+from src.main import dict_stream_generator, delta_stream_generator
+from src.utils.json_delta import apply_json_delta
+from src.utils.sse import SSEEncoder
+
+
+def synthetic_tokens(chars: int, token_size: int = 3) -> list[str]:
+    plan = {
+        "学习资料": [f"《学习材料第{i}篇》重点章节导读" for i in range(8)],
+        "讨论议题": [f"结合岗位实际，谈谈如何落实第{i}项要求" for i in range(6)],
+        "活动流程建议": ("一、集体学习原文，领学人逐段讲解；二、分组讨论并记录发言要点。" * (chars // 32 + 1))[:chars],
+    }
+    text = json.dumps(plan, ensure_ascii=False)
+    return [text[i:i + token_size] for i in range(0, len(text), token_size)]
+
+
+async def parsed_chunks(tokens: list[str]) -> list[dict]:
+    async def token_stream():
+        for token in tokens:
+            yield token
+
+    return [chunk async for chunk in JsonOutputParser().atransform(token_stream())]
+
+
+async def encode(generator_factory, chunks: list[dict]) -> tuple[int, float, list[str]]:
+    async def replay():
+        for chunk in chunks:
+            yield chunk
+
+    frames = []
+    start = time.process_time()
+    # 关闭合并发送，逐个分块比较两种编码
+    async for frame in generator_factory(replay(), SSEEncoder(window=0)):
+        frames.append(frame)
+    cpu = time.process_time() - start
+    return sum(len(frame.encode("utf-8")) for frame in frames), cpu, frames
+
+
+def verify(frames: list[str], expected: dict):
+    document = {}
+    snapshot = None
+    for frame in frames:
+        if frame.startswith("event: snapshot"):
+            snapshot = json.loads(frame.split("data: ", 1)[1])
+        elif frame != "data: [DONE]\n\n":
+            document = apply_json_delta(document, json.loads(frame[len("data: "):]))
+    assert document == expected == snapshot, "delta stream does not reproduce the final result"
+
+
+async def run(chars: int):
+    chunks = await parsed_chunks(synthetic_tokens(chars))
+    full_bytes, full_cpu, _ = await encode(dict_stream_generator, chunks)
+    delta_bytes, delta_cpu, delta_frames = await encode(delta_stream_generator, chunks)
+    verify(delta_frames, chunks[-1])
+    print(f"{chars:>6} chars, {len(chunks):>5} chunks | "
+          f"full: {full_bytes / 1024:9.1f} KB {full_cpu * 1000:7.1f} ms | "
+          f"delta: {delta_bytes / 1024:7.1f} KB {delta_cpu * 1000:6.1f} ms | "
+          f"{full_bytes / delta_bytes:5.1f}x fewer bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, nargs="+", default=[2000, 8000, 32000])
+    args = parser.parse_args()
+    for chars in args.chars:
+        asyncio.run(run(chars))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+接口负载基准
+
+在子进程中分别启动模拟的方舟大模型（OpenAI 兼容流式接口，首 token 耗时和输出速度可配置）、
+模拟的火山音乐生成 OpenAPI（GenSongForTime/QuerySong）和音频 CDN，再把被测服务指向它们启动，
+按递增的并发数对 /policy_agent/ask、/activity_design、/music/generate、/music/cache/* 做闭环压测。
+每一档记录延迟 p50/p95/p99、首字节耗时、吞吐量、被测进程的事件循环延迟和每个并发流的内存增量，
+结果写成 JSON，可以用 --compare 与另一次提交的结果对比。
+用法: python -m src.bench.load_bench [--concurrency 1,4,16,64] [--duration 10] [--output result.json]
+     python -m src.bench.load_bench --compare old.json --output new.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+SCENARIOS = ("policy", "activity", "music_generate", "music_cache")
+PROBE_PATH = "/__bench__/stats"
+
+
+def mock_content(tokens: int) -> str:
+    """同时满足音乐 prompt 和活动设计输出模型的 JSON，按 tokens 个分块切分后输出"""
+    content = {
+        "prompt": f"一首关于青春与奋斗的歌曲 {uuid.uuid4().hex}",
+        "gender": "Female",
+        "genre": "Pop",
+        "mood": "Happy",
+        "学习资料": ["《中国共产党章程》", "习近平新时代中国特色社会主义思想学习纲要"],
+        "讨论议题": ["如何在学习工作中发挥党员先锋模范作用", "结合专业谈科技自立自强"],
+        "活动流程建议": "",
+    }
+    filler = len(json.dumps(content, ensure_ascii=False))
+    content["活动流程建议"] = "集中学习、分组讨论、交流发言、总结点评。" * max(1, (tokens * 4 - filler) // 20)
+    return json.dumps(content, ensure_ascii=False)
+
+
+def split_tokens(text: str, tokens: int) -> list[str]:
+    size = max(1, len(text) // tokens)
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def build_ark_app(ttft: float, tokens_per_second: float, tokens: int, dimensions: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    # 每 20ms 输出一批 token，避免高输出速度时模拟端自己成为瓶颈
+    tick = 0.02
+    per_tick = max(1, round(tokens_per_second * tick))
+
+    def chunk(completion_id: str, model: str, content: str | None, usage: dict | None = None) -> str:
+        choices = [] if content is None else [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}]
+        body = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices}
+        if usage is not None:
+            body["usage"] = usage
+        return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        pieces = split_tokens(mock_content(tokens), tokens)
+        usage = {"prompt_tokens": 1000, "completion_tokens": len(pieces), "total_tokens": 1000 + len(pieces)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + len(pieces) / tokens_per_second)
+            return {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for i in range(0, len(pieces), per_tick):
+                yield chunk(completion_id, model, "".join(pieces[i:i + per_tick]))
+                await asyncio.sleep(tick)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(completion_id, model, None, usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.post("/api/v3/chat/completions")(completions)
+    app.post("/api/v3/context/chat/completions")(completions)
+
+    @app.post("/api/v3/context/create")
+    async def context_create():
+        return {"id": f"ctx-{uuid.uuid4().hex}", "mode": "common_prefix"}
+
+    @app.post("/api/v3/embeddings")
+    async def embeddings(request: Request):
+        texts = (await request.json())["input"]
+        texts = [texts] if isinstance(texts, str) else texts
+        data = [
+            {"object": "embedding", "index": index, "embedding": [((hash(text) >> shift) % 97) / 97 + 0.01 for shift in range(dimensions)]}
+            for index, text in enumerate(texts)
+        ]
+        return {"object": "list", "data": data, "model": "mock", "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+    return app
+
+
+def build_volc_app(port: int, generate_seconds: float, audio_kb: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    started: dict[str, float] = {}
+    audio = os.urandom(audio_kb * 1024)
+
+    @app.post("/")
+    async def openapi(request: Request):
+        action = request.query_params.get("Action")
+        body = await request.json()
+        if action == "GenSongForTime":
+            task_id = uuid.uuid4().hex
+            started[task_id] = time.monotonic()
+            return {"Code": 0, "Message": "", "Result": {"TaskID": task_id, "PredictedWaitTime": generate_seconds}}
+        if action == "QuerySong":
+            task_id = body["TaskID"]
+            progress = min(100, int((time.monotonic() - started[task_id]) / generate_seconds * 100))
+            if progress < 100:
+                return {"Code": 0, "Message": "", "Result": {"Status": 1, "Progress": progress}}
+            detail = {"AudioUrl": f"http://127.0.0.1:{port}/audio/{task_id}.mp3", "Captions": "{}"}
+            return {"Code": 0, "Message": "", "Result": {"Status": 2, "Progress": 100, "SongDetail": detail}}
+        return {"Code": 1, "Message": f"unknown action {action}"}
+
+    @app.get("/audio/{name}")
+    async def download(name: str):
+        async def body():
+            for i in range(0, len(audio), 64 * 1024):
+                yield audio[i:i + 64 * 1024]
+                await asyncio.sleep(0)
+
+        return StreamingResponse(body(), media_type="audio/mpeg", headers={"Content-Length": str(len(audio))})
+
+    return app
+
+
+class BenchProbe:
+    """包在被测应用外层：测量事件循环延迟和进程内存，通过 PROBE_PATH 读取并重置"""
+
+    def __init__(self, app, interval: float = 0.01):
+        self.app = app
+        self.interval = interval
+        self.lags: list[float] = []
+        self.rss_peak = 0
+        self._task: asyncio.Task | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self._task is None:
+            self._task = asyncio.create_task(self._probe())
+        if scope["type"] != "http" or scope["path"] != PROBE_PATH:
+            await self.app(scope, receive, send)
+            return
+        lags = sorted(self.lags) or [0.0]
+        stats = {
+            "lag_ms": {
+                "p50": lags[len(lags) // 2] * 1000,
+                "p99": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+                "max": lags[-1] * 1000,
+            },
+            "rss_mb": rss() / 1024 / 1024,
+            "rss_peak_mb": max(self.rss_peak, rss()) / 1024 / 1024,
+        }
+        if b"reset" in scope["query_string"]:
+            self.lags.clear()
+            self.rss_peak = rss()
+        body = json.dumps(stats).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _probe(self):
+        ticks = 0
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+            ticks += 1
+            if ticks % 10 == 0:
+                self.rss_peak = max(self.rss_peak, rss())
+
+
+def rss() -> int:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_ark(port: int, ttft: float, tokens_per_second: float, tokens: int, dimensions: int):
+    import uvicorn
+    uvicorn.run(build_ark_app(ttft, tokens_per_second, tokens, dimensions), host="127.0.0.1", port=port, log_level="warning")
+
+
+def run_volc(port: int, generate_seconds: float, audio_kb: int):
+    import uvicorn
+    uvicorn.run(build_volc_app(port, generate_seconds, audio_kb), host="127.0.0.1", port=port, log_level="warning")
+
+
+def run_app(port: int, env: dict[str, str]):
+    # 配置在导入时读取，先设置环境变量再导入被测应用
+    os.environ.update(env)
+    os.environ.pop("REDIS_URL", None)
+    import uvicorn
+    from src.main import app
+    uvicorn.run(BenchProbe(app), host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(base_url: str, path: str = "/docs"):
+    async with httpx.AsyncClient() as client:
+        for _ in range(300):
+            try:
+                await client.get(base_url + path)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "mean": statistics.fmean(values) * 1000}
+
+
+class Scenario:
+    def __init__(self, name: str, music_urls: list[str]):
+        self.name = name
+        self.music_urls = music_urls
+        self.count = 0
+
+    def request(self) -> tuple[str, str, dict | None]:
+        """返回 (method, path, json)，每次请求参数不同，避免命中缓存和合并"""
+        self.count += 1
+        tag = uuid.uuid4().hex[:8]
+        if self.name == "policy":
+            return "POST", "/policy_agent/ask", {"user_input": f"发展党员的程序是什么？({tag})"}
+        if self.name == "activity":
+            return "POST", "/activity_design?no_cache=true", {"theme": f"科技强国 {tag}", "minute": 60, "participant": "研究生党支部"}
+        if self.name == "music_generate":
+            return "POST", "/music/generate", {"prompt": f"一首关于青春的歌 {tag}", "gender": "Female", "genre": "Pop", "mood": "Happy"}
+        return "GET", self.music_urls[self.count % len(self.music_urls)], None
+
+
+async def worker(client: httpx.AsyncClient, scenario: Scenario, deadline: float, totals: dict):
+    while time.perf_counter() < deadline:
+        method, path, body = scenario.request()
+        start = time.perf_counter()
+        first = None
+        try:
+            async with client.stream(method, path, json=body) as response:
+                chunks = []
+                async for chunk in response.aiter_raw():
+                    if first is None:
+                        first = time.perf_counter()
+                    if scenario.name == "music_generate":
+                        chunks.append(chunk)
+                    totals["bytes"] += len(chunk)
+        except httpx.HTTPError:
+            totals["errors"] += 1
+            continue
+        end = time.perf_counter()
+        if response.status_code == 429:
+            totals["rejected"] += 1
+            continue
+        if response.status_code != 200:
+            totals["errors"] += 1
+            continue
+        totals["latency"].append(end - start)
+        totals["ttfb"].append((first or end) - start)
+        if scenario.name == "music_generate":
+            scenario.music_urls.append(json.loads(b"".join(chunks))["music_url"])
+
+
+async def run_stage(base_url: str, scenario: Scenario, concurrency: int, duration: float) -> dict:
+    totals = {"latency": [], "ttfb": [], "errors": 0, "rejected": 0, "bytes": 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300.0) as client:
+        before = (await client.get(PROBE_PATH + "?reset=1")).json()
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(worker(client, scenario, deadline, totals) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        after = (await client.get(PROBE_PATH)).json()
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": len(totals["latency"]),
+        "errors": totals["errors"],
+        "rejected": totals["rejected"],
+        "throughput_rps": len(totals["latency"]) / elapsed,
+        "mb_per_s": totals["bytes"] / elapsed / 1024 / 1024,
+        "latency_ms": percentiles(totals["latency"]),
+        "ttfb_ms": percentiles(totals["ttfb"]),
+        "loop_lag_ms": after["lag_ms"],
+        "rss_mb": after["rss_mb"],
+        "rss_kb_per_stream": max(0.0, after["rss_peak_mb"] - before["rss_mb"]) * 1024 / concurrency,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result: dict):
+    latency, lag = result["latency_ms"], result["loop_lag_ms"]
+    if result["requests"]:
+        timing = f"p50 {latency['p50']:8.1f}  p95 {latency['p95']:8.1f}  p99 {latency['p99']:8.1f} ms  ttfb p50 {result['ttfb_ms']['p50']:7.1f} ms"
+    else:
+        timing = "no successful requests".ljust(85)
+    print(f"{result['scenario']:>14} x{result['concurrency']:<4} {result['throughput_rps']:7.1f} req/s  {timing}"
+          f"  lag p99 {lag['p99']:6.1f} ms  {result['rss_kb_per_stream']:7.1f} KB/stream"
+          f"  err {result['errors']} 429 {result['rejected']}")
+
+
+def compare(old: dict, new: dict):
+    """按 (场景, 并发数) 对比吞吐量和延迟，正数表示新结果更大"""
+    previous = {(result["scenario"], result["concurrency"]): result for result in old["results"]}
+
+    def change(before, after) -> str:
+        return f"{(after - before) / before * 100:+7.1f}%" if before and after is not None else "      -"
+
+    print(f"\ncompare {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for result in new["results"]:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        print(f"{result['scenario']:>14} x{result['concurrency']:<4}"
+              f"  throughput {change(before['throughput_rps'], result['throughput_rps'])}"
+              f"  p50 {change(before['latency_ms']['p50'], result['latency_ms']['p50'])}"
+              f"  p99 {change(before['latency_ms']['p99'], result['latency_ms']['p99'])}"
+              f"  lag p99 {change(before['loop_lag_ms']['p99'], result['loop_lag_ms']['p99'])}"
+              f"  KB/stream {change(before['rss_kb_per_stream'], result['rss_kb_per_stream'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,4,16,64", help="逗号分隔的并发数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每一档的压测时长（秒）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--ttft", type=float, default=0.5, help="模拟大模型的首 token 耗时（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--tokens", type=int, default=200, help="模拟大模型每次输出的 token 数")
+    parser.add_argument("--generate-seconds", type=float, default=2.0, help="模拟音乐生成耗时（秒）")
+    parser.add_argument("--audio-kb", type=int, default=512, help="模拟音频文件大小（KB）")
+    parser.add_argument("--keep-limits", action="store_true", help="保留准入控制的默认限额，默认放开以测量服务自身")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    dimensions = 64
+
+    ark_port, volc_port, app_port = free_port(), free_port(), free_port()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {
+            "VE_KEY": "mock", "VE_AK": "mock", "VE_SK": "mock",
+            "VE_BASE_URL": f"http://127.0.0.1:{ark_port}/api/v3/",
+            "VE_MUSIC_ENDPOINT": f"http://127.0.0.1:{volc_port}",
+            "CACHE_DIR": cache_dir,
+            "EMBEDDING_DIMENSIONS": str(dimensions),
+            "MUSIC_POLL_MIN_INTERVAL": "0.2",
+        }
+        if not args.keep_limits:
+            env.update({
+                "ARK_RATE_LIMIT": "0", "ARK_CONCURRENCY": "100000", "ARK_QUEUE_SIZE": "100000",
+                "SONG_RATE_LIMIT": "0", "SONG_CONCURRENCY": "100000", "SONG_QUEUE_SIZE": "100000",
+            })
+        servers = [
+            multiprocessing.Process(
+                target=run_ark, args=(ark_port, args.ttft, args.tokens_per_second, args.tokens, dimensions), daemon=True
+            ),
+            multiprocessing.Process(target=run_volc, args=(volc_port, args.generate_seconds, args.audio_kb), daemon=True),
+            multiprocessing.Process(target=run_app, args=(app_port, env), daemon=True),
+        ]
+        for server in servers:
+            server.start()
+        try:
+            base_url = f"http://127.0.0.1:{app_port}"
+            asyncio.run(wait_ready(base_url))
+            music_urls: list[str] = []
+            results = []
+            for name in scenarios:
+                if name == "music_cache" and not music_urls:
+                    # 没有跑 music_generate 时先生成几首用于下载
+                    asyncio.run(run_stage(base_url, Scenario("music_generate", music_urls), 4, args.generate_seconds))
+                for concurrency in levels:
+                    result = asyncio.run(run_stage(base_url, Scenario(name, music_urls), concurrency, args.duration))
+                    print_result(result)
+                    results.append(result)
+        finally:
+            for server in servers:
+                server.terminate()
+                server.join()
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+上游上下文缓存基准
+
+在子进程中启动一个模拟方舟 OpenAI 兼容接口的服务（/chat/completions、/context/create、
+/context/chat/completions），用真实的 ChatOpenAI 客户端分别以完整请求和 PrefixCache
+发送政策问答请求，比较命中缓存和未命中缓存的 prompt token 数。中途让模拟服务端的上下文
+全部过期，验证退回完整请求和重新创建句柄。
+用法: python -m src.bench.prefix_cache_bench [--requests 20]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+import uuid
+
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+
+MODEL = "mock-model"
+
+
+def build_app():
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import StreamingResponse
+    from src.agent.context_window import estimate_tokens
+
+    app = FastAPI()
+    contexts: dict[str, list[dict]] = {}
+
+    def prompt_tokens(messages: list[dict]) -> int:
+        return sum(estimate_tokens(message["content"]) for message in messages)
+
+    def completion(messages: list[dict], cached_tokens: int):
+        usage = {
+            "prompt_tokens": prompt_tokens(messages),
+            "completion_tokens": 3,
+            "total_tokens": prompt_tokens(messages) + 3,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+        async def stream():
+            for token in ("模拟", "回答", "。"):
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": MODEL,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": MODEL,
+                     "choices": [], "usage": usage}
+            yield f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        return completion(body["messages"], 0)
+
+    @app.post("/context/create")
+    async def create_context(request: Request):
+        body = await request.json()
+        context_id = f"ctx-{uuid.uuid4().hex}"
+        contexts[context_id] = body["messages"]
+        return {"id": context_id, "model": body["model"], "mode": body["mode"], "ttl": body["ttl"]}
+
+    @app.post("/context/chat/completions")
+    async def context_chat(request: Request):
+        body = await request.json()
+        prefix = contexts.get(body.get("context_id"))
+        if prefix is None:
+            raise HTTPException(status_code=404, detail="context not found")
+        return completion(prefix + body["messages"], prompt_tokens(prefix))
+
+    @app.post("/expire")
+    async def expire():
+        contexts.clear()
+
+    return app
+
+
+def run_server(port: int):
+    import uvicorn
+    uvicorn.run(build_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(base_url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(base_url + "/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("mock server did not start")
+
+
+async def run(base_url: str, requests: int):
+    from src.agent.llm_pool import LLMClientRegistry
+    from src.agent.prefix_cache import PrefixCache
+    from src.agent.prompt import policy_qa_system_prompt
+
+    registry = LLMClientRegistry()
+    llm = registry.get(model=MODEL, base_url=base_url, api_key="mock")
+    prefix = [SystemMessage(content=policy_qa_system_prompt)]
+
+    baseline = PrefixCache(registry=registry, enabled=False)
+    cached = PrefixCache(registry=registry, ttl=3600, retry_interval=0)
+    for name, cache in (("full", baseline), ("prefix", cached)):
+        start = time.perf_counter()
+        for index in range(requests):
+            if index == requests // 2 and cache.enabled:
+                # 模拟上下文在服务端过期
+                async with httpx.AsyncClient() as client:
+                    await client.post(base_url + "/expire")
+            messages = [HumanMessage(content=f"第{index}个问题：请介绍团章的主要内容")]
+            answer = "".join([chunk.content async for chunk in cache.astream(llm, prefix, messages)])
+            assert answer == "模拟回答。"
+            # 让后台创建句柄的任务有机会完成
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        total = cache.cached_tokens + cache.uncached_tokens
+        print(f"{name:>6}: {requests} requests in {elapsed:5.2f}s | "
+              f"prompt tokens {total}, cached {cache.cached_tokens} ({cache.cached_tokens / total:5.1%}), "
+              f"uncached {cache.uncached_tokens} | handles {cache.handles_created}, fallbacks {cache.fallbacks}")
+    await registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=run_server, args=(port,), daemon=True)
+    server.start()
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        asyncio.run(wait_ready(base_url))
+        asyncio.run(run(base_url, args.requests))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+缓存音频并发收听吞吐量基准
+
+在子进程中启动 uvicorn，分别用改造前的阻塞分块读取实现和 serve_file
+提供同一个音频文件，模拟多个听众并发拖动播放（Range 请求）并统计吞吐量。
+用法: python -m src.bench.serve_bench [--listeners 64] [--duration 10] [--size-mb 8]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+MEDIA_TYPE = "audio/mpeg"
+
+
+def build_app(file_path: Path):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import StreamingResponse
+    from src.utils.file_serving import serve_file
+
+    app = FastAPI()
+
+    @app.get("/legacy")
+    async def legacy(request: Request):
+        # 改造前 serve_cached_music 的实现
+        file_size = os.path.getsize(file_path)
+        range_header = request.headers.get("range")
+        headers = {"Accept-Ranges": "bytes", "Content-Type": MEDIA_TYPE}
+        try:
+            start, end = range_header.replace("bytes=", "").split("-")
+            start = int(start) if start else 0
+            end = int(end) if end else file_size - 1
+        except (ValueError, IndexError):
+            raise HTTPException(status_code=416, detail="Invalid range header")
+        content_length = end - start + 1
+        headers.update({"Content-Range": f"bytes {start}-{end}/{file_size}", "Content-Length": str(content_length)})
+
+        async def file_sender():
+            with open(file_path, "rb") as file:
+                file.seek(start)
+                remaining_bytes = content_length
+                while remaining_bytes > 0:
+                    chunk = file.read(min(8192, remaining_bytes))
+                    if not chunk:
+                        break
+                    remaining_bytes -= len(chunk)
+                    yield chunk
+
+        return StreamingResponse(file_sender(), status_code=206, headers=headers)
+
+    @app.get("/new")
+    async def new(request: Request):
+        return serve_file(request, file_path, MEDIA_TYPE)
+
+    return app
+
+
+def run_server(file_path: str, port: int):
+    import uvicorn
+    uvicorn.run(build_app(Path(file_path)), host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def listen(client: httpx.AsyncClient, url: str, file_size: int, deadline: float, totals: dict):
+    while time.perf_counter() < deadline:
+        # 随机起点，读取 1MB，模拟播放器按段请求
+        start = random.randrange(0, max(file_size - 1024 * 1024, 1))
+        headers = {"Range": f"bytes={start}-{min(start + 1024 * 1024, file_size) - 1}"}
+        async with client.stream("GET", url, headers=headers) as response:
+            async for chunk in response.aiter_raw():
+                totals["bytes"] += len(chunk)
+        totals["requests"] += 1
+
+
+async def run_load(url: str, listeners: int, duration: float, file_size: int) -> dict:
+    totals = {"bytes": 0, "requests": 0}
+    limits = httpx.Limits(max_connections=listeners, max_keepalive_connections=listeners)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(listen(client, url, file_size, deadline, totals) for _ in range(listeners)))
+    totals["mb_per_s"] = totals["bytes"] / duration / 1024 / 1024
+    totals["requests_per_s"] = totals["requests"] / duration
+    return totals
+
+
+async def wait_ready(base_url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(base_url + "/docs")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listeners", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--size-mb", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "bench.mp3"
+        file_path.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+        file_size = file_path.stat().st_size
+
+        port = free_port()
+        server = multiprocessing.Process(target=run_server, args=(str(file_path), port), daemon=True)
+        server.start()
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_ready(base_url))
+            for name in ("legacy", "new"):
+                result = asyncio.run(run_load(f"{base_url}/{name}", args.listeners, args.duration, file_size))
+                print(f"{name:>6}: {result['mb_per_s']:8.1f} MB/s  {result['requests_per_s']:7.1f} req/s"
+                      f"  ({args.listeners} listeners)")
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
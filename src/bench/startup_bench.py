@@ -0,0 +1,127 @@
+"""
+冷启动基准
+
+1. 在新的解释器中多次导入 src.main，统计导入耗时，超过 --budget 时以非零状态退出，可用于 CI；
+   --top 列出自身导入耗时最多的模块。
+2. 以子进程启动服务（指向 load_bench 中的模拟方舟大模型），分别在开启和关闭启动预热时，
+   统计从进程启动到开始接受请求、到第一个政策问答请求成功的时间，以及第一个请求本身的耗时。
+用法: python -m src.bench.startup_bench [--runs 5] [--budget 1.5] [--top 10]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from src.bench.load_bench import free_port, run_ark
+
+IMPORT_SCRIPT = "import time; t = time.perf_counter(); import src.main; print(time.perf_counter() - t)"
+SERVE_SCRIPT = "import uvicorn; from src.main import app; uvicorn.run(app, host='127.0.0.1', port={port}, log_level='warning')"
+
+
+def base_env(ark_port: int, cache_dir: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.pop("REDIS_URL", None)
+    env.update({
+        "PYTHONPATH": os.getcwd(),
+        "VE_KEY": "mock", "VE_AK": "mock", "VE_SK": "mock",
+        "VE_BASE_URL": f"http://127.0.0.1:{ark_port}/api/v3/",
+        "CACHE_DIR": cache_dir,
+        "EMBEDDING_DIMENSIONS": "64",
+        # 音乐prompt池的后台补充会和第一个请求争用事件循环，这里不测它
+        "MUSIC_PROMPT_POOL_SIZE": "0",
+        "MUSIC_PROMPT_POOL_LOW_WATER": "0",
+    })
+    return env
+
+
+def import_times(env: dict[str, str], runs: int) -> list[float]:
+    return [
+        float(subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True).stdout)
+        for _ in range(runs)
+    ]
+
+
+def slowest_imports(env: dict[str, str], top: int) -> list[tuple[int, str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"], env=env, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+async def first_request(env: dict[str, str]) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVE_SCRIPT.format(port=port)], env=env)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120.0) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("benchmark server exited")
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.02)
+            ready = time.perf_counter()
+            async with client.stream("POST", "/policy_agent/ask", json={"user_input": "发展党员的程序是什么？"}) as response:
+                async for _ in response.aiter_raw():
+                    pass
+            if response.status_code != 200:
+                raise RuntimeError(f"first request failed: {response.status_code}")
+            done = time.perf_counter()
+    finally:
+        process.terminate()
+        process.wait()
+    return {"ready": ready - started, "first_success": done - started, "first_request": done - ready}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5, help="导入 src.main 的耗时上限（秒），按中位数判断")
+    parser.add_argument("--top", type=int, default=10, help="列出自身导入耗时最多的模块数，0 表示不列出")
+    parser.add_argument("--ttft", type=float, default=0.2, help="模拟大模型的首 token 耗时（秒）")
+    args = parser.parse_args()
+
+    ark_port = free_port()
+    ark = multiprocessing.Process(target=run_ark, args=(ark_port, args.ttft, 500.0, 50, 64), daemon=True)
+    ark.start()
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = base_env(ark_port, cache_dir)
+            times = import_times(env, args.runs)
+            median = statistics.median(times)
+            print(f"import src.main: median {median * 1000:7.1f} ms  min {min(times) * 1000:7.1f} ms  budget {args.budget * 1000:.0f} ms")
+            for self_us, name in slowest_imports(env, args.top) if args.top else []:
+                print(f"    {self_us / 1000:7.1f} ms  {name}")
+
+            for warmup in ("false", "true"):
+                results = [asyncio.run(first_request({**env, "STARTUP_WARMUP": warmup})) for _ in range(args.runs)]
+                print(f"warmup={warmup:<5}  ready {statistics.median(r['ready'] for r in results) * 1000:7.1f} ms"
+                      f"  first success {statistics.median(r['first_success'] for r in results) * 1000:7.1f} ms"
+                      f"  first request {statistics.median(r['first_request'] for r in results) * 1000:7.1f} ms")
+    finally:
+        ark.terminate()
+        ark.join()
+
+    if median > args.budget:
+        print(f"import time over budget: {median * 1000:.0f} ms > {args.budget * 1000:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
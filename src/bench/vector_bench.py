@@ -0,0 +1,116 @@
+"""
+知识库导入吞吐量和检索延迟基准
+
+用合成的中文文档走完整的导入流程（分块、分批并发向量化、增量写入），向量化用随机向量代替，
+可用 --embed-latency 模拟每次向量化请求的耗时。导入后测量 top-k 检索延迟。
+默认使用进程内 NumPy 存储；--backend pg 时使用 DATABASE_URL 指向的 pgvector（导入后建 HNSW 索引）。
+用法: python -m src.bench.vector_bench [--chunks 10000 100000 1000000] [--dim 128] [--backend numpy|pg]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from src.conf.env import settings
+from src.utils.knowledge.embedding import Embedder, normalize
+from src.utils.knowledge.knowledge_base import KnowledgeBase
+from src.utils.knowledge.vector_store import NumpyVectorStore, PgVectorStore
+
+CHUNK_SIZE = 120
+CHUNKS_PER_DOCUMENT = 20
+# 每次导入的文档数，控制合成文本占用的内存
+DOCUMENTS_PER_INGEST = 500
+
+WORDS = ["党的建设", "全面从严治党", "民主集中制", "共青团", "理想信念", "组织生活", "三会一课", "党员教育",
+         "基层组织", "思想政治工作", "新时代", "青年工作", "群众路线", "纪律建设", "制度建设", "作风建设"]
+
+
+class RandomEmbedder(Embedder):
+    """用随机向量代替向量化接口，保留分批和并发逻辑"""
+
+    def __init__(self, dimensions: int, latency: float, **kwargs):
+        super().__init__(client=object(), dimensions=dimensions, **kwargs)
+        self.latency = latency
+        self.rng = np.random.default_rng(0)
+
+    async def _embed_batch(self, batch: list[str], semaphore: asyncio.Semaphore) -> np.ndarray:
+        async with semaphore:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.texts += len(batch)
+        return normalize(self.rng.standard_normal((len(batch), self.dimensions), dtype=np.float32))
+
+
+def synthetic_document(index: int) -> tuple[str, str, str]:
+    rng = random.Random(index)
+    paragraphs = []
+    for article in range(CHUNKS_PER_DOCUMENT):
+        sentences = [f"{rng.choice(WORDS)}要坚持{rng.choice(WORDS)}和{rng.choice(WORDS)}相统一，第{rng.randrange(10 ** 6)}号要求必须落实。"
+                     for _ in range(3)]
+        paragraphs.append(f"第{article + 1}条 " + "".join(sentences))
+    return f"doc-{index}", f"合成文件{index}", "\n".join(paragraphs)
+
+
+async def run(chunks: int, dim: int, backend: str, latency: float, queries: int):
+    if backend == "pg":
+        store = PgVectorStore(settings.DATABASE_URL, dimensions=dim, table=f"bench_chunks_{chunks}")
+        await store.start()
+        await store._pool.execute(f"TRUNCATE {store.table}")
+    else:
+        store = NumpyVectorStore(dim)
+    embedder = RandomEmbedder(dim, latency)
+    knowledge_base = KnowledgeBase(store, embedder, chunk_size=CHUNK_SIZE, overlap=0)
+
+    documents = chunks // CHUNKS_PER_DOCUMENT
+    start = time.perf_counter()
+    added = 0
+    for offset in range(0, documents, DOCUMENTS_PER_INGEST):
+        batch = [synthetic_document(index) for index in range(offset, min(offset + DOCUMENTS_PER_INGEST, documents))]
+        added += (await knowledge_base.ingest(batch)).added
+    ingest_seconds = time.perf_counter() - start
+    index_seconds = 0.0
+    if backend == "pg":
+        start = time.perf_counter()
+        await store.create_index()
+        index_seconds = time.perf_counter() - start
+
+    # 再导入一次前 10 个文档，验证增量更新不会重复计算向量
+    requests = embedder.requests
+    stats = await knowledge_base.ingest([synthetic_document(index) for index in range(10)])
+    assert stats.added == 0 and embedder.requests == requests
+
+    rng = np.random.default_rng(1)
+    latencies = []
+    for _ in range(queries):
+        query = normalize(rng.standard_normal(dim, dtype=np.float32))
+        start = time.perf_counter()
+        results = await store.search(query, 10)
+        latencies.append(time.perf_counter() - start)
+        assert len(results) == 10
+    latencies = np.array(latencies) * 1000
+    print(f"{backend:>5} {added:>8} chunks | ingest {added / ingest_seconds:9.0f} chunks/s ({ingest_seconds:6.1f}s)"
+          + (f" + index {index_seconds:6.1f}s" if backend == "pg" else "")
+          + f" | query p50 {np.percentile(latencies, 50):7.2f} ms  p95 {np.percentile(latencies, 95):7.2f} ms")
+    if backend == "pg":
+        await store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--backend", choices=["numpy", "pg"], default="numpy")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="模拟每次向量化请求的耗时（秒）")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    if args.backend == "pg" and not settings.DATABASE_URL:
+        parser.error("--backend pg 需要配置 DATABASE_URL")
+    for chunks in args.chunks:
+        asyncio.run(run(chunks, args.dim, args.backend, args.embed_latency, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+多 worker 扩展性基准
+
+以 uvicorn --workers N 启动服务，对每个 worker 数做同样的闭环压测，输出吞吐量以及相对单 worker 的扩展效率。
+模拟的方舟大模型和音乐生成服务通过 SO_REUSEPORT 在同一端口上起多个进程，避免上游本身成为瓶颈。
+worker 数大于1时服务要求共享状态，需要通过 --redis-url 指定一个真实的 Redis。
+用法: python -m src.bench.workers_bench --workers 1,2,4 --redis-url redis://127.0.0.1:6379/15 [--scenarios policy,music_generate]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from src.bench.load_bench import Scenario, build_ark_app, build_volc_app, free_port, percentiles, wait_ready, worker
+
+
+def serve_shared(build, port: int, *args):
+    """在 SO_REUSEPORT 端口上运行模拟服务，同一端口的多个进程由内核分发连接"""
+    import uvicorn
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("127.0.0.1", port))
+    uvicorn.run(build(*args), fd=sock.fileno(), log_level="warning")
+
+
+def start_app(port: int, workers: int, env: dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, **env, "WORKERS": str(workers)},
+    )
+
+
+async def run_stage(base_url: str, scenario: Scenario, concurrency: int, duration: float) -> dict:
+    totals = {"latency": [], "ttfb": [], "errors": 0, "rejected": 0, "bytes": 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, scenario, started + duration, totals) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "scenario": scenario.name,
+        "requests": len(totals["latency"]),
+        "errors": totals["errors"],
+        "rejected": totals["rejected"],
+        "throughput_rps": len(totals["latency"]) / elapsed,
+        "latency_ms": percentiles(totals["latency"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数")
+    parser.add_argument("--concurrency", type=int, default=64, help="每一档的并发请求数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每一档的压测时长（秒）")
+    parser.add_argument("--scenarios", default="policy,music_generate")
+    parser.add_argument("--redis-url", help="worker 数大于1时必需，压测前后不清理其中的数据，建议使用单独的库")
+    parser.add_argument("--upstream-processes", type=int, default=os.cpu_count() or 1, help="模拟上游服务的进程数")
+    parser.add_argument("--ttft", type=float, default=0.2, help="模拟大模型的首 token 耗时（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--tokens", type=int, default=200, help="模拟大模型每次输出的 token 数")
+    parser.add_argument("--generate-seconds", type=float, default=1.0, help="模拟音乐生成耗时（秒）")
+    parser.add_argument("--audio-kb", type=int, default=256, help="模拟音频文件大小（KB）")
+    parser.add_argument("--output", help="结果 JSON 路径")
+    args = parser.parse_args()
+    counts = [int(count) for count in args.workers.split(",")]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    if max(counts) > 1 and not args.redis_url:
+        parser.error("--workers 大于1时需要 --redis-url")
+    dimensions = 64
+
+    ark_port, volc_port = free_port(), free_port()
+    upstreams = []
+    for _ in range(args.upstream_processes):
+        upstreams.append(multiprocessing.Process(
+            target=serve_shared,
+            args=(build_ark_app, ark_port, args.ttft, args.tokens_per_second, args.tokens, dimensions),
+            daemon=True,
+        ))
+        upstreams.append(multiprocessing.Process(
+            target=serve_shared, args=(build_volc_app, volc_port, volc_port, args.generate_seconds, args.audio_kb), daemon=True
+        ))
+    for upstream in upstreams:
+        upstream.start()
+
+    results = []
+    try:
+        for count in counts:
+            # 每一档使用新的缓存目录，worker 之间共享同一个
+            with tempfile.TemporaryDirectory() as cache_dir:
+                env = {
+                    "PYTHONPATH": os.getcwd(),
+                    "VE_KEY": "mock", "VE_AK": "mock", "VE_SK": "mock",
+                    "VE_BASE_URL": f"http://127.0.0.1:{ark_port}/api/v3/",
+                    "VE_MUSIC_ENDPOINT": f"http://127.0.0.1:{volc_port}",
+                    "CACHE_DIR": cache_dir,
+                    "EMBEDDING_DIMENSIONS": str(dimensions),
+                    "MUSIC_POLL_MIN_INTERVAL": "0.2",
+                    "REDIS_URL": args.redis_url or "",
+                    "ARK_RATE_LIMIT": "0", "ARK_CONCURRENCY": "100000", "ARK_QUEUE_SIZE": "100000",
+                    "SONG_RATE_LIMIT": "0", "SONG_CONCURRENCY": "100000", "SONG_QUEUE_SIZE": "100000",
+                }
+                app_port = free_port()
+                base_url = f"http://127.0.0.1:{app_port}"
+                app = start_app(app_port, count, env)
+                try:
+                    asyncio.run(wait_ready(base_url))
+                    # 让每个 worker 都完成懒加载和预热，不计入压测
+                    asyncio.run(run_stage(base_url, Scenario("policy", []), count * 4, 2.0))
+                    music_urls: list[str] = []
+                    for name in scenarios:
+                        result = {"workers": count, **asyncio.run(
+                            run_stage(base_url, Scenario(name, music_urls), args.concurrency, args.duration)
+                        )}
+                        results.append(result)
+                        base = next(r for r in results if r["scenario"] == name)
+                        efficiency = result["throughput_rps"] / (base["throughput_rps"] * count / base["workers"] or 1)
+                        latency = result["latency_ms"]
+                        print(
+                            f"workers={count:<3} {name:<15} {result['throughput_rps']:8.1f} req/s"
+                            f"  efficiency {efficiency:6.1%}"
+                            f"  p50 {latency['p50'] or 0:8.1f} ms  p99 {latency['p99'] or 0:8.1f} ms"
+                            f"  errors {result['errors']}  rejected {result['rejected']}"
+                        )
+                finally:
+                    app.terminate()
+                    app.wait()
+    finally:
+        for upstream in upstreams:
+            upstream.terminate()
+            upstream.join()
+
+    if args.output:
+        output = {"cpus": os.cpu_count(), "args": vars(args), "results": results}
+        Path(args.output).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,216 +1,282 @@
+import asyncio
+import gzip
+import hashlib
 import json
+import re
+import time
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import logging
 from pathlib import Path
-import httpx
-import os
-import uuid
-import aiofiles
-from urllib.parse import urlparse
-
-import src.agent.policy_qa
-from src.agent.activity_design import ActivityDesignAgent
-from src.agent.music_agent import MusicAgent
-from src.agent.policy_qa import PolicyAgent
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
 from src.model.activity import ActivityDesignOutput, ActivityDesignInput
 from src.model.music import MusicGenerateParam
+from src.utils.admission import UpstreamOverloaded, ark_limiter, song_limiter
+from src.utils.lazy import LazyModule
+from src.utils.metrics import MetricsMiddleware, registry
+from src.utils.music_job import MusicJobManager, MusicJobQueueFull
+from src.utils.prompt_pool import MusicPromptPool
+from src.utils.ve_music.SongPoller import query_song_poller
+from src.utils.redis_client import close_redis, get_redis, shares_state
+from src.utils.result_cache import make_key, normalize_text
+from src.utils.single_flight import SingleFlight
+from src.utils.json_delta import json_delta
+from src.utils.sse import SSEEncoder, render_chat_chunk, DONE_FRAME
+from src.utils.audio_cache import AudioCache, content_hash
+from src.utils.captions import compact_captions
+from src.utils.file_serving import serve_file, serve_growing_file, IMMUTABLE_CACHE_CONTROL
+from src.utils.static_assets import StaticAsset, StaticAssets, serve_asset
 from src.conf.env import settings
 from collections.abc import AsyncIterator
-from langchain_core.messages import AIMessageChunk
 
 from src.model.policy import PolicyQaParam
 
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessageChunk
+
 logger = logging.getLogger(__name__)
 
-app = FastAPI(debug=settings.DEBUG_MODE)
+# 智能体模块依赖 langchain/openai，导入较慢，第一次用到或启动预热时再导入
+policy_qa_module = LazyModule("src.agent.policy_qa")
+activity_design_module = LazyModule("src.agent.activity_design")
+music_agent_module = LazyModule("src.agent.music_agent")
+prefix_cache_module = LazyModule("src.agent.prefix_cache")
+llm_pool_module = LazyModule("src.agent.llm_pool")
+
+
+async def warm_up():
+    """
+    启动预热：导入智能体模块，创建共享的大模型客户端，格式化一次提示词，并与方舟建立连接。
+    在 lifespan 启动阶段执行，完成后 uvicorn 才开始接受请求，第一个请求不再承担这些开销。
+    """
+    started = time.perf_counter()
+    # 依次导入，避免多个线程同时导入共同依赖的模块
+    for module in (policy_qa_module, activity_design_module, music_agent_module):
+        await module.load()
+    policy_qa_module.module.PolicyAgent()
+    activity_design = activity_design_module.module
+    activity_design.ActivityDesignAgent()
+    await activity_design.ActivityDesignAgent.build_messages(ActivityDesignInput(theme="预热", minute=60, participant="党员"))
+    music_agent_module.module.MusicAgent()
+    music_agent_module.module.music_generate_prompt_generate_prompt_template.format()
+    await llm_pool_module.module.llm_registry.connect()
+    logger.info(f"启动预热完成，耗时 {time.perf_counter() - started:.2f} 秒")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WORKERS > 1 and not shares_state():
+        raise RuntimeError("多个 worker 进程需要通过 Redis 共享会话和音乐生成任务，请配置 REDIS_URL")
+    if settings.STARTUP_WARMUP:
+        try:
+            await asyncio.wait_for(warm_up(), settings.STARTUP_WARMUP_TIMEOUT)
+        except Exception as e:
+            # 预热只是优化，失败时照常启动，由第一个请求完成剩下的准备
+            logger.warning(f"启动预热未完成: {e!r}")
+    await static_assets.build()
+    await audio_cache.start()
+    await music_job_manager.start()
+    await music_prompt_pool.start()
+    yield
+    await music_prompt_pool.stop()
+    await music_job_manager.stop()
+    await query_song_poller.aclose()
+    await audio_cache.close()
+    # 没有导入过的智能体模块没有需要释放的资源
+    if policy_qa_module.module is not None:
+        await policy_qa_module.module.policy_context_window.aclose()
+    if prefix_cache_module.module is not None:
+        await prefix_cache_module.module.prefix_cache.aclose()
+    if llm_pool_module.module is not None:
+        # 释放大模型连接池
+        await llm_pool_module.module.llm_registry.aclose()
+    await close_redis()
+
+
+app = FastAPI(debug=settings.DEBUG_MODE, lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # 创建音频缓存目录
-CACHE_DIR = Path(__file__).resolve().parent.parent / "cache" / "audio"
+CACHE_DIR = settings.CACHE_DIR / "audio"
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# 音乐生成任务状态目录
+JOB_DIR = settings.CACHE_DIR / "jobs"
+# 预生成的音乐prompt
+PROMPT_POOL_PATH = settings.CACHE_DIR / "music_prompts.json"
+
+async def openai_stream_generator(stream: AsyncIterator["AIMessageChunk"], encoder: SSEEncoder | None = None):
+    encoder = encoder or SSEEncoder()
+
+    def render(tokens: list["AIMessageChunk"]) -> str:
+        return render_chat_chunk("".join(token.content for token in tokens))
+
+    async for frame in encoder.stream(stream, render, size=lambda token: len(token.content.encode("utf-8"))):
+        yield frame
+
+    # 结束标志
+    yield encoder.frame(DONE_FRAME)
 
-async def openai_stream_generator(stream: AsyncIterator[AIMessageChunk]):
-    async for token in stream:
-        chunk = {
-            "id": "chatcmpl-xxx",
-            "object": "chat.completion.chunk",
-            "choices": [
-                {
-                    "delta": {"content": token.content},
-                    "index": 0,
-                    "finish_reason": None
-                }
-            ]
-        }
 
-        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+async def dict_stream_generator(stream: AsyncIterator[dict], encoder: SSEEncoder | None = None):
+    encoder = encoder or SSEEncoder()
 
+    # 每个分块都是完整结果，合并时只发送最新的一个
+    def render(chunks: list[dict]) -> str:
+        return f"data: {json.dumps(chunks[-1], ensure_ascii=False)}\n\n"
+
+    async for frame in encoder.stream(stream, render):
+        yield frame
     # 结束标志
-    yield "data: [DONE]\n\n"
+    yield encoder.frame(DONE_FRAME)
+
 
+async def delta_stream_generator(stream: AsyncIterator[dict], encoder: SSEEncoder | None = None):
+    """只发送相邻两次结果之间的增量操作，结束前发送一次完整快照用于校验"""
+    encoder = encoder or SSEEncoder()
+    prev = {}
 
-async def dict_stream_generator(stream: AsyncIterator[dict]):
-    async for chunk in stream:
-        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    def render(chunks: list[dict]) -> str | None:
+        nonlocal prev
+        ops = json_delta(prev, chunks[-1])
+        prev = chunks[-1]
+        if not ops:
+            return None
+        return f"data: {json.dumps(ops, ensure_ascii=False)}\n\n"
+
+    async for frame in encoder.stream(stream, render):
+        yield frame
+    yield encoder.frame(f"event: snapshot\ndata: {json.dumps(prev, ensure_ascii=False)}\n\n")
     # 结束标志
-    yield "data: [DONE]\n\n"
+    yield encoder.frame(DONE_FRAME)
+
+
+audio_cache = AudioCache(CACHE_DIR)
 
 
 # 缓存音频文件到本地服务器
-async def cache_audio_file(url: str) -> str:
-    """下载并缓存音频文件，返回本地文件名"""
+async def cache_audio_file(url: str, wait: bool = True) -> str:
+    """下载并缓存音频文件，返回本地文件名；wait为False时收到第一块数据即返回"""
     try:
-        # 生成唯一的文件名
-        file_extension = ".mp3"  # 默认扩展名
-        parsed_url = urlparse(url)
-        if "mp3" in parsed_url.path.lower():
-            file_extension = ".mp3"
-        elif "wav" in parsed_url.path.lower():
-            file_extension = ".wav"
-        elif "ogg" in parsed_url.path.lower():
-            file_extension = ".ogg"
-
-        filename = f"{uuid.uuid4()}{file_extension}"
-        local_path = CACHE_DIR / filename
-
-        logger.info(f"开始缓存音频文件: {url}")
-        logger.info(f"本地保存路径: {local_path}")
-
-        # 使用httpx下载文件
-        async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
-            # 设置合适的请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'audio/webm,audio/ogg,audio/wav,audio/mp3,audio/mpeg,*/*;q=0.9',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Referer': 'https://www.douyin.com/',
-            }
-
-            async with client.stream('GET', url, headers=headers) as response:
-                response.raise_for_status()
-
-                # 保存文件
-                async with aiofiles.open(local_path, 'wb') as f:
-                    async for chunk in response.aiter_bytes(chunk_size=8192):
-                        await f.write(chunk)
-
-        logger.info(f"音频文件缓存成功: {filename}")
-        return filename
-
+        return await audio_cache.fetch(url, wait=wait)
     except Exception as e:
         logger.error(f"缓存音频文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"缓存音频失败: {str(e)}")
 
-@app.get("/music/cache/{filename}")
-async def serve_cached_music(filename: str, request: Request):
-    """提供缓存的音频文件，支持流式播放和范围请求"""
-    import os
+# 列式歌词与音频保存在同一个缓存目录中，文件名为内容哈希加该后缀
+CAPTIONS_SUFFIX = ".captions.json"
+CAPTIONS_NAME_PATTERN = re.compile(r"^([0-9a-f]{32})\.json$")
 
-    file_path = CACHE_DIR / filename
 
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="音频文件不存在")
+async def cache_captions(audio_captions: str | None) -> str | None:
+    """把歌词转换为列式结构后缓存，返回歌词地址；没有歌词或保存失败时返回None"""
+    captions = compact_captions(audio_captions)
+    if captions is None:
+        return None
+    data = json.dumps(captions, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    try:
+        await audio_cache.put(f"{digest}{CAPTIONS_SUFFIX}", data)
+        await audio_cache.put(f"{digest}{CAPTIONS_SUFFIX}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+    except OSError as e:
+        logger.error(f"缓存歌词失败: {str(e)}")
+        return None
+    return f"/music/captions/{digest}.json"
 
-    # 确定MIME类型
-    if filename.endswith('.mp3'):
-        media_type = 'audio/mpeg'
-    elif filename.endswith('.wav'):
-        media_type = 'audio/wav'
-    elif filename.endswith('.ogg'):
-        media_type = 'audio/ogg'
-    else:
-        media_type = 'audio/mpeg'  # 默认
+music_job_manager = MusicJobManager(
+    cache_audio=cache_audio_file, cache_captions=cache_captions, job_dir=JOB_DIR, redis=get_redis()
+)
 
-    # 获取文件大小
-    file_size = os.path.getsize(file_path)
 
-    # 处理范围请求（支持流式播放）
-    range_header = request.headers.get("range")
-    headers = {
-        "Accept-Ranges": "bytes",
-        "Content-Type": media_type,
-        "Cache-Control": "public, max-age=3600",  # 缓存1小时
-    }
+async def generate_music_prompt() -> MusicGenerateParam:
+    music_agent = await music_agent_module.load()
+    return await music_agent.MusicAgent().generate_prompt(stream=False)
 
-    if range_header:
-        # 解析范围请求头
-        try:
-            start, end = range_header.replace("bytes=", "").split("-")
-            start = int(start) if start else 0
-            end = int(end) if end else file_size - 1
-        except (ValueError, IndexError):
-            raise HTTPException(status_code=416, detail="Invalid range header")
-
-        # 验证范围
-        if start >= file_size or end >= file_size or start > end:
-            raise HTTPException(status_code=416, detail="Requested range not satisfiable")
-
-        # 计算内容长度
-        content_length = end - start + 1
-
-        # 更新响应头
-        headers.update({
-            "Content-Range": f"bytes {start}-{end}/{file_size}",
-            "Content-Length": str(content_length),
-        })
-
-        # 流式读取文件范围
-        async def file_sender():
-            with open(file_path, "rb") as file:
-                file.seek(start)
-                remaining_bytes = content_length
-                chunk_size = 8192  # 8KB chunks
-
-                while remaining_bytes > 0:
-                    chunk = file.read(min(chunk_size, remaining_bytes))
-                    if not chunk:
-                        break
-                    remaining_bytes -= len(chunk)
-                    yield chunk
 
-        return StreamingResponse(
-            file_sender(),
-            status_code=206,  # Partial Content
-            headers=headers
-        )
-    else:
-        # 完整文件响应
-        headers.update({
-            "Content-Length": str(file_size),
-        })
-
-        async def file_sender():
-            with open(file_path, "rb") as file:
-                chunk_size = 8192  # 8KB chunks
-                while True:
-                    chunk = file.read(chunk_size)
-                    if not chunk:
-                        break
-                    yield chunk
+music_prompt_pool = MusicPromptPool(generate=generate_music_prompt, path=PROMPT_POOL_PATH)
+# 合并同时到达的相同音乐生成请求
+music_generate_flight = SingleFlight("music_generate")
+
+
+def music_param_key(param: MusicGenerateParam) -> str:
+    return make_key(normalize_text(param.prompt or ""), param.gender, param.genre, param.mood)
 
-        return StreamingResponse(
-            file_sender(),
-            headers=headers
-        )
+
+# 音频缓存中的文件扩展名都来自 guess_extension
+AUDIO_MEDIA_TYPES = {".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg"}
+
+
+@app.api_route("/music/cache/{filename}", methods=["GET", "HEAD"])
+async def serve_cached_music(filename: str, request: Request):
+    """提供缓存的音频文件，支持流式播放、条件请求和多段范围请求"""
+    # 确定MIME类型；缓存目录中还有歌词等其他文件，不是音频扩展名的一律不提供
+    media_type = AUDIO_MEDIA_TYPES.get(Path(filename).suffix.lower())
+    if media_type is None:
+        raise HTTPException(status_code=404, detail="音频文件不存在")
+
+    # 边下边播: 文件仍在下载时跟随读取
+    download = audio_cache.active_download(filename)
+    if download is not None:
+        try:
+            return serve_growing_file(request, download.part_path, download, media_type)
+        except FileNotFoundError:
+            # 其他 worker 的下载恰好在此期间完成，按最终文件提供
+            pass
+
+    filename = audio_cache.resolve(filename)
+    file_path = audio_cache.path(filename)
+    if file_path is None or not file_path.is_file():
+        audio_cache.discard(filename)
+        raise HTTPException(status_code=404, detail="音频文件不存在")
+    audio_cache.touch(filename)
+
+    # 按内容寻址的文件内容永不变化，可以长期缓存
+    digest = content_hash(filename)
+    if digest is not None:
+        return serve_file(request, file_path, media_type, etag=f'"{digest}"', cache_control=IMMUTABLE_CACHE_CONTROL)
+    return serve_file(request, file_path, media_type)
+
+@app.get("/music/captions/{filename}")
+async def serve_music_captions(filename: str, request: Request):
+    """提供列式歌词，内容按哈希寻址可以长期缓存，支持 gzip"""
+    match = CAPTIONS_NAME_PATTERN.match(filename)
+    if match is None:
+        raise HTTPException(status_code=404, detail="歌词不存在")
+    digest = match.group(1)
+    name = f"{digest}{CAPTIONS_SUFFIX}"
+    file_path = audio_cache.path(name)
+    if not file_path.is_file():
+        audio_cache.discard(name)
+        raise HTTPException(status_code=404, detail="歌词不存在")
+    audio_cache.touch(name)
+    gzip_path = audio_cache.path(f"{name}.gz")
+    asset = StaticAsset(
+        file_path, "application/json", f'"{digest}"', IMMUTABLE_CACHE_CONTROL,
+        {"gzip": gzip_path} if gzip_path.is_file() else {},
+    )
+    return serve_asset(request, asset)
 
 @app.get("/music/prompt_generate")
 async def music_prompt_generate():
-    agent = MusicAgent()
-    generated_prompt = await agent.generate_prompt(stream=False)
-    return generated_prompt
+    """从预生成的 prompt 池中取出一个"""
+    try:
+        return await music_prompt_pool.pop()
+    except UpstreamOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
 
 
 @app.post("/music/generate")
 async def music_generate(generate_param: MusicGenerateParam):
     # return {
     #   "music_url": "/music/cache/198ef557-8c2f-4cb4-8e6f-bb12e579ce5d.mp3",
-    #   "audio_captions": "{\"attribute\":{\"extra\":{\"sta_use_batch_request\":\"False\",\"asr_service\":\"asr\",\"caption_type\":\"singing\",\"is_singing\":\"False\",\"language\":\"zh-CN\"}},\"code\":0,\"duration\":107.737125,\"id\":\"44505667-6802-49a6-a565-d1a5f64b3273\",\"message\":\"Success\",\"utterances\":[{\"attribute\":{},\"end_time\":3089,\"start_time\":730,\"text\":\"[intro]\",\"words\":[{\"attribute\":{},\"end_time\":730,\"start_time\":730,\"text\":\"[\"},{\"attribute\":{},\"end_time\":1389,\"start_time\":730,\"text\":\"intro\"},{\"attribute\":{},\"end_time\":3089,\"start_time\":1389,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":6260,\"start_time\":3090,\"text\":\"[verse]\",\"words\":[{\"attribute\":{},\"end_time\":3090,\"start_time\":3090,\"text\":\"[\"},{\"attribute\":{},\"end_time\":6260,\"start_time\":3090,\"text\":\"verse\"},{\"attribute\":{},\"end_time\":6260,\"start_time\":6260,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":9689,\"start_time\":6260,\"text\":\"一艘红船破浪前行\",\"words\":[{\"attribute\":{},\"end_time\":6549,\"start_time\":6260,\"text\":\"一\"},{\"attribute\":{},\"end_time\":6989,\"start_time\":6690,\"text\":\"艘\"},{\"attribute\":{},\"end_time\":7360,\"start_time\":7090,\"text\":\"红\"},{\"attribute\":{},\"end_time\":7580,\"start_time\":7360,\"text\":\"船\"},{\"attribute\":{},\"end_time\":7780,\"start_time\":7580,\"text\":\"破\"},{\"attribute\":{},\"end_time\":8000,\"start_time\":7780,\"text\":\"浪\"},{\"attribute\":{},\"end_time\":8140,\"start_time\":8000,\"text\":\"前\"},{\"attribute\":{},\"end_time\":8309,\"start_time\":8140,\"text\":\"行\"},{\"attribute\":{},\"end_time\":9689,\"start_time\":8309,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":13049,\"start_time\":9690,\"text\":\"见证百年风云变幻\",\"words\":[{\"attribute\":{},\"end_time\":9860,\"start_time\":9690,\"text\":\"见\"},{\"attribute\":{},\"end_time\":10029,\"start_time\":9860,\"text\":\"证\"},{\"attribute\":{},\"end_time\":10220,\"start_time\":10050,\"text\":\"百\"},{\"attribute\":{},\"end_time\":10389,\"start_time\":10220,\"text\":\"年\"},{\"attribute\":{},\"end_time\":10780,\"start_time\":10530,\"text\":\"风\"},{\"attribute\":{},\"end_time\":11000,\"start_time\":10780,\"text\":\"云\"},{\"attribute\":{},\"end_time\":11140,\"start_time\":11000,\"text\":\"变\"},{\"attribute\":{},\"end_time\":11309,\"start_time\":11140,\"text\":\"幻\"},{\"attribute\":{},\"end_time\":13049,\"start_time\":11309,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":16529,\"start_time\":13050,\"text\":\"南湖烟雨初心如磐\",\"words\":[{\"attribute\":{},\"end_time\":13220,\"start_time\":13050,\"text\":\"南\"},{\"attribute\":{},\"end_time\":13389,\"start_time\":13220,\"text\":\"湖\"},{\"attribute\":{},\"end_time\":13760,\"start_time\":13490,\"text\":\"烟\"},{\"attribute\":{},\"end_time\":13980,\"start_time\":13760,\"text\":\"雨\"},{\"attribute\":{},\"end_time\":14229,\"start_time\":13980,\"text\":\"初\"},{\"attribute\":{},\"end_time\":14709,\"start_time\":14410,\"text\":\"心\"},{\"attribute\":{},\"end_time\":15469,\"start_time\":15170,\"text\":\"如\"},{\"attribute\":{},\"end_time\":15909,\"start_time\":15610,\"text\":\"磐\"},{\"attribute\":{},\"end_time\":16529,\"start_time\":15909,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":19569,\"start_time\":16530,\"text\":\"燎原星火点燃天地间\",\"words\":[{\"attribute\":{},\"end_time\":16780,\"start_time\":16530,\"text\":\"燎\"},{\"attribute\":{},\"end_time\":16980,\"start_time\":16780,\"text\":\"原\"},{\"attribute\":{},\"end_time\":17200,\"start_time\":16980,\"text\":\"星\"},{\"attribute\":{},\"end_time\":17420,\"start_time\":17200,\"text\":\"火\"},{\"attribute\":{},\"end_time\":17540,\"start_time\":17420,\"text\":\"点\"},{\"attribute\":{},\"end_time\":17709,\"start_time\":17540,\"text\":\"燃\"},{\"attribute\":{},\"end_time\":18780,\"start_time\":18610,\"text\":\"天\"},{\"attribute\":{},\"end_time\":18949,\"start_time\":18780,\"text\":\"地\"},{\"attribute\":{},\"end_time\":19429,\"start_time\":19130,\"text\":\"间\"},{\"attribute\":{},\"end_time\":19569,\"start_time\":19429,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":20809,\"start_time\":19570,\"text\":\"[verse]\",\"words\":[{\"attribute\":{},\"end_time\":19570,\"start_time\":19570,\"text\":\"[\"},{\"attribute\":{},\"end_time\":20509,\"start_time\":19570,\"text\":\"verse\"},{\"attribute\":{},\"end_time\":20809,\"start_time\":20509,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":23809,\"start_time\":20810,\"text\":\"镰刀铁锤交相辉映\",\"words\":[{\"attribute\":{},\"end_time\":21060,\"start_time\":20810,\"text\":\"镰\"},{\"attribute\":{},\"end_time\":21260,\"start_time\":21060,\"text\":\"刀\"},{\"attribute\":{},\"end_time\":21480,\"start_time\":21260,\"text\":\"铁\"},{\"attribute\":{},\"end_time\":21700,\"start_time\":21480,\"text\":\"锤\"},{\"attribute\":{},\"end_time\":21949,\"start_time\":21700,\"text\":\"交\"},{\"attribute\":{},\"end_time\":22340,\"start_time\":22090,\"text\":\"相\"},{\"attribute\":{},\"end_time\":22460,\"start_time\":22340,\"text\":\"辉\"},{\"attribute\":{},\"end_time\":22629,\"start_time\":22460,\"text\":\"映\"},{\"attribute\":{},\"end_time\":23809,\"start_time\":22629,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":27249,\"start_time\":23810,\"text\":\"照亮万里锦绣河山\",\"words\":[{\"attribute\":{},\"end_time\":23980,\"start_time\":23810,\"text\":\"照\"},{\"attribute\":{},\"end_time\":24149,\"start_time\":23980,\"text\":\"亮\"},{\"attribute\":{},\"end_time\":24380,\"start_time\":24210,\"text\":\"万\"},{\"attribute\":{},\"end_time\":24549,\"start_time\":24380,\"text\":\"里\"},{\"attribute\":{},\"end_time\":24820,\"start_time\":24650,\"text\":\"锦\"},{\"attribute\":{},\"end_time\":24989,\"start_time\":24820,\"text\":\"绣\"},{\"attribute\":{},\"end_time\":25829,\"start_time\":25530,\"text\":\"河\"},{\"attribute\":{},\"end_time\":26309,\"start_time\":26010,\"text\":\"山\"},{\"attribute\":{},\"end_time\":27249,\"start_time\":26309,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":32369,\"start_time\":27250,\"text\":\"浴血奋战初心不变\",\"words\":[{\"attribute\":{},\"end_time\":27500,\"start_time\":27250,\"text\":\"浴\"},{\"attribute\":{},\"end_time\":27700,\"start_time\":27500,\"text\":\"血\"},{\"attribute\":{},\"end_time\":27949,\"start_time\":27700,\"text\":\"奋\"},{\"attribute\":{},\"end_time\":28429,\"start_time\":28130,\"text\":\"战\"},{\"attribute\":{},\"end_time\":29140,\"start_time\":28970,\"text\":\"初\"},{\"attribute\":{},\"end_time\":29309,\"start_time\":29140,\"text\":\"心\"},{\"attribute\":{},\"end_time\":30549,\"start_time\":30250,\"text\":\"不\"},{\"attribute\":{},\"end_time\":31429,\"start_time\":31130,\"text\":\"变\"},{\"attribute\":{},\"end_time\":32369,\"start_time\":31429,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":37769,\"start_time\":32370,\"text\":\"前赴后继奏响凯歌传\",\"words\":[{\"attribute\":{},\"end_time\":32540,\"start_time\":32370,\"text\":\"前\"},{\"attribute\":{},\"end_time\":32709,\"start_time\":32540,\"text\":\"赴\"},{\"attribute\":{},\"end_time\":33109,\"start_time\":32810,\"text\":\"后\"},{\"attribute\":{},\"end_time\":33589,\"start_time\":33290,\"text\":\"继\"},{\"attribute\":{},\"end_time\":34340,\"start_time\":34090,\"text\":\"奏\"},{\"attribute\":{},\"end_time\":34580,\"start_time\":34340,\"text\":\"响\"},{\"attribute\":{},\"end_time\":34869,\"start_time\":34580,\"text\":\"凯\"},{\"attribute\":{},\"end_time\":35709,\"start_time\":35410,\"text\":\"歌\"},{\"attribute\":{},\"end_time\":36549,\"start_time\":36250,\"text\":\"传\"},{\"attribute\":{},\"end_time\":37769,\"start_time\":36549,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":39649,\"start_time\":37770,\"text\":\"[chorus]\",\"words\":[{\"attribute\":{},\"end_time\":37770,\"start_time\":37770,\"text\":\"[\"},{\"attribute\":{},\"end_time\":38309,\"start_time\":37770,\"text\":\"chorus\"},{\"attribute\":{},\"end_time\":39649,\"start_time\":38309,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":43089,\"start_time\":39650,\"text\":\"百年风华恰是少年\",\"words\":[{\"attribute\":{},\"end_time\":39840,\"start_time\":39650,\"text\":\"百\"},{\"attribute\":{},\"end_time\":40029,\"start_time\":39840,\"text\":\"年\"},{\"attribute\":{},\"end_time\":40500,\"start_time\":40330,\"text\":\"风\"},{\"attribute\":{},\"end_time\":40669,\"start_time\":40500,\"text\":\"华\"},{\"attribute\":{},\"end_time\":41669,\"start_time\":41370,\"text\":\"恰\"},{\"attribute\":{},\"end_time\":42060,\"start_time\":41810,\"text\":\"是\"},{\"attribute\":{},\"end_time\":42180,\"start_time\":42060,\"text\":\"少\"},{\"attribute\":{},\"end_time\":42349,\"start_time\":42180,\"text\":\"年\"},{\"attribute\":{},\"end_time\":43089,\"start_time\":42349,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":46529,\"start_time\":43090,\"text\":\"乘风破浪奋勇向前\",\"words\":[{\"attribute\":{},\"end_time\":43360,\"start_time\":43090,\"text\":\"乘\"},{\"attribute\":{},\"end_time\":43580,\"start_time\":43360,\"text\":\"风\"},{\"attribute\":{},\"end_time\":43780,\"start_time\":43580,\"text\":\"破\"},{\"attribute\":{},\"end_time\":44000,\"start_time\":43780,\"text\":\"浪\"},{\"attribute\":{},\"end_time\":44269,\"start_time\":44000,\"text\":\"奋\"},{\"attribute\":{},\"end_time\":44640,\"start_time\":44370,\"text\":\"勇\"},{\"attribute\":{},\"end_time\":44780,\"start_time\":44640,\"text\":\"向\"},{\"attribute\":{},\"end_time\":44949,\"start_time\":44780,\"text\":\"前\"},{\"attribute\":{},\"end_time\":46529,\"start_time\":44949,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":50129,\"start_time\":46530,\"text\":\"百年征程波澜壮阔\",\"words\":[{\"attribute\":{},\"end_time\":46700,\"start_time\":46530,\"text\":\"百\"},{\"attribute\":{},\"end_time\":46869,\"start_time\":46700,\"text\":\"年\"},{\"attribute\":{},\"end_time\":47340,\"start_time\":47170,\"text\":\"征\"},{\"attribute\":{},\"end_time\":47509,\"start_time\":47340,\"text\":\"程\"},{\"attribute\":{},\"end_time\":48420,\"start_time\":48250,\"text\":\"波\"},{\"attribute\":{},\"end_time\":48589,\"start_time\":48420,\"text\":\"澜\"},{\"attribute\":{},\"end_time\":49060,\"start_time\":48890,\"text\":\"壮\"},{\"attribute\":{},\"end_time\":49229,\"start_time\":49060,\"text\":\"阔\"},{\"attribute\":{},\"end_time\":50129,\"start_time\":49229,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":55269,\"start_time\":50130,\"text\":\"开天辟地辉煌诗篇\",\"words\":[{\"attribute\":{},\"end_time\":50380,\"start_time\":50130,\"text\":\"开\"},{\"attribute\":{},\"end_time\":50620,\"start_time\":50380,\"text\":\"天\"},{\"attribute\":{},\"end_time\":50860,\"start_time\":50620,\"text\":\"辟\"},{\"attribute\":{},\"end_time\":51109,\"start_time\":50860,\"text\":\"地\"},{\"attribute\":{},\"end_time\":51820,\"start_time\":51650,\"text\":\"辉\"},{\"attribute\":{},\"end_time\":51989,\"start_time\":51820,\"text\":\"煌\"},{\"attribute\":{},\"end_time\":53100,\"start_time\":52930,\"text\":\"诗\"},{\"attribute\":{},\"end_time\":53269,\"start_time\":53100,\"text\":\"篇\"},{\"attribute\":{},\"end_time\":55269,\"start_time\":53269,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":57290,\"start_time\":56569,\"text\":\"[inst]\",\"words\":[{\"attribute\":{},\"end_time\":56650,\"start_time\":56569,\"text\":\"[\"},{\"attribute\":{},\"end_time\":57229,\"start_time\":56650,\"text\":\"inst\"},{\"attribute\":{},\"end_time\":57290,\"start_time\":57229,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":60249,\"start_time\":57290,\"text\":\"[verse]\",\"words\":[{\"attribute\":{},\"end_time\":57290,\"start_time\":57290,\"text\":\"[\"},{\"attribute\":{},\"end_time\":58869,\"start_time\":57290,\"text\":\"verse\"},{\"attribute\":{},\"end_time\":60249,\"start_time\":58869,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":62000,\"start_time\":60250,\"text\":\"一艘红船破浪前行\",\"words\":[{\"attribute\":{},\"end_time\":60500,\"start_time\":60250,\"text\":\"一\"},{\"attribute\":{},\"end_time\":60700,\"start_time\":60500,\"text\":\"艘\"},{\"attribute\":{},\"end_time\":60900,\"start_time\":60700,\"text\":\"红\"},{\"attribute\":{},\"end_time\":61120,\"start_time\":60900,\"text\":\"船\"},{\"attribute\":{},\"end_time\":61389,\"start_time\":61120,\"text\":\"破\"},{\"attribute\":{},\"end_time\":61660,\"start_time\":61490,\"text\":\"浪\"},{\"attribute\":{},\"end_time\":61780,\"start_time\":61660,\"text\":\"前\"},{\"attribute\":{},\"end_time\":62000,\"start_time\":61780,\"text\":\"行\"},{\"attribute\":{},\"end_time\":62000,\"start_time\":62000,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":64929,\"start_time\":62000,\"text\":\"见证百年风云变幻\",\"words\":[{\"attribute\":{},\"end_time\":62140,\"start_time\":62000,\"text\":\"见\"},{\"attribute\":{},\"end_time\":62309,\"start_time\":62140,\"text\":\"证\"},{\"attribute\":{},\"end_time\":63380,\"start_time\":63210,\"text\":\"百\"},{\"attribute\":{},\"end_time\":63549,\"start_time\":63380,\"text\":\"年\"},{\"attribute\":{},\"end_time\":63780,\"start_time\":63610,\"text\":\"风\"},{\"attribute\":{},\"end_time\":63820,\"start_time\":63780,\"text\":\"云\"},{\"attribute\":{},\"end_time\":63989,\"start_time\":63820,\"text\":\"变\"},{\"attribute\":{},\"end_time\":64389,\"start_time\":64090,\"text\":\"幻\"},{\"attribute\":{},\"end_time\":64929,\"start_time\":64389,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":71769,\"start_time\":64930,\"text\":\"南湖烟雨初心如磐\",\"words\":[{\"attribute\":{},\"end_time\":65100,\"start_time\":64930,\"text\":\"南\"},{\"attribute\":{},\"end_time\":65140,\"start_time\":65100,\"text\":\"湖\"},{\"attribute\":{},\"end_time\":65309,\"start_time\":65140,\"text\":\"烟\"},{\"attribute\":{},\"end_time\":66949,\"start_time\":66650,\"text\":\"雨\"},{\"attribute\":{},\"end_time\":68709,\"start_time\":68410,\"text\":\"初\"},{\"attribute\":{},\"end_time\":69149,\"start_time\":68850,\"text\":\"心\"},{\"attribute\":{},\"end_time\":69820,\"start_time\":69650,\"text\":\"如\"},{\"attribute\":{},\"end_time\":69989,\"start_time\":69820,\"text\":\"磐\"},{\"attribute\":{},\"end_time\":71769,\"start_time\":69989,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":77989,\"start_time\":71770,\"text\":\"燎原星火点燃天地间\",\"words\":[{\"attribute\":{},\"end_time\":71940,\"start_time\":71770,\"text\":\"燎\"},{\"attribute\":{},\"end_time\":72080,\"start_time\":71940,\"text\":\"原\"},{\"attribute\":{},\"end_time\":72300,\"start_time\":72080,\"text\":\"星\"},{\"attribute\":{},\"end_time\":72549,\"start_time\":72300,\"text\":\"火\"},{\"attribute\":{},\"end_time\":74000,\"start_time\":73730,\"text\":\"点\"},{\"attribute\":{},\"end_time\":74140,\"start_time\":74000,\"text\":\"燃\"},{\"attribute\":{},\"end_time\":74309,\"start_time\":74140,\"text\":\"天\"},{\"attribute\":{},\"end_time\":75149,\"start_time\":74850,\"text\":\"地\"},{\"attribute\":{},\"end_time\":75989,\"start_time\":75690,\"text\":\"间\"},{\"attribute\":{},\"end_time\":77989,\"start_time\":75989,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":79089,\"start_time\":78250,\"text\":\"[chorus]\",\"words\":[{\"attribute\":{},\"end_time\":78250,\"start_time\":78250,\"text\":\"[\"},{\"attribute\":{},\"end_time\":78829,\"start_time\":78250,\"text\":\"chorus\"},{\"attribute\":{},\"end_time\":79089,\"start_time\":78829,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":82529,\"start_time\":79090,\"text\":\"百年风华薪火相传\",\"words\":[{\"attribute\":{},\"end_time\":79260,\"start_time\":79090,\"text\":\"百\"},{\"attribute\":{},\"end_time\":79429,\"start_time\":79260,\"text\":\"年\"},{\"attribute\":{},\"end_time\":79940,\"start_time\":79770,\"text\":\"风\"},{\"attribute\":{},\"end_time\":80109,\"start_time\":79940,\"text\":\"华\"},{\"attribute\":{},\"end_time\":80380,\"start_time\":80210,\"text\":\"薪\"},{\"attribute\":{},\"end_time\":80549,\"start_time\":80380,\"text\":\"火\"},{\"attribute\":{},\"end_time\":80980,\"start_time\":80810,\"text\":\"相\"},{\"attribute\":{},\"end_time\":81149,\"start_time\":80980,\"text\":\"传\"},{\"attribute\":{},\"end_time\":82529,\"start_time\":81149,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":85969,\"start_time\":82530,\"text\":\"披荆斩棘一往无前\",\"words\":[{\"attribute\":{},\"end_time\":82700,\"start_time\":82530,\"text\":\"披\"},{\"attribute\":{},\"end_time\":82869,\"start_time\":82700,\"text\":\"荆\"},{\"attribute\":{},\"end_time\":83100,\"start_time\":82930,\"text\":\"斩\"},{\"attribute\":{},\"end_time\":83269,\"start_time\":83100,\"text\":\"棘\"},{\"attribute\":{},\"end_time\":83709,\"start_time\":83410,\"text\":\"一\"},{\"attribute\":{},\"end_time\":84080,\"start_time\":83810,\"text\":\"往\"},{\"attribute\":{},\"end_time\":84220,\"start_time\":84080,\"text\":\"无\"},{\"attribute\":{},\"end_time\":84389,\"start_time\":84220,\"text\":\"前\"},{\"attribute\":{},\"end_time\":85969,\"start_time\":84389,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":89369,\"start_time\":85970,\"text\":\"百年伟业初心不忘\",\"words\":[{\"attribute\":{},\"end_time\":86140,\"start_time\":85970,\"text\":\"百\"},{\"attribute\":{},\"end_time\":86309,\"start_time\":86140,\"text\":\"年\"},{\"attribute\":{},\"end_time\":86909,\"start_time\":86610,\"text\":\"伟\"},{\"attribute\":{},\"end_time\":87349,\"start_time\":87050,\"text\":\"业\"},{\"attribute\":{},\"end_time\":87989,\"start_time\":87690,\"text\":\"初\"},{\"attribute\":{},\"end_time\":88360,\"start_time\":88090,\"text\":\"心\"},{\"attribute\":{},\"end_time\":88629,\"start_time\":88360,\"text\":\"不\"},{\"attribute\":{},\"end_time\":89069,\"start_time\":88770,\"text\":\"忘\"},{\"attribute\":{},\"end_time\":89369,\"start_time\":89069,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":91769,\"start_time\":89370,\"text\":\"红色江山坚如磐石\",\"words\":[{\"attribute\":{},\"end_time\":89540,\"start_time\":89370,\"text\":\"红\"},{\"attribute\":{},\"end_time\":89709,\"start_time\":89540,\"text\":\"色\"},{\"attribute\":{},\"end_time\":90080,\"start_time\":89850,\"text\":\"江\"},{\"attribute\":{},\"end_time\":90280,\"start_time\":90080,\"text\":\"山\"},{\"attribute\":{},\"end_time\":90549,\"start_time\":90280,\"text\":\"坚\"},{\"attribute\":{},\"end_time\":90920,\"start_time\":90650,\"text\":\"如\"},{\"attribute\":{},\"end_time\":91060,\"start_time\":90920,\"text\":\"磐\"},{\"attribute\":{},\"end_time\":91229,\"start_time\":91060,\"text\":\"石\"},{\"attribute\":{},\"end_time\":91769,\"start_time\":91229,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":92809,\"start_time\":91770,\"text\":\"[chorus]\",\"words\":[{\"attribute\":{},\"end_time\":91770,\"start_time\":91770,\"text\":\"[\"},{\"attribute\":{},\"end_time\":92709,\"start_time\":91770,\"text\":\"chorus\"},{\"attribute\":{},\"end_time\":92809,\"start_time\":92709,\"text\":\"]\"}]},{\"attribute\":{},\"end_time\":96249,\"start_time\":92810,\"text\":\"百年风华续写新篇\",\"words\":[{\"attribute\":{},\"end_time\":92980,\"start_time\":92810,\"text\":\"百\"},{\"attribute\":{},\"end_time\":93149,\"start_time\":92980,\"text\":\"年\"},{\"attribute\":{},\"end_time\":93620,\"start_time\":93450,\"text\":\"风\"},{\"attribute\":{},\"end_time\":93789,\"start_time\":93620,\"text\":\"华\"},{\"attribute\":{},\"end_time\":94829,\"start_time\":94530,\"text\":\"续\"},{\"attribute\":{},\"end_time\":95200,\"start_time\":94930,\"text\":\"写\"},{\"attribute\":{},\"end_time\":95340,\"start_time\":95200,\"text\":\"新\"},{\"attribute\":{},\"end_time\":95509,\"start_time\":95340,\"text\":\"篇\"},{\"attribute\":{},\"end_time\":96249,\"start_time\":95509,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":99649,\"start_time\":96250,\"text\":\"中华巨轮扬帆远航\",\"words\":[{\"attribute\":{},\"end_time\":96420,\"start_time\":96250,\"text\":\"中\"},{\"attribute\":{},\"end_time\":96589,\"start_time\":96420,\"text\":\"华\"},{\"attribute\":{},\"end_time\":96920,\"start_time\":96690,\"text\":\"巨\"},{\"attribute\":{},\"end_time\":97140,\"start_time\":96920,\"text\":\"轮\"},{\"attribute\":{},\"end_time\":97300,\"start_time\":97140,\"text\":\"扬\"},{\"attribute\":{},\"end_time\":97469,\"start_time\":97300,\"text\":\"帆\"},{\"attribute\":{},\"end_time\":97940,\"start_time\":97770,\"text\":\"远\"},{\"attribute\":{},\"end_time\":98109,\"start_time\":97940,\"text\":\"航\"},{\"attribute\":{},\"end_time\":99649,\"start_time\":98109,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":103089,\"start_time\":99650,\"text\":\"百年奋斗圆梦可期\",\"words\":[{\"attribute\":{},\"end_time\":99840,\"start_time\":99650,\"text\":\"百\"},{\"attribute\":{},\"end_time\":100029,\"start_time\":99840,\"text\":\"年\"},{\"attribute\":{},\"end_time\":100500,\"start_time\":100330,\"text\":\"奋\"},{\"attribute\":{},\"end_time\":100669,\"start_time\":100500,\"text\":\"斗\"},{\"attribute\":{},\"end_time\":101709,\"start_time\":101410,\"text\":\"圆\"},{\"attribute\":{},\"end_time\":102080,\"start_time\":101810,\"text\":\"梦\"},{\"attribute\":{},\"end_time\":102349,\"start_time\":102080,\"text\":\"可\"},{\"attribute\":{},\"end_time\":102789,\"start_time\":102490,\"text\":\"期\"},{\"attribute\":{},\"end_time\":103089,\"start_time\":102789,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":106529,\"start_time\":103090,\"text\":\"复兴路上再创辉煌\",\"words\":[{\"attribute\":{},\"end_time\":103260,\"start_time\":103090,\"text\":\"复\"},{\"attribute\":{},\"end_time\":103429,\"start_time\":103260,\"text\":\"兴\"},{\"attribute\":{},\"end_time\":103660,\"start_time\":103490,\"text\":\"路\"},{\"attribute\":{},\"end_time\":103829,\"start_time\":103660,\"text\":\"上\"},{\"attribute\":{},\"end_time\":104269,\"start_time\":103970,\"text\":\"再\"},{\"attribute\":{},\"end_time\":105149,\"start_time\":104850,\"text\":\"创\"},{\"attribute\":{},\"end_time\":106220,\"start_time\":106050,\"text\":\"辉\"},{\"attribute\":{},\"end_time\":106389,\"start_time\":106220,\"text\":\"煌\"},{\"attribute\":{},\"end_time\":106529,\"start_time\":106389,\"text\":\"\"}]},{\"attribute\":{},\"end_time\":107737,\"start_time\":106530,\"text\":\"[outro]\",\"words\":[{\"attribute\":{},\"end_time\":106530,\"start_time\":106530,\"text\":\"[\"},{\"attribute\":{},\"end_time\":107623,\"start_time\":106530,\"text\":\"outro\"},{\"attribute\":{},\"end_time\":107737,\"start_time\":107623,\"text\":\"]\"}]}]}"
+    #   "captions_url": "/music/captions/3f2a9c0e5b7d41e8a6c2d9f0b1e4a7c3.json",
     # }
-    try:
+    async def generate() -> dict:
         # 生成音乐URL
-        agent = MusicAgent()
+        music_agent = await music_agent_module.load()
+        agent = music_agent.MusicAgent()
         original_url, audio_captions = await agent.generate_music(
             prompt=generate_param.prompt,
             gender=generate_param.gender,
@@ -220,43 +286,215 @@ async def music_generate(generate_param: MusicGenerateParam):
 
         logger.info(f"生成音乐原始URL: {original_url}")
 
-        # 缓存音频文件
-        cached_filename = await cache_audio_file(original_url)
+        # 边下边播: 第一块数据写入缓存后即返回本地URL
+        cached_filename, captions_url = await asyncio.gather(
+            cache_audio_file(original_url, wait=False), cache_captions(audio_captions)
+        )
 
         # 返回本地缓存URL
         local_url = f"/music/cache/{cached_filename}"
         logger.info(f"返回本地缓存URL: {local_url}")
 
-        return {"music_url": local_url, "audio_captions": audio_captions}
+        # 歌词单独请求，响应中只返回地址
+        return {"music_url": local_url, "captions_url": captions_url}
 
+    try:
+        # 相同参数的生成正在进行时等待同一个结果
+        return await music_generate_flight.do(music_param_key(generate_param), generate)
+    except UpstreamOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         logger.error(f"音乐生成失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"音乐生成失败: {str(e)}")
 
 
+@app.post("/music/jobs")
+async def music_job_submit(generate_param: MusicGenerateParam):
+    """提交音乐生成任务，立即返回任务ID"""
+    try:
+        job = await music_job_manager.submit(generate_param)
+    except MusicJobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@app.get("/music/jobs/{job_id}")
+async def music_job_status(job_id: str):
+    """查询音乐生成任务状态和进度"""
+    job = await music_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="音乐生成任务不存在")
+    return job
+
+
+@app.get("/music/jobs/{job_id}/events")
+async def music_job_events(job_id: str):
+    """以SSE推送音乐生成任务的进度，结束时附带缓存URL和歌词地址"""
+    if await music_job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="音乐生成任务不存在")
+    stream = (job.model_dump() async for job in music_job_manager.subscribe(job_id))
+    return StreamingResponse(dict_stream_generator(stream, SSEEncoder("music_job_events")), media_type="text/event-stream")
+
+
 @app.post("/policy_agent/ask")
 async def policy_qa(qa_param: PolicyQaParam):
+    """
+    政策问答，对话历史保存在服务端会话中
+
+    首次请求不带 session_id，会创建新会话并通过 X-Session-Id 响应头返回；
+    之后的请求带上 session_id，只需上传新的 user_input。
+    """
+    policy_qa = await policy_qa_module.load()
+    policy_session_store = policy_qa.policy_session_store
+    if qa_param.session_id:
+        session = await policy_session_store.get(qa_param.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="会话不存在或已过期")
+    else:
+        session = await policy_session_store.create(qa_param.context_messages)
     try:
-        agent = PolicyAgent()
-        stream = await agent.ask(qa_param.user_input, qa_param.context_messages)
-        return StreamingResponse(openai_stream_generator(stream), media_type="text/event-stream")
+        agent = policy_qa.PolicyAgent()
+        stream = await agent.ask_in_session(session, qa_param.user_input)
+        stats = agent.context_stats
+        headers = {
+            "X-Session-Id": session.session_id,
+            "X-Context-Tokens": str(stats.sent_tokens),
+            "X-Context-Tokens-Saved": str(stats.saved_tokens),
+        }
+        return StreamingResponse(
+            openai_stream_generator(stream, SSEEncoder("policy_qa")), media_type="text/event-stream", headers=headers
+        )
+    except UpstreamOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         logger.error(f"政策问答失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"政策问答失败: {str(e)}")
 
 @app.post("/activity_design")
-async def activity_design(design_param: ActivityDesignInput):
+async def activity_design(design_param: ActivityDesignInput, no_cache: bool = False, delta: bool = False):
+    """
+    生成活动方案，相同主题/时长/对象的结果会被缓存
+
+    no_cache=true 时跳过缓存重新生成；delta=true 时以增量操作代替每次完整结果（见 json_delta）
+    """
     try:
-        agent = ActivityDesignAgent()
-        stream = await agent.generate(design_param)
-        return StreamingResponse(dict_stream_generator(stream), media_type="text/event-stream")
+        activity_design = await activity_design_module.load()
+        agent = activity_design.ActivityDesignAgent()
+        stream = await agent.generate(design_param, use_cache=not no_cache)
+        encoder = SSEEncoder("activity_design")
+        generator = delta_stream_generator(stream, encoder) if delta else dict_stream_generator(stream, encoder)
+        return StreamingResponse(generator, media_type="text/event-stream")
+    except UpstreamOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         logger.error(f"活动设计失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"活动设计失败: {str(e)}")
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# 各组件自己维护的计数在抓取时读取
+limiters = (ark_limiter, song_limiter)
+
+
+def streamers() -> list:
+    """已导入的智能体的流式调用统计，还没有导入的智能体没有数据"""
+    policy_qa, activity_design = policy_qa_module.module, activity_design_module.module
+    return ([policy_qa.policy_streamer] if policy_qa else []) + ([activity_design.activity_streamer] if activity_design else [])
+
+
+def flights() -> list[SingleFlight]:
+    activity_design = activity_design_module.module
+    return ([activity_design.activity_design_flight] if activity_design else []) + [music_generate_flight]
+
+
+def activity_cache_requests() -> list:
+    activity_design = activity_design_module.module
+    if activity_design is None:
+        return []
+    cache = activity_design.activity_design_cache
+    return [(("hit",), cache.hits), (("miss",), cache.misses)]
+
+
+def prefix_cache_tokens() -> list:
+    if prefix_cache_module.module is None:
+        return []
+    prefix_cache = prefix_cache_module.module.prefix_cache
+    return [(("cached",), prefix_cache.cached_tokens), (("uncached",), prefix_cache.uncached_tokens)]
+
+
+registry.collector(
+    "audio_cache_requests_total", "按来源地址查询音频缓存的次数，正在下载的地址计为命中", "counter", ("result",),
+    lambda: [(("hit",), audio_cache.hits), (("miss",), audio_cache.misses)],
+)
+registry.collector(
+    "audio_cache_hit_ratio", "音频缓存命中率", "gauge", (),
+    lambda: [((), audio_cache.hits / max(audio_cache.hits + audio_cache.misses, 1))],
+)
+registry.collector(
+    "audio_cache_bytes", "音频缓存占用字节数", "gauge", (), lambda: [((), audio_cache.total_bytes)],
+)
+registry.collector(
+    "activity_cache_requests_total", "活动设计结果缓存查询次数", "counter", ("result",),
+    activity_cache_requests,
+)
+registry.collector(
+    "admission_active", "占用中的上游名额", "gauge", ("upstream",),
+    lambda: [((limiter.name,), limiter.active) for limiter in limiters],
+)
+registry.collector(
+    "admission_queue_depth", "等待上游名额的请求数", "gauge", ("upstream", "lane"),
+    lambda: [((limiter.name, priority.name.lower()), lane.queued) for limiter in limiters for priority, lane in limiter.lanes.items()],
+)
+registry.collector(
+    "admission_admitted_total", "取得上游名额的请求数", "counter", ("upstream", "lane"),
+    lambda: [((limiter.name, priority.name.lower()), lane.admitted) for limiter in limiters for priority, lane in limiter.lanes.items()],
+)
+registry.collector(
+    "admission_rejected_total", "被拒绝（429）的请求数", "counter", ("upstream", "lane"),
+    lambda: [((limiter.name, priority.name.lower()), lane.rejected) for limiter in limiters for priority, lane in limiter.lanes.items()],
+)
+registry.collector(
+    "admission_wait_seconds_total", "等待上游名额的总时间", "counter", ("upstream", "lane"),
+    lambda: [((limiter.name, priority.name.lower()), lane.wait_seconds) for limiter in limiters for priority, lane in limiter.lanes.items()],
+)
+registry.collector(
+    "upstream_throttled_total", "上游返回 429 的次数", "counter", ("upstream",),
+    lambda: [((limiter.name,), limiter.throttled) for limiter in limiters],
+)
+registry.collector(
+    "llm_stream_events_total", "大模型流式请求的对冲、重试和停滞次数", "counter", ("agent", "event"),
+    lambda: [
+        ((streamer.name, event), getattr(streamer, event))
+        for streamer in streamers() for event in ("requests", "hedged", "hedge_skipped", "hedge_wins", "retries", "stalls")
+    ],
+)
+registry.collector(
+    "single_flight_calls_total", "相同请求合并：实际上游调用和被合并的调用", "counter", ("name", "result"),
+    lambda: [((flight.name, "upstream"), flight.upstream_calls) for flight in flights()]
+    + [((flight.name, "coalesced"), flight.coalesced) for flight in flights()],
+)
+registry.collector(
+    "prefix_cache_tokens_total", "上游上下文缓存命中和未命中的 prompt token 数", "counter", ("result",),
+    prefix_cache_tokens,
+)
+registry.collector(
+    "music_prompt_pool_size", "预生成的音乐prompt数量", "gauge", (), lambda: [((), len(music_prompt_pool))],
+)
+registry.collector(
+    "music_prompt_pool_requests_total", "音乐prompt池取用次数", "counter", ("result",),
+    lambda: [(("hit",), music_prompt_pool.hits), (("miss",), music_prompt_pool.misses)],
+)
+
+
 frontend_dir = Path(__file__).resolve().parent.parent / "frontend"
-app.mount("/", StaticFiles(directory=frontend_dir, html=True), name="static")
+# 前端资源在启动时构建：内联组件模板、合并 CSS、文件名加内容哈希并预压缩
+static_assets = StaticAssets(frontend_dir, settings.CACHE_DIR / "static")
+app.mount("/", static_assets, name="static")
 
 
 
@@ -264,4 +502,11 @@ if __name__ == "__main__":
     import uvicorn
     log_config_file = Path(__file__).resolve().parent / "log_conf.yaml"
     print(f"Using log config file at: {log_config_file}")
-    uvicorn.run(app, host="0.0.0.0", port=8002, log_config=str(log_config_file))
\ No newline at end of file
+    # 多个 worker 时每个进程各自导入应用，需要传入导入路径
+    uvicorn.run(
+        app if settings.WORKERS == 1 else "src.main:app",
+        host="0.0.0.0",
+        port=8002,
+        workers=settings.WORKERS,
+        log_config=str(log_config_file),
+    )
\ No newline at end of file
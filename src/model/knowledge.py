@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+
+class DocumentChunk(BaseModel):
+    doc_id: str
+    title: str
+    # 在文档中的序号
+    position: int
+    content: str
+    content_hash: str
+
+
+class SearchResult(BaseModel):
+    chunk: DocumentChunk
+    # 余弦相似度
+    score: float
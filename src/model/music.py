@@ -1,7 +1,22 @@
 from pydantic import BaseModel
+from typing import Literal
 
 class MusicGenerateParam(BaseModel):
     prompt: str|None = None
     gender: str|None = None
     genre: str|None = None
-    mood: str|None = None
\ No newline at end of file
+    mood: str|None = None
+
+
+class MusicJob(BaseModel):
+    job_id: str
+    status: Literal["queued", "submitted", "running", "succeeded", "failed"] = "queued"
+    param: MusicGenerateParam
+    task_id: str | None = None
+    progress: int = 0
+    predicted_wait_time: float | None = None
+    music_url: str | None = None
+    captions_url: str | None = None
+    error: str | None = None
+    created_at: float
+    updated_at: float
@@ -9,5 +9,15 @@ class PolicyQaMessage(BaseModel):
 
 class PolicyQaParam(BaseModel):
     user_input: str
+    # 服务端会话id，由上一次 /policy_agent/ask 的 X-Session-Id 响应头返回
+    session_id: str | None = None
+    # 不带 session_id 时可上传已有的历史，作为新会话的初始内容
     context_messages: list[PolicyQaMessage] | None = None
 
+
+class PolicySession(BaseModel):
+    session_id: str
+    messages: list[PolicyQaMessage] = []
+    # 上一轮对话历史的折叠位置，见 ContextWindow.build
+    context_start: int = 0
+
@@ -0,0 +1,5 @@
+import os
+
+# 配置中的必填项，测试不会访问真实的上游服务
+for name in ("VE_KEY", "VE_AK", "VE_SK"):
+    os.environ.setdefault(name, "test")
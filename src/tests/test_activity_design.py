@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from src.agent import activity_design
+from src.agent.activity_design import ActivityDesignAgent, activity_cache_key
+from src.model.activity import ActivityDesignInput, ActivityDesignOutput
+from src.model.knowledge import DocumentChunk
+from src.utils.knowledge.chunking import content_hash
+from src.utils.knowledge.hybrid import HybridRetriever
+from src.utils.result_cache import ResultCache
+
+USER_INPUT = ActivityDesignInput(theme="科技强国", minute=45, participant="预备党员")
+OUTPUT = ActivityDesignOutput(学习资料=["资料"], 讨论议题=["议题"], 活动流程建议="流程")
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch) -> ResultCache:
+    cache = ResultCache("activity_design", ttl=60, maxsize=8)
+    monkeypatch.setattr(activity_design, "activity_design_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def agent(monkeypatch) -> ActivityDesignAgent:
+    """不调用大模型，_open 直接返回写缓存的流"""
+    agent = object.__new__(ActivityDesignAgent)
+    opened = []
+
+    async def upstream(chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def fake_open(key, user_input, chunks=(OUTPUT.model_dump(),)):
+        opened.append(key)
+        return agent._store(key, upstream(chunks))
+
+    monkeypatch.setattr(agent, "_open", fake_open)
+    agent.opened = opened
+    return agent
+
+
+async def collect(stream) -> list[dict]:
+    return [chunk async for chunk in stream]
+
+
+def test_cache_key_normalizes_inputs():
+    same = ActivityDesignInput(theme=" 科技强国　", minute=45, participant="预备党员 ")
+    assert activity_cache_key(same) == activity_cache_key(USER_INPUT)
+    assert activity_cache_key(USER_INPUT.model_copy(update={"minute": 60})) != activity_cache_key(USER_INPUT)
+
+
+def test_generated_result_cached_and_replayed(agent: ActivityDesignAgent, cache: ResultCache):
+    async def main():
+        first = await collect(await agent.generate(USER_INPUT))
+        second = await collect(await agent.generate(USER_INPUT))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == [OUTPUT.model_dump()]
+    assert len(agent.opened) == 1
+    assert cache.hits == 1
+
+
+def test_corrupted_cache_entry_regenerated(agent: ActivityDesignAgent, cache: ResultCache):
+    key = activity_cache_key(USER_INPUT)
+
+    async def main():
+        await cache.set(key, '{"学习资料": 1')
+        chunks = await collect(await agent.generate(USER_INPUT))
+        return chunks, await cache.get(key)
+
+    chunks, stored = asyncio.run(main())
+    assert chunks == [OUTPUT.model_dump()]
+    assert agent.opened == [key]
+    # 损坏的条目被重新生成的结果替换
+    assert ActivityDesignOutput.model_validate_json(stored) == OUTPUT
+
+
+def test_incomplete_result_not_cached(cache: ResultCache):
+    async def upstream():
+        yield {"学习资料": ["资料"]}
+
+    async def main():
+        chunks = await collect(ActivityDesignAgent._store("key", upstream()))
+        return chunks, await cache.get("key")
+
+    chunks, stored = asyncio.run(main())
+    assert chunks == [{"学习资料": ["资料"]}]
+    assert stored is None
+
+
+def test_cache_key_depends_on_prompt_mode(monkeypatch):
+    full = activity_cache_key(USER_INPUT)
+    monkeypatch.setattr(activity_design.settings, "ACTIVITY_PROMPT_MODE", "retrieval")
+    assert activity_cache_key(USER_INPUT) != full
+
+
+def test_retrieval_prompt_keeps_overview_and_relevant_sections(monkeypatch):
+    sections = ["总述", "支部党员大会", "党课要求预备党员参加", "党小组会"]
+    retriever = HybridRetriever([
+        DocumentChunk(doc_id="三会一课", title="三会一课", position=index, content=section, content_hash=content_hash(section))
+        for index, section in enumerate(sections)
+    ])
+    monkeypatch.setattr(activity_design, "_section_retriever", retriever)
+    monkeypatch.setattr(activity_design.settings, "ACTIVITY_RETRIEVAL_TOP_K", 1)
+
+    async def main():
+        retrieval = await ActivityDesignAgent.build_messages(USER_INPUT, mode="retrieval")
+        full = await ActivityDesignAgent.build_messages(USER_INPUT, mode="full")
+        return retrieval, full
+
+    retrieval, full = asyncio.run(main())
+    prompt = "\n".join(message.content for message in retrieval)
+    # 总述始终放在最前，之后只有最相关的小节
+    assert "总述\n\n党课要求预备党员参加" in prompt
+    assert "党小组会" not in prompt and "支部党员大会" not in prompt
+    assert "科技强国" in prompt
+    assert len("".join(message.content for message in full)) > len(prompt)
+
+
+def test_section_retriever_built_on_first_use(monkeypatch):
+    monkeypatch.setattr(activity_design, "_section_retriever", None)
+    retriever = activity_design.get_section_retriever()
+    assert activity_design.get_section_retriever() is retriever
+    # 第一个小节是总述，之后每个小节以所属的各级标题开头
+    assert retriever.chunks[0].position == 0
+    assert len(retriever.chunks) > 1
@@ -0,0 +1,201 @@
+import asyncio
+import gc
+import math
+
+import pytest
+
+from src.utils.admission import Priority, UpstreamLimiter, UpstreamOverloaded
+
+
+def make_limiter(concurrency: int = 1, queue_size: int = 10, timeout: float = 5.0) -> UpstreamLimiter:
+    return UpstreamLimiter("test", rate=0, burst=1, concurrency=concurrency, queue_size=queue_size, timeout=timeout)
+
+
+async def chunks(*items, delay: float = 0.0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+def test_higher_priority_admitted_first():
+    async def main():
+        limiter = make_limiter()
+        lease = await limiter.acquire(Priority.CHAT)
+        order = []
+
+        async def request(priority: Priority):
+            async with await limiter.acquire(priority):
+                order.append(priority)
+
+        tasks = [asyncio.create_task(request(priority)) for priority in (Priority.BACKGROUND, Priority.MUSIC, Priority.CHAT)]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 3
+        lease.release()
+        await asyncio.gather(*tasks)
+        assert order == [Priority.CHAT, Priority.MUSIC, Priority.BACKGROUND]
+        assert limiter.active == 0
+        assert limiter.lanes[Priority.BACKGROUND].admitted == 1
+
+    asyncio.run(main())
+
+
+def test_full_queue_evicts_lower_priority():
+    async def main():
+        limiter = make_limiter(queue_size=1)
+        lease = await limiter.acquire(Priority.CHAT)
+        background = asyncio.create_task(limiter.acquire(Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        chat = asyncio.create_task(limiter.acquire(Priority.CHAT))
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamOverloaded):
+            await background
+        # 没有更低优先级的排队请求时直接拒绝
+        with pytest.raises(UpstreamOverloaded):
+            await limiter.acquire(Priority.BACKGROUND)
+        lease.release()
+        (await chat).release()
+        assert limiter.lanes[Priority.BACKGROUND].rejected == 2
+        assert limiter.active == 0
+        assert limiter.queue_depth == 0
+
+    asyncio.run(main())
+
+
+def test_queue_timeout():
+    async def main():
+        limiter = make_limiter(timeout=0.01)
+        lease = await limiter.acquire(Priority.CHAT)
+        with pytest.raises(UpstreamOverloaded) as info:
+            await limiter.acquire(Priority.ACTIVITY)
+        assert info.value.headers["Retry-After"] == "1"
+        assert limiter.queue_depth == 0
+        lease.release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_timeout_after_grant_does_not_leak(monkeypatch):
+    async def main():
+        limiter = make_limiter()
+        lease = await limiter.acquire(Priority.CHAT)
+        wait_for = asyncio.wait_for
+
+        async def granted_then_timeout(future, timeout):
+            # 名额分给排队的请求的同时排队超时
+            lease.release()
+            await future
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", granted_then_timeout)
+        with pytest.raises(UpstreamOverloaded):
+            await limiter.acquire(Priority.CHAT)
+        monkeypatch.setattr(asyncio, "wait_for", wait_for)
+        assert limiter.queue_depth == 0
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak():
+    async def main():
+        limiter = make_limiter()
+        lease = await limiter.acquire(Priority.CHAT)
+        waiter = asyncio.create_task(limiter.acquire(Priority.CHAT, timeout=math.inf))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queue_depth == 0
+        lease.release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_release_is_idempotent():
+    async def main():
+        limiter = make_limiter(concurrency=2)
+        lease = await limiter.acquire(Priority.CHAT)
+        other = await limiter.acquire(Priority.CHAT)
+        lease.release()
+        lease.release()
+        assert limiter.active == 1
+        other.release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_try_acquire_does_not_queue():
+    async def main():
+        limiter = make_limiter()
+        lease = limiter.try_acquire(Priority.CHAT)
+        assert lease is not None
+        assert limiter.try_acquire(Priority.CHAT) is None
+        assert limiter.queue_depth == 0
+        lease.release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_stream_holds_lease_until_exhausted():
+    async def main():
+        limiter = make_limiter()
+        stream = await limiter.stream(Priority.CHAT, lambda: chunks(1, 2, 3))
+        assert limiter.active == 1
+        assert [item async for item in stream] == [1, 2, 3]
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_stream_releases_on_error_before_first_chunk():
+    async def failing():
+        raise ValueError("boom")
+        yield
+
+    async def main():
+        limiter = make_limiter()
+        with pytest.raises(ValueError):
+            await limiter.stream(Priority.CHAT, failing)
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_stream_releases_on_cancel_before_first_chunk():
+    async def main():
+        limiter = make_limiter()
+        task = asyncio.create_task(limiter.stream(Priority.CHAT, lambda: chunks(1, delay=10)))
+        await asyncio.sleep(0.01)
+        assert limiter.active == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_unconsumed_stream_releases_on_collect():
+    async def main():
+        limiter = make_limiter()
+        waiter = asyncio.create_task(limiter.acquire(Priority.CHAT))
+        stream = await limiter.stream(Priority.CHAT, lambda: chunks(1, 2))
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+        # 客户端断开时响应可能从未开始迭代，对象回收时归还名额并放行排队的请求
+        del stream
+        gc.collect()
+        (await asyncio.wait_for(waiter, 1)).release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+
+
+def test_lease_collected_after_loop_closed():
+    limiter = make_limiter()
+    leases = [asyncio.run(limiter.acquire(Priority.CHAT))]
+    leases.clear()
+    gc.collect()
+    assert limiter.active == 0
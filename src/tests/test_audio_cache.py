@@ -0,0 +1,194 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+from src.utils.audio_cache import INDEX_FILENAME, AudioCache, content_hash
+
+
+def index_names(cache_dir: Path) -> list[str]:
+    return [row[0] for row in json.loads((cache_dir / INDEX_FILENAME).read_text(encoding="utf-8"))["entries"]]
+
+
+async def started(cache_dir: Path, **kwargs) -> AudioCache:
+    cache = AudioCache(cache_dir, **kwargs)
+    await cache.start()
+    return cache
+
+
+def mock_upstream(cache: AudioCache, bodies: dict[str, bytes]) -> list[str]:
+    """用模拟的上游替换下载客户端，返回请求过的路径"""
+    requested = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=bodies[request.url.path])
+
+    cache._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return requested
+
+
+def test_lru_eviction_by_bytes(tmp_path: Path):
+    async def main():
+        cache = await started(tmp_path, max_bytes=25)
+        await cache.put("a.json", b"a" * 10)
+        await cache.put("b.json", b"b" * 10)
+        # 访问过的文件最后淘汰
+        cache.touch("a.json")
+        await cache.put("c.json", b"c" * 10)
+        assert not (tmp_path / "b.json").exists()
+        assert (tmp_path / "a.json").exists() and (tmp_path / "c.json").exists()
+        assert cache.total_bytes == 20
+        assert cache.evictions == 1
+        assert sorted(index_names(tmp_path)) == ["a.json", "c.json"]
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_expired_files_evicted_on_start(tmp_path: Path):
+    async def main():
+        cache = await started(tmp_path)
+        await cache.put("old.json", b"old")
+        await cache.close()
+        cache = await started(tmp_path, max_age=-1)
+        assert cache.stats()["entries"] == 0
+        assert not (tmp_path / "old.json").exists()
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_index_survives_restart(tmp_path: Path):
+    async def main():
+        cache = await started(tmp_path)
+        await cache.put("a.json", b"a" * 10)
+        await cache.close()
+        cache = await started(tmp_path)
+        assert cache.touch("a.json")
+        assert cache.total_bytes == 10
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_missing_index_rebuilt_from_directory(tmp_path: Path):
+    async def main():
+        (tmp_path / "a.mp3").write_bytes(b"a" * 10)
+        (tmp_path / ".part-p-1.mp3").write_bytes(b"partial")
+        cache = await started(tmp_path)
+        assert cache.stats()["entries"] == 1
+        assert index_names(tmp_path) == ["a.mp3"]
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_fetch_is_content_addressed_and_counts_lookups(tmp_path: Path):
+    async def main():
+        cache = await started(tmp_path)
+        requested = mock_upstream(cache, {"/one.mp3": b"same audio", "/two.mp3": b"same audio"})
+        # 同一地址同时请求只下载一次
+        first, second = await asyncio.gather(
+            cache.fetch("http://upstream/one.mp3"), cache.fetch("http://upstream/one.mp3")
+        )
+        assert first == second
+        assert content_hash(first) is not None
+        assert (tmp_path / first).read_bytes() == b"same audio"
+        # 已缓存的地址不再请求上游；内容相同的其他地址只保存一份
+        assert await cache.fetch("http://upstream/one.mp3") == first
+        assert await cache.fetch("http://upstream/two.mp3") == first
+        assert requested == ["/one.mp3", "/two.mp3"]
+        assert cache.stats()["entries"] == 1
+        assert cache.dedups == 1
+        # 每次按地址查询计一次命中或未命中，访问文件不计入
+        cache.touch(first)
+        assert (cache.hits, cache.misses) == (2, 2)
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_streaming_name_resolves_to_final_file(tmp_path: Path):
+    async def main():
+        cache = await started(tmp_path)
+        mock_upstream(cache, {"/one.mp3": b"audio" * 1000})
+        name = await cache.fetch("http://upstream/one.mp3", wait=False)
+        assert name.startswith("p-")
+        download = cache.active_download(name)
+        assert download is not None
+        await asyncio.wait_for(asyncio.shield(download.task), 1)
+        filename = cache.resolve(name)
+        assert content_hash(filename) is not None
+        # 其他 worker 通过符号链接解析
+        other = await started(tmp_path)
+        assert other.resolve(name) == filename
+        await other.close()
+        await cache.close()
+
+    asyncio.run(main())
+
+
+class BrokenStream(httpx.AsyncByteStream):
+    """发送一段数据后连接中断"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def __aiter__(self):
+        yield self.data
+        raise httpx.ReadError("connection reset")
+
+
+@pytest.mark.parametrize("honor_range", [True, False])
+def test_interrupted_download_resumes(tmp_path: Path, honor_range: bool):
+    body = bytes(range(256)) * 1024
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.headers.get("range"))
+        if len(requests) == 1:
+            return httpx.Response(200, headers={"content-length": str(len(body)), "etag": '"v1"'}, stream=BrokenStream(body[:100000]))
+        assert request.headers["if-range"] == '"v1"'
+        if not honor_range:
+            # 上游不支持续传时从头返回，已写入的部分被跳过
+            return httpx.Response(200, content=body)
+        start = int(request.headers["range"][len("bytes="):-1])
+        return httpx.Response(206, content=body[start:])
+
+    async def main():
+        cache = await started(tmp_path, download_retries=1)
+        cache._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        filename = await cache.fetch("http://upstream/one.mp3")
+        await cache.close()
+        return filename
+
+    filename = asyncio.run(main())
+    assert requests[0] is None
+    assert requests[1] is not None and requests[1] != "bytes=0-"
+    assert (tmp_path / filename).read_bytes() == body
+
+
+def test_workers_share_index(tmp_path: Path):
+    async def main():
+        first = await started(tmp_path)
+        second = await started(tmp_path)
+        await first.put("a.json", b"a" * 10)
+        await second.put("b.json", b"b" * 10)
+        assert second.touch("a.json")
+        # 一个 worker 淘汰的文件在另一个 worker 下次写索引时移除
+        first.discard("a.json")
+        (tmp_path / "a.json").unlink()
+        await first.flush()
+        second.touch("b.json")
+        await second.flush()
+        assert not second.touch("a.json")
+        assert second.total_bytes == 10
+        assert index_names(tmp_path) == ["b.json"]
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
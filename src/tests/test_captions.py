@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from src.utils.captions import CAPTIONS_VERSION, compact_captions
+
+UPSTREAM = {
+    "duration": 107.7375,
+    "utterances": [
+        {
+            "text": "第二行",
+            "start_time": 3000,
+            "end_time": 5000,
+            "words": [
+                {"text": "第", "start_time": 3000, "end_time": 3500},
+                {"text": "二", "start_time": 3500, "end_time": 4000},
+                {"text": "", "start_time": 4000, "end_time": 4200},
+                {"text": "行", "start_time": 4200, "end_time": 5000},
+            ],
+        },
+        {
+            "text": "第一行",
+            "start_time": 0,
+            "end_time": 2500,
+            "words": [
+                {"text": "第", "start_time": 0, "end_time": 800},
+                {"text": "一", "start_time": 800, "end_time": 1600},
+                {"text": "行", "start_time": 1600, "end_time": 2500},
+            ],
+        },
+    ],
+}
+
+
+def test_compact_captions():
+    captions = compact_captions(json.dumps(UPSTREAM, ensure_ascii=False))
+    assert captions == {
+        "v": CAPTIONS_VERSION,
+        "duration": 107738,
+        # 各行按开始时间排列，空字不保留
+        "lines": {"start": [0, 3000], "end": [2500, 5000], "text": ["第一行", "第二行"]},
+        "words": {
+            "start": [0, 800, 1600, 3000, 3500, 4200],
+            "end": [800, 1600, 2500, 3500, 4000, 5000],
+            "text": ["第", "一", "行", "第", "二", "行"],
+        },
+        "line_words": [0, 3, 6],
+    }
+    # 已经解析过的字典同样可以转换
+    assert compact_captions(UPSTREAM) == captions
+
+
+@pytest.mark.parametrize("duration", [None, "", "abc", [1], float("nan"), float("inf")])
+def test_invalid_duration_falls_back_to_last_line(duration):
+    data = dict(UPSTREAM, duration=duration)
+    captions = compact_captions(data)
+    assert captions is not None
+    assert captions["duration"] == 5000
+    assert captions["lines"]["text"] == ["第一行", "第二行"]
+
+
+def test_missing_duration_falls_back_to_last_line():
+    data = {key: value for key, value in UPSTREAM.items() if key != "duration"}
+    assert compact_captions(data)["duration"] == 5000
+
+
+@pytest.mark.parametrize("captions", [None, "", "not json", "[]", json.dumps({"utterances": []}),
+                                      json.dumps({"utterances": [{"start_time": "x"}]})])
+def test_no_usable_captions(captions):
+    assert compact_captions(captions) is None
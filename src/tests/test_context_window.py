@@ -0,0 +1,139 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.agent.context_window import SUMMARY_HEADER, ContextWindow, estimate_tokens, message_tokens
+
+
+class FakeSummarizer:
+    def __init__(self, fail: bool = False):
+        self.calls: list[tuple[str, str]] = []
+        self.fail = fail
+
+    async def __call__(self, summary: str, dialogue: str) -> str:
+        self.calls.append((summary, dialogue))
+        if self.fail:
+            raise RuntimeError("llm down")
+        return f"摘要{len(self.calls)}"
+
+
+def dialogue(turns: int) -> list:
+    """每条消息 10 个汉字，估算 14 个 token"""
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"问{turn}" + "问" * (10 - len(f"问{turn}"))))
+        messages.append(AIMessage(content=f"答{turn}" + "答" * (10 - len(f"答{turn}"))))
+    return messages
+
+
+async def settle(window: ContextWindow):
+    await asyncio.gather(*window._pending.values())
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("hello world!") == 3
+    assert estimate_tokens("你好 abcd") == 2 + 2
+    assert message_tokens(HumanMessage(content="你好")) == 6
+
+
+def test_history_within_budget_unchanged():
+    window = ContextWindow(FakeSummarizer(), budget=100, min_recent=2, cache_size=8)
+    history = dialogue(3)
+
+    async def main():
+        return window.build(history)
+
+    messages, stats = asyncio.run(main())
+    assert messages == history
+    assert stats.folded_messages == 0
+    assert stats.saved_tokens == 0
+
+
+def test_folded_messages_summarized_for_next_round():
+    summarizer = FakeSummarizer()
+    window = ContextWindow(summarizer, budget=56, min_recent=2, cache_size=8)
+    history = dialogue(4)
+
+    async def main():
+        # 第一轮还没有摘要，折叠的消息先丢弃，后台生成摘要
+        first, first_stats = window.build(history)
+        await settle(window)
+        second, second_stats = window.build(history)
+        return first, first_stats, second, second_stats
+
+    first, first_stats, second, second_stats = asyncio.run(main())
+    assert first == history[4:]
+    assert first_stats.folded_messages == 4
+    assert first_stats.summarized_messages == 0
+    assert first_stats.saved_tokens == 4 * 14
+    assert summarizer.calls[0][0] == "（无）"
+    assert "用户：问0" in summarizer.calls[0][1] and "助手：答1" in summarizer.calls[0][1]
+
+    assert second[0] == SystemMessage(content=SUMMARY_HEADER + "摘要1")
+    assert second[1:] == history[4:]
+    assert second_stats.summarized_messages == 4
+    assert len(summarizer.calls) == 1
+
+
+def test_summary_extended_incrementally():
+    summarizer = FakeSummarizer()
+    window = ContextWindow(summarizer, budget=56, min_recent=2, cache_size=8)
+    history = dialogue(4)
+
+    async def main():
+        _, stats = window.build(history)
+        await settle(window)
+        longer = history + dialogue(6)[8:]
+        # 沿用上一轮的折叠位置超出预算，重新折叠到预算的一半
+        messages, longer_stats = window.build(longer, keep_from=stats.folded_messages)
+        await settle(window)
+        return longer, messages, longer_stats
+
+    longer, messages, stats = asyncio.run(main())
+    assert stats.folded_messages == 10
+    assert messages == [SystemMessage(content=SUMMARY_HEADER + "摘要1")] + longer[10:]
+    # 新摘要在旧摘要基础上只合并新折叠的消息
+    summary, added = summarizer.calls[1]
+    assert summary == "摘要1"
+    assert "问0" not in added and "问4" in added
+
+
+def test_keep_from_reused_while_within_budget():
+    window = ContextWindow(FakeSummarizer(), budget=56, min_recent=2, cache_size=8)
+    history = dialogue(4)
+
+    async def main():
+        _, stats = window.build(history[:6], keep_from=2)
+        await settle(window)
+        return stats
+
+    # 前缀保持不变，即使预算还能容纳更多消息
+    assert asyncio.run(main()).folded_messages == 2
+
+
+def test_min_recent_kept_over_budget():
+    window = ContextWindow(FakeSummarizer(), budget=10, min_recent=3, cache_size=8)
+
+    async def main():
+        messages, _ = window.build(dialogue(3))
+        await settle(window)
+        return messages
+
+    assert len(asyncio.run(main())) == 3
+
+
+def test_summary_failure_counted():
+    window = ContextWindow(FakeSummarizer(fail=True), budget=28, min_recent=2, cache_size=8)
+
+    async def main():
+        window.build(dialogue(3))
+        await settle(window)
+        messages, stats = window.build(dialogue(3))
+        await window.aclose()
+        return messages, stats
+
+    messages, stats = asyncio.run(main())
+    assert window.summary_failures >= 1
+    assert stats.summarized_messages == 0
+    assert not isinstance(messages[0], SystemMessage)
@@ -0,0 +1,157 @@
+import asyncio
+import email
+from pathlib import Path
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.utils.audio_cache import AudioDownload
+from src.utils.file_serving import RangeNotSatisfiable, parse_range_header, serve_file, serve_growing_file
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=1000-", [(1000, 1023)]),
+    ("bytes=-24", [(1000, 1023)]),
+    ("bytes=-5000", [(0, 1023)]),
+    ("bytes=0-2000", [(0, 1023)]),
+    # 重叠和相邻的区间合并
+    ("bytes=0-9, 5-19, 20-29", [(0, 29)]),
+    ("bytes=100-199,0-9", [(0, 9), (100, 199)]),
+    # 部分超出文件的范围被忽略
+    ("bytes=0-9,5000-6000", [(0, 9)]),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-9", "bytes=", "bytes=9-0", "bytes=a-b", "bytes=10", "bytes=" + ",".join(["0-1"] * 17)])
+def test_parse_range_header_invalid(header):
+    assert parse_range_header(header, len(CONTENT)) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0"])
+def test_parse_range_header_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, len(CONTENT))
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(CONTENT)
+
+    async def endpoint(request: Request):
+        return serve_file(request, path, "audio/mpeg")
+
+    return TestClient(Starlette(routes=[Route("/audio.mp3", endpoint, methods=["GET", "HEAD"])]))
+
+
+def test_full_file(client: TestClient):
+    response = client.get("/audio.mp3")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_single_range(client: TestClient):
+    response = client.get("/audio.mp3", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-24:]
+    assert response.headers["content-range"] == f"bytes 1000-1023/{len(CONTENT)}"
+    assert response.headers["content-length"] == "24"
+
+
+def test_multipart_ranges(client: TestClient):
+    response = client.get("/audio.mp3", headers={"Range": "bytes=0-9,100-199,-4"})
+    assert response.status_code == 206
+    # Content-Length 与实际发送的 multipart 正文长度一致
+    assert response.headers["content-length"] == str(len(response.content))
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + response.content)
+    parts = message.get_payload()
+    assert [part["Content-Range"] for part in parts] == [
+        "bytes 0-9/1024", "bytes 100-199/1024", "bytes 1020-1023/1024",
+    ]
+    assert [part.get_payload(decode=True) for part in parts] == [CONTENT[0:10], CONTENT[100:200], CONTENT[1020:]]
+
+
+def test_head_has_same_length(client: TestClient):
+    get = client.get("/audio.mp3", headers={"Range": "bytes=0-9,100-199"})
+    head = client.head("/audio.mp3", headers={"Range": "bytes=0-9,100-199"})
+    assert head.content == b""
+    # 每次响应的 boundary 不同，但长度相同
+    assert head.headers["content-length"] == get.headers["content-length"]
+
+
+def test_range_not_satisfiable(client: TestClient):
+    response = client.get("/audio.mp3", headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_conditional_requests(client: TestClient):
+    etag = client.get("/audio.mp3").headers["etag"]
+    assert client.get("/audio.mp3", headers={"If-None-Match": etag}).status_code == 304
+    # If-Range 不匹配时返回完整文件
+    response = client.get("/audio.mp3", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.fixture
+def growing_client(tmp_path: Path):
+    """每次请求时开始分段写入文件，边写边读"""
+
+    def make(total: int | None, fail: bool = False) -> TestClient:
+        path = tmp_path / "part.mp3"
+
+        async def write(download: AudioDownload):
+            for offset in range(0, len(CONTENT), 100):
+                await asyncio.sleep(0.001)
+                with open(path, "ab") as f:
+                    f.write(CONTENT[offset:offset + 100])
+                download.advance(len(CONTENT[offset:offset + 100]))
+                if fail and offset >= 500:
+                    download.finish(RuntimeError("upstream reset"))
+                    return
+            download.finish()
+
+        async def endpoint(request: Request):
+            path.write_bytes(b"")
+            download = AudioDownload("http://upstream/a.mp3", "p-a.mp3", path)
+            download.total = total
+            request.state.writer = asyncio.create_task(write(download))
+            return serve_growing_file(request, path, download, "audio/mpeg")
+
+        return TestClient(Starlette(routes=[Route("/audio.mp3", endpoint)]))
+
+    return make
+
+
+def test_growing_file_followed_to_end(growing_client):
+    response = growing_client(None).get("/audio.mp3", headers={"Range": "bytes=0-9"})
+    # 总大小未知时忽略 Range，以分块编码发送完整内容
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    assert response.content == CONTENT
+
+
+def test_growing_file_single_range(growing_client):
+    response = growing_client(len(CONTENT)).get("/audio.mp3", headers={"Range": "bytes=250-749"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 250-749/{len(CONTENT)}"
+    assert response.content == CONTENT[250:750]
+
+
+def test_growing_file_download_failure_aborts_response(growing_client):
+    with pytest.raises(RuntimeError, match="源文件下载失败"):
+        growing_client(None, fail=True).get("/audio.mp3")
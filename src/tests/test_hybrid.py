@@ -0,0 +1,129 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.model.knowledge import DocumentChunk
+from src.utils.knowledge.chunking import content_hash
+from src.utils.knowledge.hybrid import CharNgramBM25, HybridRetriever, char_ngrams
+
+SECTIONS = ["支部党员大会每季度召开一次", "支部委员会每月召开一次", "党小组会每月召开一次", "党课每季度至少一次"]
+
+
+def make_chunks(contents: list[str]) -> list[DocumentChunk]:
+    return [
+        DocumentChunk(doc_id="doc", title="标题", position=index, content=content, content_hash=content_hash(content))
+        for index, content in enumerate(contents)
+    ]
+
+
+class FakeEmbedder:
+    """查询向量指向 target 下标的分块；可以让查询变慢或失败"""
+
+    def __init__(self, target: int, delay: float = 0.0, fail: bool = False):
+        self.target = target
+        self.delay = delay
+        self.fail = fail
+        self.queries = 0
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if self.fail:
+            raise ConnectionError("embedding down")
+        return np.eye(len(texts), dtype=np.float32)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        self.queries += 1
+        await asyncio.sleep(self.delay)
+        return np.eye(len(SECTIONS), dtype=np.float32)[self.target]
+
+
+def test_char_ngrams_normalized():
+    assert char_ngrams("Ａ党，课") == ["a", "党", "课", "a党", "党课"]
+
+
+def test_bm25_ranks_matching_sections():
+    bm25 = CharNgramBM25(SECTIONS)
+    scores = bm25.scores("党课")
+    assert int(np.argmax(scores)) == 3
+    assert bm25.scores("无关")[0] == 0
+
+
+def test_bm25_prefers_shorter_documents_with_same_terms():
+    bm25 = CharNgramBM25(["党课安排", "党课安排以及其他很多无关的内容"])
+    scores = bm25.scores("党课")
+    assert scores[0] > scores[1] > 0
+
+
+def test_bm25_only_until_embeddings_ready():
+    embedder = FakeEmbedder(target=3)
+    retriever = HybridRetriever(make_chunks(SECTIONS), embedder)
+
+    async def main():
+        first = await retriever.search("党课", 2)
+        # 分块向量在后台计算，就绪后的查询融合两路结果
+        await asyncio.sleep(0)
+        second = await retriever.search("党课", 2)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first[0].chunk.position == 3
+    assert first[0].score == pytest.approx(1 / 61)
+    assert retriever.bm25_only_searches == 1 and retriever.vector_searches == 1
+    # 两路都排第一
+    assert second[0].chunk.position == 3
+    assert second[0].score == pytest.approx(2 / 61)
+
+
+def test_rrf_ignores_sections_without_keyword_matches():
+    retriever = HybridRetriever(make_chunks(SECTIONS))
+
+    async def main():
+        return await retriever.search("党课", 4)
+
+    results = asyncio.run(main())
+    scores = {result.chunk.position: result.score for result in results}
+    # 没有命中任何 n-gram 的小节不参与 BM25 一路的排名
+    assert scores[1] == 0
+    assert scores[3] > scores[0] > 0 and scores[3] > scores[2] > 0
+
+
+def test_query_embedding_cached():
+    embedder = FakeEmbedder(target=0)
+    retriever = HybridRetriever(make_chunks(SECTIONS), embedder)
+
+    async def main():
+        await retriever.search("党课", 2)
+        await asyncio.sleep(0)
+        for query in ("党课", " 党课 ", "党课"):
+            await retriever.search(query, 2)
+
+    asyncio.run(main())
+    assert embedder.queries == 1
+
+
+def test_slow_query_embedding_falls_back_to_bm25():
+    retriever = HybridRetriever(make_chunks(SECTIONS), FakeEmbedder(target=0, delay=1), embed_timeout=0.01)
+
+    async def main():
+        await retriever.search("党课", 2)
+        await asyncio.sleep(0)
+        return await retriever.search("党课", 2)
+
+    results = asyncio.run(main())
+    assert results[0].chunk.position == 3
+    assert retriever.bm25_only_searches == 2
+
+
+def test_failed_chunk_embedding_retried_after_interval():
+    embedder = FakeEmbedder(target=0, fail=True)
+    retriever = HybridRetriever(make_chunks(SECTIONS), embedder, retry_interval=60)
+
+    async def main():
+        await retriever.search("党课", 2)
+        await asyncio.sleep(0)
+        await retriever.search("党课", 2)
+        return retriever._embedding_task
+
+    # 失败后在重试间隔内不再计算
+    assert asyncio.run(main()) is None
+    assert retriever._retry_at > 0
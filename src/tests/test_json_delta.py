@@ -0,0 +1,50 @@
+import pytest
+
+from src.utils.json_delta import apply_json_delta, json_delta
+
+SNAPSHOTS = [
+    {},
+    {"学习资料": []},
+    {"学习资料": ["《习近平"]},
+    {"学习资料": ["《习近平谈治国理政》"], "讨论议题": []},
+    {"学习资料": ["《习近平谈治国理政》", "《中国共产党章程》"], "讨论议题": ["如何"], "活动流程建议": ""},
+    {"学习资料": ["《习近平谈治国理政》", "《中国共产党章程》"], "讨论议题": ["如何发挥先锋模范作用"], "活动流程建议": "1. 集体学习"},
+]
+
+
+def test_streaming_round_trip():
+    document = {}
+    for prev, curr in zip(SNAPSHOTS, SNAPSHOTS[1:]):
+        document = apply_json_delta(document, json_delta(prev, curr))
+        assert document == curr
+
+
+def test_string_growth_is_append():
+    ops = json_delta(SNAPSHOTS[4], SNAPSHOTS[5])
+    assert {"op": "append", "path": "/讨论议题/0", "value": "发挥先锋模范作用"} in ops
+    assert {"op": "append", "path": "/活动流程建议", "value": "1. 集体学习"} in ops
+
+
+def test_unchanged_has_no_ops():
+    assert json_delta(SNAPSHOTS[-1], dict(SNAPSHOTS[-1])) == []
+
+
+@pytest.mark.parametrize("prev, curr", [
+    # 删除字段、列表变短、类型变化、字符串不是追加，都退化为 replace
+    ({"a": 1, "b": 2}, {"a": 1}),
+    ({"a": [1, 2, 3]}, {"a": [1]}),
+    ({"a": "1"}, {"a": 1}),
+    ({"a": "abc"}, {"a": "abd"}),
+    ([1, {"x": "y"}], [1, {"x": "yz", "z": None}, 3]),
+    ("text", {"a": 1}),
+    # 需要转义的键
+    ({"a/b": "x", "c~d": []}, {"a/b": "xy", "c~d": [1]}),
+])
+def test_round_trip(prev, curr):
+    assert apply_json_delta(prev, json_delta(prev, curr)) == curr
+
+
+def test_apply_does_not_modify_input():
+    prev = {"a": ["x"]}
+    apply_json_delta(prev, json_delta(prev, {"a": ["xy", "z"]}))
+    assert prev == {"a": ["x"]}
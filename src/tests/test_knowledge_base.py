@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import openai
+import pytest
+from tenacity import wait_none
+
+from src.agent import resilience
+from src.utils.knowledge.chunking import chunk_document, split_text
+from src.utils.knowledge.embedding import Embedder
+from src.utils.knowledge.knowledge_base import KnowledgeBase
+from src.utils.knowledge.vector_store import NumpyVectorStore
+
+DIMENSIONS = 8
+
+
+def vector(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [float(byte) - 128 for byte in digest[:DIMENSIONS]]
+
+
+def rate_limited() -> openai.RateLimitError:
+    response = httpx.Response(429, request=httpx.Request("POST", "https://ark.test/api/v3/embeddings"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FakeEmbeddings:
+    """按文本哈希生成向量，乱序返回；可以预设前几次请求的错误"""
+
+    def __init__(self, errors: list[Exception] | None = None):
+        self.errors = list(errors or [])
+        self.batches: list[list[str]] = []
+
+    async def create(self, model: str, input: list[str], encoding_format: str):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(input)
+        data = [SimpleNamespace(index=index, embedding=vector(text)) for index, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1])
+
+
+def make_embedder(embeddings: FakeEmbeddings, **kwargs) -> Embedder:
+    kwargs.setdefault("batch_size", 2)
+    kwargs.setdefault("concurrency", 2)
+    kwargs.setdefault("retries", 2)
+    return Embedder(SimpleNamespace(embeddings=embeddings), model="m", dimensions=DIMENSIONS, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(resilience, "wait_random_exponential", lambda **kwargs: wait_none())
+
+
+def test_split_text_keeps_sentences_and_overlaps():
+    text = "第一条 总则。" + "党员要认真学习。" * 6 + "\n" + "积极参加组织生活！" * 4
+    chunks = split_text(text, chunk_size=30, overlap=10)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    # 不在句子中间断开
+    assert all(chunk.endswith(("。", "！")) for chunk in chunks)
+    # 相邻分块重叠完整的句子
+    assert chunks[1].startswith(chunks[0][-8:])
+
+
+def test_split_text_starts_new_chunk_at_heading():
+    text = "第一章 总则\n" + "党员要认真学习。" * 3 + "\n第二章 党员\n党员的义务。"
+    chunks = split_text(text, chunk_size=40, overlap=10)
+    assert chunks[-1] == "第二章 党员\n党员的义务。"
+
+
+def test_chunk_document_drops_duplicate_chunks():
+    chunks = chunk_document("doc", "标题", "重复的段落。\n重复的段落。", chunk_size=6, overlap=0)
+    assert [chunk.content for chunk in chunks] == ["重复的段落。"]
+    assert chunks[0].position == 0
+
+
+def test_embedder_batches_in_order_and_normalizes():
+    embeddings = FakeEmbeddings()
+    texts = [f"文本{index}" for index in range(5)]
+    vectors = asyncio.run(make_embedder(embeddings).embed(texts))
+    assert [len(batch) for batch in embeddings.batches] == [2, 2, 1]
+    expected = np.asarray([vector(text) for text in texts], dtype=np.float32)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(vectors, expected, rtol=1e-6)
+
+
+def test_embedder_retries_rate_limits_and_transient_errors():
+    request = httpx.Request("POST", "https://ark.test/api/v3/embeddings")
+    embeddings = FakeEmbeddings([rate_limited(), openai.APIConnectionError(request=request)])
+    embedder = make_embedder(embeddings, retries=2)
+    assert asyncio.run(embedder.embed(["文本"])).shape == (1, DIMENSIONS)
+    assert embedder.requests == 1
+
+
+def test_embedder_gives_up_after_retries():
+    embedder = make_embedder(FakeEmbeddings([rate_limited()] * 3), retries=1)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(embedder.embed(["文本"]))
+
+
+def test_embedder_does_not_retry_client_errors():
+    response = httpx.Response(400, request=httpx.Request("POST", "https://ark.test/api/v3/embeddings"))
+    embeddings = FakeEmbeddings([openai.BadRequestError("bad", response=response, body=None)])
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(make_embedder(embeddings).embed(["文本"]))
+    assert embeddings.errors == []
+
+
+def test_incremental_ingest_only_embeds_changed_chunks():
+    embeddings = FakeEmbeddings()
+    store = NumpyVectorStore(DIMENSIONS)
+    knowledge_base = KnowledgeBase(store, make_embedder(embeddings), chunk_size=10, overlap=0)
+    original = "第一段内容。\n第二段内容。\n第三段内容。"
+    edited = "第一段内容。\n第三段内容。\n新增的段落。"
+
+    async def main():
+        first = await knowledge_base.ingest([("doc", "标题", original)])
+        second = await knowledge_base.ingest([("doc", "标题", edited)])
+        results = await knowledge_base.search("标题\n新增的段落。", k=1)
+        return first, second, results, await store.count()
+
+    first, second, results, count = asyncio.run(main())
+    assert (first.added, first.kept, first.removed) == (3, 0, 0)
+    assert (second.added, second.kept, second.removed) == (1, 2, 1)
+    assert count == 3
+    assert embeddings.batches[-2] == ["标题\n新增的段落。"]
+    # 查询文本与分块的向量化文本相同，余弦相似度为1
+    assert results[0].chunk.content == "新增的段落。"
+    assert results[0].score == pytest.approx(1.0)
+    # 保留的分块序号随新版本文档更新
+    assert {chunk.content: chunk.position for chunk in store._chunks}["第三段内容。"] == 1
+
+
+def test_numpy_store_save_and_load(tmp_path: Path):
+    store = NumpyVectorStore(DIMENSIONS)
+    knowledge_base = KnowledgeBase(store, make_embedder(FakeEmbeddings()), chunk_size=10, overlap=0)
+
+    async def main():
+        await knowledge_base.ingest([("a", "甲", "第一段内容。\n第二段内容。"), ("b", "乙", "第三段内容。")])
+        await store.delete("a", await store.hashes("a"))
+        store.save(tmp_path / "store")
+        loaded = NumpyVectorStore.load(tmp_path / "store")
+        query = np.asarray(vector("乙\n第三段内容。"), dtype=np.float32)
+        return loaded, await loaded.search(query / np.linalg.norm(query), k=5)
+
+    loaded, results = asyncio.run(main())
+    assert [result.chunk.doc_id for result in results] == ["b"]
+    assert asyncio.run(loaded.hashes("a")) == set()
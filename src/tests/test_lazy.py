@@ -0,0 +1,41 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from src.utils.lazy import LazyModule
+
+
+def test_concurrent_loads_share_one_import(tmp_path: Path, monkeypatch):
+    (tmp_path / "lazy_target.py").write_text("import time\ntime.sleep(0.05)\nIMPORTS = []\nIMPORTS.append(1)\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_target", raising=False)
+    lazy = LazyModule("lazy_target")
+
+    async def main():
+        # 导入前不触发导入
+        assert lazy.module is None
+        first, second = await asyncio.gather(lazy.load(), lazy.load())
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second is lazy.module
+    assert first.IMPORTS == [1]
+    sys.modules.pop("lazy_target", None)
+
+
+def test_failed_import_can_be_retried(tmp_path: Path, monkeypatch):
+    path = tmp_path / "lazy_broken.py"
+    path.write_text("raise RuntimeError('boom')\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    lazy = LazyModule("lazy_broken")
+
+    async def main():
+        try:
+            await lazy.load()
+        except RuntimeError:
+            pass
+        path.write_text("VALUE = 1\n", encoding="utf-8")
+        return await lazy.load()
+
+    assert asyncio.run(main()).VALUE == 1
+    sys.modules.pop("lazy_broken", None)
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from src.bench.load_bench import build_ark_app, build_volc_app, compare, mock_content, percentiles, split_tokens
+from src.model.activity import ActivityDesignOutput
+from src.model.music import MusicGenerateParam
+
+
+def test_percentiles_in_milliseconds():
+    result = percentiles([i / 1000 for i in range(1, 101)])
+    assert result == {"p50": 51.0, "p95": 96.0, "p99": 100.0, "mean": pytest.approx(50.5)}
+    assert percentiles([])["p50"] is None
+
+
+def test_mock_content_fits_both_agents():
+    content = mock_content(200)
+    assert MusicGenerateParam.model_validate_json(content).prompt
+    assert ActivityDesignOutput.model_validate_json(content).活动流程建议
+    pieces = split_tokens(content, 200)
+    assert "".join(pieces) == content
+    assert len(pieces) >= 200
+
+
+def test_mock_ark_streams_chat_chunks_with_usage():
+    client = TestClient(build_ark_app(ttft=0, tokens_per_second=10000, tokens=20, dimensions=4))
+    response = client.post("/api/v3/chat/completions", json={
+        "model": "m", "stream": True, "stream_options": {"include_usage": True}, "messages": [],
+    })
+    events = [line[len("data: "):] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(event) for event in events[:-1]]
+    content = "".join(chunk["choices"][0]["delta"]["content"] for chunk in chunks if chunk["choices"])
+    assert ActivityDesignOutput.model_validate_json(content)
+    assert chunks[-1]["usage"]["completion_tokens"] >= 20
+
+    embeddings = client.post("/api/v3/embeddings", json={"input": ["a", "b"], "model": "m"}).json()
+    assert [len(item["embedding"]) for item in embeddings["data"]] == [4, 4]
+
+
+def test_mock_volc_generates_song():
+    client = TestClient(build_volc_app(port=0, generate_seconds=0.0001, audio_kb=1))
+    task = client.post("/?Action=GenSongForTime", json={"Prompt": "x"}).json()["Result"]
+    result = client.post("/?Action=QuerySong", json={"TaskID": task["TaskID"]}).json()["Result"]
+    assert result["Status"] == 2
+    audio = client.get(f"/audio/{task['TaskID']}.mp3")
+    assert len(audio.content) == 1024
+
+
+def test_compare_reports_relative_change(capsys):
+    def result(rps: float, p50: float) -> dict:
+        latency = {"p50": p50, "p95": p50, "p99": p50, "mean": p50}
+        return {"scenario": "policy", "concurrency": 4, "throughput_rps": rps, "latency_ms": latency,
+                "loop_lag_ms": latency, "rss_kb_per_stream": 10.0}
+
+    compare({"meta": {"commit": "old"}, "results": [result(100, 20)]}, {"meta": {"commit": "new"}, "results": [result(150, 10)]})
+    output = capsys.readouterr().out
+    assert "old -> new" in output
+    assert "throughput   +50.0%" in output
+    assert "p50   -50.0%" in output
@@ -0,0 +1,69 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.testclient import TestClient
+
+from src.utils import metrics
+from src.utils.metrics import Histogram, MetricsMiddleware, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "耗时", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    assert list(histogram.render()) == [
+        "# HELP latency_seconds 耗时",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 5.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_collector_and_label_escaping():
+    registry = MetricsRegistry()
+    registry.collector("cache_hits_total", "命中次数", "counter", ("cache",), lambda: [(('a"b\n',), 3), (("c",), 1.5)])
+    registry.histogram("empty_seconds", "没有记录")
+    assert registry.render() == "\n".join([
+        "# HELP cache_hits_total 命中次数",
+        "# TYPE cache_hits_total counter",
+        'cache_hits_total{cache="a\\"b\\n"} 3',
+        'cache_hits_total{cache="c"} 1.5',
+        "# HELP empty_seconds 没有记录",
+        "# TYPE empty_seconds histogram",
+    ]) + "\n"
+
+
+def test_middleware_labels_by_route_template(monkeypatch):
+    histogram = Histogram("http_request_duration_seconds", "", ("method", "route", "status"))
+    monkeypatch.setattr(metrics, "http_request_duration", histogram)
+
+    async def item(request):
+        return PlainTextResponse("ok")
+
+    async def stream(request):
+        async def body():
+            yield b"a"
+            yield b"b"
+        return StreamingResponse(body())
+
+    static = PlainTextResponse("static")
+    app = Starlette(routes=[Route("/items/{item_id}", item), Route("/stream", stream), Mount("/static", static)])
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/stream")
+    client.get("/missing")
+    client.get("/static/app.js")
+
+    counts = {labels: sum(values[:-1]) for labels, values in histogram._values.items()}
+    # 路径参数不产生新的标签，挂载的子应用按挂载路径记录
+    assert counts == {
+        ("GET", "/items/{item_id}", "200"): 2,
+        ("GET", "/stream", "200"): 1,
+        ("GET", "unmatched", "404"): 1,
+        ("GET", "/static", "200"): 1,
+    }
@@ -0,0 +1,230 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from src.model.music import MusicGenerateParam
+from src.utils import music_job
+from src.utils.admission import UpstreamLimiter, UpstreamOverloaded
+from src.utils.music_job import MusicJobManager, MusicJobQueueFull
+from src.utils.redis_client import LocalRedis
+
+
+class FakePoller:
+    async def wait(self, task_id, predicted_wait_time, on_progress=None):
+        await on_progress(50)
+        return {"AudioUrl": f"http://upstream/{task_id}.mp3", "Captions": "captions"}
+
+
+class FakeUpstream:
+    """依次返回预设结果的 submit_song，异常直接抛出"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self, session, prompt, gender, genre, mood):
+        self.calls += 1
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value, *labels):
+        self.values.append(value)
+
+
+@pytest.fixture(autouse=True)
+def song_limiter(monkeypatch):
+    # 模块级的限流器会在测试之间耗尽令牌
+    limiter = UpstreamLimiter("gen_song", rate=0, burst=1, concurrency=2, queue_size=8, timeout=1.0)
+    monkeypatch.setattr(music_job, "song_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def wait_metric(monkeypatch) -> Recorder:
+    recorder = Recorder()
+    monkeypatch.setattr(music_job, "music_job_wait", recorder)
+    return recorder
+
+
+def make_manager(job_dir: Path, **kwargs) -> MusicJobManager:
+    async def cache_audio(url: str) -> str:
+        return url.rsplit("/", 1)[1]
+
+    async def cache_captions(captions: str | None) -> str | None:
+        return "/music/captions/abc.json" if captions else None
+
+    kwargs.setdefault("retry_base_delay", 0.01)
+    return MusicJobManager(cache_audio, cache_captions, job_dir, workers=1, poller=FakePoller(), **kwargs)
+
+
+async def statuses(manager: MusicJobManager, job_id: str) -> list:
+    return [job async for job in manager.subscribe(job_id)]
+
+
+def test_job_lifecycle(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    monkeypatch.setattr(music_job, "submit_song", FakeUpstream(("task-1", 1.0)))
+
+    async def main():
+        manager = make_manager(tmp_path)
+        await manager.start()
+        job = await manager.submit(MusicGenerateParam(prompt="红歌"))
+        updates = await asyncio.wait_for(statuses(manager, job.job_id), 1)
+        await manager.stop()
+        return job, updates
+
+    job, updates = asyncio.run(main())
+    assert [update.status for update in updates][-2:] == ["running", "succeeded"]
+    final = updates[-1]
+    assert final.task_id == "task-1"
+    assert final.music_url == "/music/cache/task-1.mp3"
+    assert final.captions_url == "/music/captions/abc.json"
+    assert final.progress == 100
+    # 状态落盘，已结束任务的锁文件被删除
+    assert (tmp_path / f"{job.job_id}.json").exists()
+    assert not (tmp_path / f"{job.job_id}.lock").exists()
+    assert len(wait_metric.values) == 1
+
+
+def test_overloaded_upstream_retried_with_backoff(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    upstream = FakeUpstream(UpstreamOverloaded("gen_song", 0.0), UpstreamOverloaded("gen_song", 0.0), ("task-1", 1.0))
+    monkeypatch.setattr(music_job, "submit_song", upstream)
+    delays = []
+
+    async def main():
+        manager = make_manager(tmp_path)
+        loop = asyncio.get_running_loop()
+        call_later = loop.call_later
+
+        def record(delay, callback, *args):
+            if callback == manager._requeue:
+                delays.append(delay)
+            return call_later(delay, callback, *args)
+
+        monkeypatch.setattr(loop, "call_later", record)
+        await manager.start()
+        job = await manager.submit(MusicGenerateParam(prompt="红歌"))
+        updates = await asyncio.wait_for(statuses(manager, job.job_id), 1)
+        await manager.stop()
+        return updates
+
+    updates = asyncio.run(main())
+    assert updates[-1].status == "succeeded"
+    assert upstream.calls == 3
+    assert delays == [0.01, 0.02]
+    # 重新入队不重复记录等待时间
+    assert len(wait_metric.values) == 1
+
+
+def test_retries_exhausted_marks_job_failed(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    monkeypatch.setattr(music_job, "submit_song", FakeUpstream(UpstreamOverloaded("gen_song", 0.0)))
+
+    async def main():
+        manager = make_manager(tmp_path, max_retries=2)
+        await manager.start()
+        job = await manager.submit(MusicGenerateParam(prompt="红歌"))
+        updates = await asyncio.wait_for(statuses(manager, job.job_id), 1)
+        await manager.stop()
+        return updates
+
+    updates = asyncio.run(main())
+    assert updates[-1].status == "failed"
+    assert updates[-1].error
+
+
+def test_worker_survives_failed_status_save(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    upstream = FakeUpstream(RuntimeError("boom"), ("task-2", 1.0))
+    monkeypatch.setattr(music_job, "submit_song", upstream)
+
+    async def main():
+        manager = make_manager(tmp_path)
+        save = manager._save
+
+        async def failing_save(job):
+            if job.status == "failed":
+                raise OSError("disk full")
+            await save(job)
+
+        monkeypatch.setattr(manager, "_save", failing_save)
+        await manager.start()
+        first = await manager.submit(MusicGenerateParam(prompt="一"))
+
+        async def failed():
+            while (await manager.get(first.job_id)).status != "failed":
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(failed(), 1)
+        # 保存失败状态出错后 worker 继续处理后面的任务
+        second = await manager.submit(MusicGenerateParam(prompt="二"))
+        updates = await asyncio.wait_for(statuses(manager, second.job_id), 1)
+        await manager.stop()
+        return updates
+
+    assert asyncio.run(main())[-1].status == "succeeded"
+
+
+def test_queue_full(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    async def main():
+        # 不启动 worker，任务留在队列中
+        manager = make_manager(tmp_path, queue_size=1)
+        await manager.submit(MusicGenerateParam(prompt="一"))
+        with pytest.raises(MusicJobQueueFull):
+            await manager.submit(MusicGenerateParam(prompt="二"))
+        await manager.stop()
+
+    asyncio.run(main())
+
+
+def test_unfinished_job_resumed_after_restart(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    upstream = FakeUpstream(("task-1", 1.0))
+    monkeypatch.setattr(music_job, "submit_song", upstream)
+
+    async def main():
+        manager = make_manager(tmp_path)
+        job = await manager.submit(MusicGenerateParam(prompt="红歌"))
+        await manager._update(job, status="submitted", task_id="task-1")
+        await manager.stop()
+
+        restarted = make_manager(tmp_path)
+        await restarted.start()
+        updates = await asyncio.wait_for(statuses(restarted, job.job_id), 1)
+        await restarted.stop()
+        return updates
+
+    updates = asyncio.run(main())
+    assert updates[-1].status == "succeeded"
+    # 已经拿到 TaskID 的任务不再重新提交
+    assert upstream.calls == 0
+
+
+def test_workers_share_jobs(tmp_path: Path, monkeypatch, wait_metric: Recorder):
+    upstream = FakeUpstream(("task-1", 1.0))
+    monkeypatch.setattr(music_job, "submit_song", upstream)
+
+    async def main():
+        redis = LocalRedis()
+        first = make_manager(tmp_path, redis=redis)
+        job = await first.submit(MusicGenerateParam(prompt="红歌"))
+        # 另一个 worker 启动时不接手其他进程持有锁的任务
+        second = make_manager(tmp_path, redis=redis)
+        await second.start()
+        assert job.job_id not in second._jobs
+        await first.start()
+        # 查询和订阅通过 Redis 读取其他进程的任务
+        updates = await asyncio.wait_for(statuses(second, job.job_id), 1)
+        shared = await second.get(job.job_id)
+        await first.stop()
+        await second.stop()
+        return updates, shared
+
+    updates, shared = asyncio.run(main())
+    assert updates[-1].status == "succeeded"
+    assert shared.music_url == "/music/cache/task-1.mp3"
+    assert upstream.calls == 1
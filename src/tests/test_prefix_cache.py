@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.agent.llm_pool import LLMClientRegistry
+from src.agent.prefix_cache import PrefixCache
+
+BASE_URL = "https://ark.test/api/v3"
+PREFIX = [SystemMessage(content="三会一课制度")]
+MESSAGES = [HumanMessage(content="设计一次活动")]
+
+
+def completion(content: str, cached_tokens: int) -> bytes:
+    chunks = [
+        {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "m",
+         "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}]},
+        {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": "m", "choices": [],
+         "usage": {"prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105,
+                   "prompt_tokens_details": {"cached_tokens": cached_tokens}}},
+    ]
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks).encode() + b"data: [DONE]\n\n"
+
+
+class FakeArk:
+    """模拟的方舟接口，记录每个请求的路径和请求体"""
+
+    def __init__(self, create_status: int = 200, context_status: int = 200):
+        self.create_status = create_status
+        self.context_status = context_status
+        self.requests: list[tuple[str, dict]] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/api/v3")
+        body = json.loads(request.content)
+        self.requests.append((path, body))
+        if path == "/context/create":
+            return httpx.Response(self.create_status, json={"id": "ctx-1"})
+        if path == "/context/chat/completions":
+            if self.context_status != 200:
+                return httpx.Response(self.context_status, json={"error": {"message": "context expired"}})
+            return httpx.Response(200, content=completion("缓存", 90), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, content=completion("完整", 0), headers={"content-type": "text/event-stream"})
+
+    def paths(self) -> list[str]:
+        return [path for path, _ in self.requests]
+
+
+class MockRegistry(LLMClientRegistry):
+    def __init__(self, ark: FakeArk):
+        super().__init__()
+        self.ark = ark
+
+    def _http_client(self, base_url: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.ark.handler))
+
+
+def make_cache(ark: FakeArk, enabled: bool = True) -> tuple[PrefixCache, object]:
+    registry = MockRegistry(ark)
+    llm = registry.get(model="m", base_url=BASE_URL, api_key="key")
+    return PrefixCache(registry, ttl=600, retry_interval=60, enabled=enabled), llm
+
+
+async def ask(cache: PrefixCache, llm) -> str:
+    return "".join([chunk.content async for chunk in cache.astream(llm, PREFIX, MESSAGES)])
+
+
+async def settle(cache: PrefixCache):
+    await asyncio.gather(*cache._creating.values())
+
+
+def test_handle_created_in_background_then_used():
+    ark = FakeArk()
+    cache, llm = make_cache(ark)
+
+    async def main():
+        # 没有句柄时不等待创建，直接发送完整消息
+        first = await ask(cache, llm)
+        await settle(cache)
+        second = await ask(cache, llm)
+        return first, second
+
+    assert asyncio.run(main()) == ("完整", "缓存")
+    # 创建句柄与第一个请求并行进行
+    assert sorted(ark.paths()[:2]) == ["/chat/completions", "/context/create"]
+    assert ark.paths()[2] == "/context/chat/completions"
+    bodies = dict(ark.requests[:2])
+    full, create, cached = bodies["/chat/completions"], bodies["/context/create"], ark.requests[2][1]
+    assert [message["content"] for message in full["messages"]] == ["三会一课制度", "设计一次活动"]
+    assert create["mode"] == "common_prefix" and create["ttl"] == 600
+    # 使用句柄的请求只发送前缀之后的消息
+    assert cached["context_id"] == "ctx-1"
+    assert [message["content"] for message in cached["messages"]] == ["设计一次活动"]
+    assert (cache.requests, cache.cached_requests, cache.handles_created) == (2, 1, 1)
+    assert (cache.cached_tokens, cache.uncached_tokens) == (90, 110)
+
+
+def test_invalid_handle_falls_back_to_full_request():
+    ark = FakeArk(context_status=404)
+    cache, llm = make_cache(ark)
+
+    async def main():
+        await ask(cache, llm)
+        await settle(cache)
+        return await ask(cache, llm)
+
+    assert asyncio.run(main()) == "完整"
+    assert ark.paths()[-2:] == ["/context/chat/completions", "/chat/completions"]
+    assert cache.fallbacks == 1
+    # 失效的句柄被丢弃，下一次请求重新创建
+    assert cache._handles == {}
+
+
+def test_failed_creation_not_retried_within_interval():
+    ark = FakeArk(create_status=400)
+    cache, llm = make_cache(ark)
+
+    async def main():
+        for _ in range(3):
+            await ask(cache, llm)
+            await settle(cache)
+
+    asyncio.run(main())
+    assert ark.paths().count("/context/create") == 1
+    assert cache.handles_created == 0
+
+
+def test_disabled_sends_full_messages():
+    ark = FakeArk()
+    cache, llm = make_cache(ark, enabled=False)
+
+    async def main():
+        for _ in range(2):
+            await ask(cache, llm)
+        await settle(cache)
+
+    asyncio.run(main())
+    assert ark.paths() == ["/chat/completions", "/chat/completions"]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from pathlib import Path
+
+from src.model.music import MusicGenerateParam
+from src.utils.prompt_pool import MusicPromptPool
+
+
+class FakeGenerator:
+    """依次返回预设的 prompt，用完后按序号生成"""
+
+    def __init__(self, *prompts):
+        self.prompts = list(prompts)
+        self.calls = 0
+
+    async def __call__(self) -> MusicGenerateParam:
+        self.calls += 1
+        prompt = self.prompts.pop(0) if self.prompts else f"prompt {self.calls}"
+        if isinstance(prompt, Exception):
+            raise prompt
+        return MusicGenerateParam(prompt=prompt, genre="pop")
+
+
+async def filled(pool: MusicPromptPool):
+    await pool.start()
+    await asyncio.wait_for(pool._refill_task, 1)
+
+
+def test_refilled_to_size_and_served_from_pool(tmp_path: Path):
+    generate = FakeGenerator()
+    pool = MusicPromptPool(generate, tmp_path / "pool.json", size=4, low_water=3, concurrency=2)
+
+    async def main():
+        await filled(pool)
+        first = await pool.pop()
+        second = await pool.pop()
+        # 低于 low_water 后在后台补充
+        await asyncio.wait_for(pool._refill_task, 1)
+        await pool.stop()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert (first.prompt, second.prompt) == ("prompt 1", "prompt 2")
+    assert (pool.hits, pool.misses) == (2, 0)
+    assert len(pool) == 4
+    assert generate.calls == 6
+
+
+def test_empty_pool_generates_directly(tmp_path: Path):
+    pool = MusicPromptPool(FakeGenerator(), tmp_path / "pool.json", size=0, low_water=0)
+
+    async def main():
+        await pool.start()
+        return await pool.pop()
+
+    assert asyncio.run(main()).prompt == "prompt 1"
+    assert (pool.hits, pool.misses) == (0, 1)
+
+
+def test_duplicates_and_invalid_prompts_skipped(tmp_path: Path):
+    generate = FakeGenerator("红歌", " 红歌 ", "", RuntimeError("llm down"), "民谣")
+    pool = MusicPromptPool(generate, tmp_path / "pool.json", size=5, low_water=1, concurrency=5)
+
+    async def main():
+        await filled(pool)
+        popped = await pool.pop()
+        # 最近取出过的 prompt 同样不再加入
+        pool._add(MusicGenerateParam(prompt="红歌"))
+        return popped
+
+    assert asyncio.run(main()).prompt == "红歌"
+    assert [param.prompt for param in pool._pool][0] == "民谣"
+    assert pool.duplicates == 2
+    assert pool.failures == 2
+
+
+def test_pool_persisted_across_restarts(tmp_path: Path):
+    path = tmp_path / "pool.json"
+
+    async def main():
+        pool = MusicPromptPool(FakeGenerator(), path, size=3, low_water=1)
+        await filled(pool)
+        await pool.pop()
+        await pool.stop()
+        restarted = MusicPromptPool(FakeGenerator("新的"), path, size=2, low_water=1)
+        await restarted.start()
+        return [param.prompt for param in restarted._pool], restarted._refill_task
+
+    prompts, refill_task = asyncio.run(main())
+    assert [item["prompt"] for item in json.loads(path.read_text(encoding="utf-8"))] == ["prompt 2", "prompt 3"]
+    assert prompts == ["prompt 2", "prompt 3"]
+    # 落盘的数量足够时不再补充
+    assert refill_task is None
+
+
+def test_corrupted_pool_file_ignored(tmp_path: Path):
+    path = tmp_path / "pool.json"
+    path.write_text("[{", encoding="utf-8")
+    pool = MusicPromptPool(FakeGenerator(), path, size=0, low_water=0)
+    asyncio.run(pool.start())
+    assert len(pool) == 0
@@ -0,0 +1,154 @@
+import asyncio
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+from src.agent import resilience
+from src.agent.resilience import MIN_SAMPLES, ResilientStreamer, StreamStalled
+from src.utils.admission import UpstreamLimiter
+
+
+class Upstream:
+    """每次调用按顺序使用一个脚本：首个分块前的延迟或异常，以及分块之间的间隔"""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.opened = 0
+        self.closed = 0
+
+    def __call__(self):
+        script = self.scripts[min(self.opened, len(self.scripts) - 1)]
+        self.opened += 1
+        return self._stream(self.opened, **script)
+
+    async def _stream(self, index: int, delay: float = 0.0, error: Exception | None = None, gap: float = 0.0, count: int = 3):
+        try:
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            for chunk in range(count):
+                if chunk:
+                    await asyncio.sleep(gap)
+                yield f"{index}-{chunk}"
+        finally:
+            self.closed += 1
+
+
+def make_streamer(**kwargs) -> ResilientStreamer:
+    kwargs.setdefault("hedge", True)
+    kwargs.setdefault("percentile", 50)
+    kwargs.setdefault("min_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.05)
+    kwargs.setdefault("stall_timeout", 1.0)
+    return ResilientStreamer("test", **kwargs)
+
+
+async def collect(streamer: ResilientStreamer, upstream: Upstream) -> list[str]:
+    return [chunk async for chunk in streamer.astream(upstream)]
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(resilience, "wait_random_exponential", lambda **kwargs: wait_none())
+
+
+def test_fast_primary_not_hedged():
+    streamer = make_streamer()
+    upstream = Upstream({})
+    assert asyncio.run(collect(streamer, upstream)) == ["1-0", "1-1", "1-2"]
+    assert upstream.opened == 1
+    assert streamer.hedged == 0
+
+
+def test_slow_primary_hedged_and_loser_closed():
+    streamer = make_streamer()
+    upstream = Upstream({"delay": 1.0}, {})
+
+    async def main():
+        chunks = await collect(streamer, upstream)
+        await asyncio.sleep(0)
+        return chunks
+
+    assert asyncio.run(main()) == ["2-0", "2-1", "2-2"]
+    assert (streamer.hedged, streamer.hedge_wins) == (1, 1)
+    # 落败的请求被取消
+    assert upstream.closed == 2
+
+
+def test_hedge_skipped_without_free_slot():
+    limiter = UpstreamLimiter("test", rate=0, burst=1, concurrency=1, queue_size=4, timeout=1.0)
+    streamer = make_streamer(limiter=limiter)
+    upstream = Upstream({"delay": 0.1}, {})
+
+    assert asyncio.run(collect(streamer, upstream)) == ["1-0", "1-1", "1-2"]
+    assert (streamer.hedged, streamer.hedge_skipped) == (0, 1)
+    assert limiter.active == 0
+
+
+def test_hedge_holds_its_own_lease():
+    limiter = UpstreamLimiter("test", rate=0, burst=1, concurrency=2, queue_size=4, timeout=1.0)
+    streamer = make_streamer(limiter=limiter)
+    upstream = Upstream({"delay": 1.0}, {"gap": 0.01})
+
+    async def main():
+        stream = await streamer.open(upstream)
+        # 落败的请求取消后归还名额
+        await asyncio.sleep(0.01)
+        held = limiter.active
+        chunks = [chunk async for chunk in stream]
+        await asyncio.sleep(0)
+        return held, chunks
+
+    held, chunks = asyncio.run(main())
+    assert chunks == ["2-0", "2-1", "2-2"]
+    assert held == 1
+    assert limiter.active == 0
+
+
+def test_transient_error_before_first_chunk_retried():
+    streamer = make_streamer(hedge=False)
+    upstream = Upstream({"error": httpx.ConnectError("refused")}, {})
+    assert asyncio.run(collect(streamer, upstream)) == ["2-0", "2-1", "2-2"]
+    assert streamer.retries == 1
+
+
+def test_non_transient_error_not_retried():
+    streamer = make_streamer(hedge=False)
+    upstream = Upstream({"error": ValueError("bad request")}, {})
+    with pytest.raises(ValueError):
+        asyncio.run(collect(streamer, upstream))
+    assert upstream.opened == 1
+
+
+def test_stalled_stream_aborted():
+    streamer = make_streamer(hedge=False, stall_timeout=0.05)
+    upstream = Upstream({"gap": 1.0})
+
+    async def main():
+        chunks = []
+        with pytest.raises(StreamStalled):
+            async for chunk in streamer.astream(upstream):
+                chunks.append(chunk)
+        return chunks
+
+    assert asyncio.run(main()) == ["1-0"]
+    assert streamer.stalls == 1
+    assert upstream.closed == 1
+
+
+def test_hedge_delay_uses_recent_percentile():
+    streamer = make_streamer(min_delay=0.1, max_delay=2.0)
+    # 样本不足时使用上限
+    assert streamer.hedge_delay() == 2.0
+    streamer.ttft.extend([0.5] * (MIN_SAMPLES // 2) + [1.5] * (MIN_SAMPLES // 2))
+    assert streamer.hedge_delay() == 1.5
+    streamer.ttft.clear()
+    streamer.ttft.extend([0.01] * MIN_SAMPLES)
+    assert streamer.hedge_delay() == 0.1
+
+
+def test_empty_stream():
+    streamer = make_streamer(hedge=False)
+    assert asyncio.run(collect(streamer, Upstream({"count": 0}))) == []
+
@@ -0,0 +1,69 @@
+import asyncio
+
+from src.utils.redis_client import LocalRedis
+from src.utils.result_cache import ResultCache, make_key, normalize_text
+
+
+class BrokenRedis:
+    async def get(self, name):
+        raise ConnectionError("redis down")
+
+    async def set(self, name, value, ex=None):
+        raise ConnectionError("redis down")
+
+    async def delete(self, *names):
+        raise ConnectionError("redis down")
+
+
+def test_key_ignores_width_case_and_whitespace():
+    assert normalize_text("  科技　强国  ABC ") == "科技 强国 abc"
+    assert make_key(normalize_text("ＡＩ  赋能"), 45) == make_key(normalize_text("ai 赋能"), 45)
+    assert make_key("ai", 45) != make_key("ai", 60)
+
+
+def test_local_lru_and_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.utils.result_cache.time.monotonic", lambda: now[0])
+
+    async def main():
+        cache = ResultCache("test", ttl=10, maxsize=2)
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"
+        # 最近访问过的 a 保留，b 被淘汰
+        await cache.set("c", "3")
+        assert await cache.get("b") is None
+        now[0] += 11
+        assert await cache.get("a") is None
+        return cache
+
+    cache = asyncio.run(main())
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_redis_shared_between_processes():
+    async def main():
+        redis = LocalRedis()
+        first = ResultCache("test", ttl=10, maxsize=8, redis=redis)
+        second = ResultCache("test", ttl=10, maxsize=8, redis=redis)
+        await first.set("a", "1")
+        # 第二个进程从 Redis 读取后放入自己的进程内缓存
+        assert await second.get("a") == "1"
+        assert "a" in second._local
+        await first.delete("a")
+        assert await redis.get("test:a") is None
+        assert await first.get("a") is None
+
+    asyncio.run(main())
+
+
+def test_redis_errors_degrade_to_local():
+    async def main():
+        cache = ResultCache("test", ttl=10, maxsize=8, redis=BrokenRedis())
+        await cache.set("a", "1")
+        assert await cache.get("a") == "1"
+        assert await cache.get("b") is None
+        await cache.delete("a")
+        assert await cache.get("a") is None
+
+    asyncio.run(main())
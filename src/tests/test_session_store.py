@@ -0,0 +1,84 @@
+import asyncio
+
+from src.model.policy import PolicyQaMessage, PolicySession
+from src.utils.redis_client import LocalRedis
+from src.utils.session_store import MESSAGE_OVERHEAD_BYTES, PolicySessionStore
+
+
+def turn(index: int) -> list[PolicyQaMessage]:
+    """一轮对话，每条消息连同固定开销 100 字节"""
+    content = str(index).ljust(100 - MESSAGE_OVERHEAD_BYTES, "x")
+    return [PolicyQaMessage(role="user", content=content), PolicyQaMessage(role="assistant", content=content)]
+
+
+def test_create_and_append_persisted():
+    async def main():
+        store = PolicySessionStore(ttl=60, max_bytes=10000, session_max_bytes=10000)
+        session = await store.create()
+        # 创建后立即可读，回答失败时会话id同样可用
+        assert (await store.get(session.session_id)).messages == []
+        await store.append(session, *turn(0))
+        return (await store.get(session.session_id)).messages
+
+    assert asyncio.run(main()) == turn(0)
+
+
+def test_oversized_session_trimmed_by_turns():
+    store = PolicySessionStore(ttl=60, max_bytes=100000, session_max_bytes=1000)
+    session = PolicySession(session_id="s", messages=[message for index in range(5) for message in turn(index)], context_start=8)
+
+    async def main():
+        await store.save(session)
+        # 超过上限后一次性降到四分之三以下，且从用户消息开始
+        await store.append(session, *turn(5))
+        return await store.get("s")
+
+    saved = asyncio.run(main())
+    assert saved.messages == [message for index in range(3, 6) for message in turn(index)]
+    assert saved.context_start == 2
+    assert store.trimmed_messages == 6
+
+
+def test_local_lru_by_bytes():
+    async def main():
+        store = PolicySessionStore(ttl=60, max_bytes=600, session_max_bytes=10000)
+        first = await store.create(turn(0))
+        second = await store.create(turn(1))
+        await store.get(first.session_id)
+        third = await store.create(turn(2))
+        return store, first, second, third
+
+    store, first, second, third = asyncio.run(main())
+    assert list(store._local) == [first.session_id, third.session_id]
+    assert store._local_bytes == sum(len(data) for _, data in store._local.values())
+
+
+def test_expired_session_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.utils.session_store.time.monotonic", lambda: now[0])
+
+    async def main():
+        store = PolicySessionStore(ttl=60, max_bytes=10000, session_max_bytes=10000)
+        session = await store.create(turn(0))
+        now[0] += 61
+        return store, await store.get(session.session_id)
+
+    store, session = asyncio.run(main())
+    assert session is None
+    assert store.size == 0
+
+
+def test_redis_is_authoritative():
+    async def main():
+        redis = LocalRedis()
+        first = PolicySessionStore(ttl=60, max_bytes=10000, session_max_bytes=10000, redis=redis)
+        second = PolicySessionStore(ttl=60, max_bytes=10000, session_max_bytes=10000, redis=redis)
+        session = await first.create(turn(0))
+        shared = await second.get(session.session_id)
+        # Redis 中已过期或删除的会话，进程内的副本不再使用
+        await redis.delete(f"policy_session:{session.session_id}")
+        return shared, await first.get(session.session_id)
+
+    shared, deleted = asyncio.run(main())
+    assert shared.messages == turn(0)
+    assert deleted is None
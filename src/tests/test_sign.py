@@ -0,0 +1,73 @@
+import datetime
+import hashlib
+import hmac
+
+from src.utils.ve_music import Sign
+from src.utils.ve_music.Sign import Signer, get_signing_key, get_x_date, norm_query
+
+
+def reference_signature(sk: str, x_date: str, region: str, service: str, string_to_sign: str) -> str:
+    """不经缓存、逐步派生密钥的签名"""
+    key = sk.encode("utf-8")
+    for part in (x_date[:8], region, service, "request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def test_norm_query_sorts_and_quotes():
+    assert norm_query({"b": "x y", "a": ["2", "1"], "Action": "GenSongForTime"}) == "Action=GenSongForTime&a=2&a=1&b=x%20y"
+
+
+def test_signature_matches_uncached_derivation():
+    signer = Signer("ak", "sk", "imagination", "cn-beijing")
+    date = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.UTC)
+    query = {"Action": "GenSongForTime", "Version": "2024-08-12"}
+    headers = signer.sign_headers("POST", "open.volcengineapi.com", query, '{"Prompt": "x"}', date=date)
+
+    assert headers["X-Date"] == "20260102T030405Z"
+    canonical_request = (
+        f"POST\n/\n{norm_query(query)}\n"
+        f"content-type:application/json\nhost:open.volcengineapi.com\n"
+        f"x-content-sha256:{headers['X-Content-Sha256']}\nx-date:20260102T030405Z\n"
+        f"\n{Sign.SIGNED_HEADERS}\n{headers['X-Content-Sha256']}"
+    )
+    scope = "20260102/cn-beijing/imagination/request"
+    string_to_sign = (
+        f"HMAC-SHA256\n20260102T030405Z\n{scope}\n"
+        f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+    )
+    signature = reference_signature("sk", "20260102T030405Z", "cn-beijing", "imagination", string_to_sign)
+    assert headers["Authorization"] == (
+        f"HMAC-SHA256 Credential=ak/{scope}, SignedHeaders={Sign.SIGNED_HEADERS}, Signature={signature}"
+    )
+    # 兼容旧的函数接口
+    assert Sign.get_authorization("POST", headers, query, "imagination", "cn-beijing", "ak", "sk") == headers["Authorization"]
+
+
+def test_signing_key_cached_per_day():
+    get_signing_key.cache_clear()
+    signer = Signer("ak", "sk", "imagination", "cn-beijing")
+    for hour in (1, 2, 3):
+        signer.sign_headers("POST", "host", {}, "", date=datetime.datetime(2026, 1, 2, hour, tzinfo=datetime.UTC))
+    assert get_signing_key.cache_info().misses == 1
+    signer.sign_headers("POST", "host", {}, "", date=datetime.datetime(2026, 1, 3, tzinfo=datetime.UTC))
+    assert get_signing_key.cache_info().misses == 2
+
+
+def test_x_date_is_fresh_on_every_call(monkeypatch):
+    now = [datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.UTC)]
+
+    class FrozenDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0]
+
+    monkeypatch.setattr(Sign.datetime, "datetime", FrozenDatetime)
+    signer = Signer("ak", "sk", "imagination", "cn-beijing")
+    first = signer.sign_headers("POST", "host", {}, "")
+    now[0] += datetime.timedelta(minutes=10)
+    second = signer.sign_headers("POST", "host", {}, "")
+
+    assert first["X-Date"] == "20260102T030405Z"
+    assert second["X-Date"] == get_x_date() == "20260102T031405Z"
+    assert first["Authorization"] != second["Authorization"]
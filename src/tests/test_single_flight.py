@@ -0,0 +1,163 @@
+import asyncio
+import gc
+
+import pytest
+
+from src.utils.single_flight import SingleFlight
+
+
+class Upstream:
+    """记录上游调用次数和是否被取消的模拟流"""
+
+    def __init__(self, items, delay: float = 0.01, cumulative: bool = False):
+        self.items = items
+        self.delay = delay
+        self.cumulative = cumulative
+        self.calls = 0
+        self.cancelled = False
+
+    async def open(self):
+        self.calls += 1
+        return self._stream()
+
+    async def _stream(self):
+        try:
+            for index, item in enumerate(self.items):
+                await asyncio.sleep(self.delay)
+                yield self.items[:index + 1] if self.cumulative else item
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream) -> list:
+    return [item async for item in stream]
+
+
+def test_do_coalesces_calls():
+    async def main():
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        assert await asyncio.gather(*(flight.do("key", fn) for _ in range(5))) == [1] * 5
+        assert (flight.upstream_calls, flight.coalesced) == (1, 4)
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_late_subscriber_replays_all_chunks():
+    async def main():
+        flight = SingleFlight("test")
+        upstream = Upstream(list(range(10)))
+        first = await flight.stream("key", upstream.open)
+        await asyncio.sleep(0.05)
+        second = await flight.stream("key", upstream.open)
+        results = await asyncio.gather(collect(first), collect(second))
+        assert results == [list(range(10))] * 2
+        assert upstream.calls == 1
+        assert flight.coalesced == 1
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_cumulative_keeps_only_latest_snapshot():
+    async def main():
+        flight = SingleFlight("test", cumulative=True)
+        upstream = Upstream(list(range(20)), cumulative=True)
+        first = await flight.stream("key", upstream.open)
+        await asyncio.sleep(0.1)
+        assert len(flight._flights["key"].chunks) == 1
+        second = await flight.stream("key", upstream.open)
+        snapshot = await second.__anext__()
+        # 后加入的订阅者从最新的完整结果开始
+        assert len(snapshot) > 1
+        results = await asyncio.gather(collect(first), collect(second))
+        assert all(result[-1] == list(range(20)) for result in results)
+        assert upstream.calls == 1
+
+    asyncio.run(main())
+
+
+def test_error_before_first_chunk_raised_to_every_caller():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.stream("key", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.upstream_calls == 1
+
+    asyncio.run(main())
+
+
+def test_error_after_first_chunk_raised_to_subscribers():
+    async def failing():
+        async def stream():
+            yield 1
+            raise ValueError("boom")
+        return stream()
+
+    async def main():
+        flight = SingleFlight("test")
+        stream = await flight.stream("key", failing)
+        assert await stream.__anext__() == 1
+        with pytest.raises(ValueError):
+            await stream.__anext__()
+
+    asyncio.run(main())
+
+
+def test_upstream_cancelled_when_all_subscribers_leave():
+    async def main():
+        flight = SingleFlight("test")
+        upstream = Upstream(list(range(100)))
+        first = await flight.stream("key", upstream.open)
+        second = await flight.stream("key", upstream.open)
+        await first.__anext__()
+        await first.aclose()
+        await asyncio.sleep(0.03)
+        assert not upstream.cancelled
+        await second.aclose()
+        await asyncio.sleep(0.01)
+        assert upstream.cancelled
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_leader_leaving_before_first_chunk_cancels_upstream():
+    async def main():
+        flight = SingleFlight("test")
+        upstream = Upstream([1], delay=10)
+        task = asyncio.create_task(flight.stream("key", upstream.open))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert upstream.cancelled
+        assert flight.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_unconsumed_subscription_unsubscribes_on_collect():
+    async def main():
+        flight = SingleFlight("test")
+        upstream = Upstream(list(range(100)))
+        stream = await flight.stream("key", upstream.open)
+        del stream
+        gc.collect()
+        await asyncio.sleep(0.02)
+        assert upstream.cancelled
+
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from src.utils.ve_music.GenSongDemo import (
+    QUERY_STATUS_CODE_FAILED,
+    QUERY_STATUS_CODE_HANDING,
+    QUERY_STATUS_CODE_SUCCESS,
+)
+from src.utils.ve_music.SongPoller import QuerySongPoller
+
+
+class FakeQuery:
+    """按 TaskID 依次返回预设的查询结果，最后一个结果重复返回"""
+
+    def __init__(self, **responses):
+        self.responses = {task_id: list(results) for task_id, results in responses.items()}
+        self.calls: dict[str, int] = {}
+
+    async def __call__(self, session, task_id):
+        self.calls[task_id] = self.calls.get(task_id, 0) + 1
+        results = self.responses[task_id]
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def running(progress: int) -> dict:
+    return {"Status": QUERY_STATUS_CODE_HANDING, "Progress": progress}
+
+
+def succeeded(url: str) -> dict:
+    return {"Status": QUERY_STATUS_CODE_SUCCESS, "Progress": 100, "SongDetail": {"AudioUrl": url}}
+
+
+def make_poller(query: FakeQuery, **kwargs) -> QuerySongPoller:
+    kwargs.setdefault("min_interval", 0.01)
+    kwargs.setdefault("max_interval", 0.05)
+    kwargs.setdefault("stall_backoff", 1.0)
+    return QuerySongPoller(query, **kwargs)
+
+
+def test_progress_reported_until_success():
+    query = FakeQuery(a=[running(30), running(60), succeeded("a.mp3")])
+    poller = make_poller(query)
+    progress = []
+
+    async def on_progress(value: int):
+        progress.append(value)
+
+    async def main():
+        return await asyncio.wait_for(poller.wait("a", 0.02, on_progress=on_progress), 1)
+
+    assert asyncio.run(main()) == {"AudioUrl": "a.mp3"}
+    assert progress == [30, 60]
+    assert query.calls["a"] == 3
+
+
+def test_waiters_of_same_task_share_queries():
+    query = FakeQuery(a=[running(50), succeeded("a.mp3")], b=[succeeded("b.mp3")])
+    poller = make_poller(query)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(poller.wait("a", 0.02), poller.wait("a", 0.02), poller.wait("b", 0.02)), 1
+        )
+
+    assert asyncio.run(main()) == [{"AudioUrl": "a.mp3"}, {"AudioUrl": "a.mp3"}, {"AudioUrl": "b.mp3"}]
+    assert query.calls == {"a": 2, "b": 1}
+    assert poller._tasks == {}
+
+
+def test_failed_generation_raises():
+    poller = make_poller(FakeQuery(a=[{"Status": QUERY_STATUS_CODE_FAILED}]))
+
+    with pytest.raises(RuntimeError, match="Generation failed"):
+        asyncio.run(asyncio.wait_for(poller.wait("a", 0.02), 1))
+
+
+def test_query_errors_retried_then_give_up():
+    query = FakeQuery(a=[ConnectionError("reset"), succeeded("a.mp3")], b=[ConnectionError("reset")])
+    poller = make_poller(query, max_errors=3)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(poller.wait("a", 0.02), poller.wait("b", 0.02), return_exceptions=True), 1
+        )
+
+    first, second = asyncio.run(main())
+    # 偶发错误后继续查询，连续出错达到上限才失败
+    assert first == {"AudioUrl": "a.mp3"}
+    assert isinstance(second, RuntimeError)
+    assert query.calls["b"] == 3
+
+
+def test_last_waiter_leaving_stops_polling():
+    query = FakeQuery(a=[running(10)])
+    poller = make_poller(query)
+
+    async def main():
+        waiter = asyncio.create_task(poller.wait("a", 0.02))
+        while not query.calls:
+            await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        calls = query.calls["a"]
+        await asyncio.sleep(0.1)
+        return calls
+
+    calls = asyncio.run(main())
+    assert poller._tasks == {}
+    assert query.calls["a"] == calls
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+from src.utils.sse import HEARTBEAT_FRAME, SSEEncoder, render_chat_chunk
+
+
+async def tokens(*items, delay: float = 0.0):
+    for item in items:
+        if isinstance(item, float):
+            await asyncio.sleep(item)
+            continue
+        await asyncio.sleep(delay)
+        yield item
+
+
+def join(items: list[str]) -> str:
+    return "".join(items)
+
+
+async def collect(encoder: SSEEncoder, source, **kwargs) -> list[str]:
+    return [frame async for frame in encoder.stream(source, join, **kwargs)]
+
+
+def test_first_item_sent_immediately_then_coalesced():
+    encoder = SSEEncoder(window=0.5, max_bytes=1000, heartbeat=10)
+    frames = asyncio.run(collect(encoder, tokens("a", "b", "c", "d")))
+    # 首个元素单独发送，之后的在流结束时合并成一帧
+    assert frames == ["a", "bcd"]
+    assert encoder.frames == 2
+    assert encoder.bytes == 4
+
+
+def test_window_flushes_pending_items():
+    encoder = SSEEncoder(window=0.05, max_bytes=1000, heartbeat=10)
+    frames = asyncio.run(collect(encoder, tokens("a", "b", "c", 0.2, "d")))
+    assert frames == ["a", "bc", "d"]
+
+
+def test_max_bytes_flushes_immediately():
+    encoder = SSEEncoder(window=10, max_bytes=2, heartbeat=10)
+    frames = asyncio.run(collect(encoder, tokens("a", "b", "c", "d", "e"), size=len))
+    assert frames == ["a", "bc", "de"]
+
+
+def test_zero_window_disables_coalescing():
+    encoder = SSEEncoder(window=0, max_bytes=1000, heartbeat=10)
+    frames = asyncio.run(collect(encoder, tokens("a", "b", "c", delay=0.01)))
+    assert frames == ["a", "b", "c"]
+
+
+def test_heartbeat_while_idle():
+    encoder = SSEEncoder(window=0.01, max_bytes=1000, heartbeat=0.05)
+    frames = asyncio.run(collect(encoder, tokens("a", 0.17, "b")))
+    assert frames[0] == "a"
+    assert frames[-1] == "b"
+    assert frames[1:-1] == [HEARTBEAT_FRAME] * (len(frames) - 2)
+    assert len(frames) >= 4
+
+
+def test_render_none_skips_frame():
+    encoder = SSEEncoder(window=10, max_bytes=1000, heartbeat=10)
+
+    async def main():
+        return [frame async for frame in encoder.stream(tokens("", "", "a"), lambda items: join(items) or None)]
+
+    # 首个元素渲染为空时不算已发送，下一个元素仍立即发送
+    assert asyncio.run(main()) == ["a"]
+
+
+def test_source_error_propagates():
+    async def failing():
+        yield "a"
+        raise ConnectionError("upstream reset")
+
+    encoder = SSEEncoder(window=10, max_bytes=1000, heartbeat=10)
+    with pytest.raises(ConnectionError):
+        asyncio.run(collect(encoder, failing()))
+
+
+def test_render_chat_chunk_matches_openai_envelope():
+    frame = render_chat_chunk('他说"你好"\n')
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    assert json.loads(frame[len("data: "):]) == {
+        "id": "chatcmpl-xxx",
+        "object": "chat.completion.chunk",
+        "choices": [{"delta": {"content": '他说"你好"\n'}, "index": 0, "finish_reason": None}],
+    }
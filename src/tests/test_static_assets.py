@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+import re
+from pathlib import Path
+
+import pytest
+from starlette.testclient import TestClient
+
+from src.utils.file_serving import IMMUTABLE_CACHE_CONTROL
+from src.utils.static_assets import StaticAssets, choose_encoding
+
+INDEX = """<!DOCTYPE html>
+<html>
+<head>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <img src="logo.png">
+    <script type="module" src="app.js"></script>
+</body>
+</html>
+"""
+# 足够大才会预压缩
+STYLE = '@import "base.css";\nbody { background: url("logo.png"); }\n' + "p { color: red; }\n" * 50
+
+
+@pytest.fixture
+def source_dir(tmp_path: Path) -> Path:
+    source_dir = tmp_path / "frontend"
+    (source_dir / "components").mkdir(parents=True)
+    (source_dir / "index.html").write_text(INDEX, encoding="utf-8")
+    (source_dir / "style.css").write_text(STYLE, encoding="utf-8")
+    (source_dir / "base.css").write_text("html { margin: 0; }\n", encoding="utf-8")
+    (source_dir / "app.js").write_text('import { render } from "./view.js";\nrender();\n', encoding="utf-8")
+    (source_dir / "view.js").write_text("export function render() {}\n", encoding="utf-8")
+    (source_dir / "logo.png").write_bytes(b"\x89PNG" + bytes(64))
+    (source_dir / "components" / "card.html").write_text('<div class="card"><img src="logo.png"></div>', encoding="utf-8")
+    return source_dir
+
+
+def build(source_dir: Path, build_dir: Path) -> StaticAssets:
+    assets = StaticAssets(source_dir, build_dir)
+    asyncio.run(assets.build())
+    return assets
+
+
+@pytest.fixture
+def client(source_dir: Path, tmp_path: Path) -> TestClient:
+    return TestClient(build(source_dir, tmp_path / "build"))
+
+
+def fingerprinted(text: str, stem: str, suffix: str) -> str:
+    match = re.search(rf"/{stem}\.[0-9a-f]{{10}}\{suffix}", text)
+    assert match is not None, f"{stem}{suffix} 没有改写为带哈希的地址"
+    return match.group(0)
+
+
+def test_index_rewritten(client: TestClient):
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    text = response.text
+    assert 'href="style.css"' not in text and 'src="app.js"' not in text
+    fingerprinted(text, "style", ".css")
+    # 入口脚本的依赖提前加载
+    assert f'<link rel="modulepreload" href="{fingerprinted(text, "view", ".js")}">' in text
+    # 片段内联，其中的地址同样改写
+    assert re.search(r'<template data-path="components/card.html"><div class="card"><img src="/logo\.[0-9a-f]{10}\.png">', text)
+    assert client.get("/index.html").text == text
+
+
+def test_fingerprinted_assets_immutable(client: TestClient):
+    text = client.get("/").text
+    style_url = fingerprinted(text, "style", ".css")
+    response = client.get(style_url, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["content-type"] == "text/css; charset=utf-8"
+    # 本地 @import 合并进来，url() 改写为带哈希的地址
+    assert "@import" not in response.text
+    assert "html { margin: 0; }" in response.text
+    assert fingerprinted(response.text, "logo", ".png")
+    # 原始文件名仍然可以访问，但需要重新验证
+    assert client.get("/style.css").headers["cache-control"] == "no-cache"
+    assert client.get("/missing.css").status_code == 404
+
+
+def test_gzip_chosen_by_accept_encoding(client: TestClient):
+    style_url = fingerprinted(client.get("/").text, "style", ".css")
+    plain = client.get(style_url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    compressed = client.get(style_url, headers={"Accept-Encoding": "gzip, deflate"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    assert compressed.text == plain.text
+
+    # 压缩版本单独按自己的 ETag 重新验证
+    revalidated = client.get(
+        style_url, headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_small_and_binary_files_not_compressed(client: TestClient):
+    response = client.get("/base.css", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    response = client.get("/logo.png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"\x89PNG" + bytes(64)
+
+
+def test_rebuild_reuses_build_dir(source_dir: Path, tmp_path: Path):
+    build_dir = tmp_path / "build"
+    first = build(source_dir, build_dir)
+    files = sorted(path.name for path in build_dir.iterdir())
+    second = build(source_dir, build_dir)
+    # 内容不变时文件名和 ETag 都不变
+    assert sorted(path.name for path in build_dir.iterdir()) == files
+    assert {rel: asset.etag for rel, asset in first._assets.items()} == {
+        rel: asset.etag for rel, asset in second._assets.items()
+    }
+    gz = next(build_dir.glob("*.gz"))
+    assert gzip.decompress(gz.read_bytes())
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("br, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, {"gzip": Path("a.gz")}) == expected
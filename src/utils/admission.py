@@ -0,0 +1,403 @@
+"""
+上游准入控制
+
+每个上游（方舟大模型、火山音乐生成）一个 UpstreamLimiter：令牌桶限制请求速率，并发上限限制同时进行的调用数，
+超出时按优先级排队，政策问答优先于活动设计和音乐生成，后台任务最后。队列有长度上限，
+每个请求有排队期限，放不下或等不及时抛出 UpstreamOverloaded，由接口返回 429 和 Retry-After。
+上游自己返回 429 时同样转成 UpstreamOverloaded，并暂停放行，直到上游给出的重试时间
+（方舟大模型在 call/stream 中转换，火山音乐接口在 call_api 中转换）。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import sys
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from enum import IntEnum
+from typing import Any, TypeVar
+
+from src.conf.env import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """数值越小越优先"""
+    CHAT = 0
+    ACTIVITY = 1
+    MUSIC = 2
+    BACKGROUND = 3
+
+
+class UpstreamOverloaded(RuntimeError):
+    """上游繁忙，retry_after 秒后再试"""
+
+    def __init__(self, upstream: str, retry_after: float, message: str = "上游服务繁忙，请稍后再试"):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class Lease:
+    """一个并发名额，释放多次只生效一次；未显式释放时在对象回收时释放"""
+
+    def __init__(self, limiter: "UpstreamLimiter"):
+        self._limiter = limiter
+        self._loop = asyncio.get_running_loop()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+    async def __aenter__(self) -> "Lease":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def __del__(self):
+        # 回收可能发生在其他线程或事件循环停止之后，交给事件循环释放
+        if self._released:
+            return
+        self._released = True
+        try:
+            self._loop.call_soon_threadsafe(self._limiter._release)
+        except RuntimeError:
+            # 事件循环已关闭，不再有等待名额的请求
+            self._limiter.active -= 1
+
+
+class LeasedStream:
+    """
+    持有并发名额的流，流结束、出错或关闭时释放名额
+
+    使用类而不是异步生成器：StreamingResponse 在客户端提前断开时可能从未开始迭代，
+    异步生成器的 finally 不会执行，而对象回收时 __del__ 总会释放名额。
+    """
+
+    _EMPTY = object()
+
+    def __init__(self, lease: Lease, stream: AsyncIterator, first: Any = _EMPTY):
+        self._lease = lease
+        self._stream = stream
+        self._first = first
+
+    def __aiter__(self) -> "LeasedStream":
+        return self
+
+    async def __anext__(self):
+        if self._first is not LeasedStream._EMPTY:
+            first, self._first = self._first, LeasedStream._EMPTY
+            return first
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            self._lease.release()
+            raise
+
+    async def aclose(self):
+        self._lease.release()
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class _Waiter:
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.queued = True
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class LaneStats:
+    def __init__(self):
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+
+class UpstreamLimiter:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        concurrency: int,
+        queue_size: int,
+        timeout: float,
+    ):
+        """
+        Args:
+            name: 上游名称，用于日志和指标
+            rate: 每秒放行的请求数，0 表示不限速率
+            burst: 令牌桶容量，允许的突发请求数
+            concurrency: 同时进行的调用数上限
+            queue_size: 排队请求数上限，满了之后新请求只能挤掉更低优先级的排队请求
+            timeout: 默认的排队期限（秒）
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.throttled = 0
+        self.lanes = {priority: LaneStats() for priority in Priority}
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._heap: list[tuple[int, int, _Waiter]] = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self._queued,
+            "throttled": self.throttled,
+            "lanes": {priority.name.lower(): vars(lane).copy() for priority, lane in self.lanes.items()},
+        }
+
+    async def acquire(self, priority: Priority, timeout: float | None = None) -> Lease:
+        """
+        取得一个并发名额，需要排队时最多等待 timeout 秒，math.inf 表示不设期限
+
+        Raises:
+            UpstreamOverloaded: 队列已满且没有更低优先级的请求可挤掉，或排队超时
+        """
+        timeout = self.timeout if timeout is None else timeout
+        lease = self.try_acquire(priority)
+        if lease is not None:
+            return lease
+
+        lane = self.lanes[priority]
+        if self._queued >= self.queue_size:
+            victim = self._lowest_waiter(priority)
+            if victim is None:
+                lane.rejected += 1
+                raise UpstreamOverloaded(self.name, self.retry_after())
+            # 挤掉优先级最低、最晚到达的排队请求
+            self._dequeue(victim)
+            self.lanes[victim.priority].rejected += 1
+            victim.future.set_exception(UpstreamOverloaded(self.name, self.retry_after()))
+
+        waiter = _Waiter(priority)
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+        self._queued += 1
+        lane.queued += 1
+        self._schedule()
+        try:
+            await asyncio.wait_for(waiter.future, None if math.isinf(timeout) else timeout)
+        except asyncio.TimeoutError:
+            if self._granted(waiter):
+                # 超时的同时已经分到名额，归还后仍按超时拒绝
+                self._release()
+            else:
+                self._dequeue(waiter)
+            lane.rejected += 1
+            logger.warning(f"{self.name}: 排队超过 {timeout:.0f} 秒，拒绝请求")
+            raise UpstreamOverloaded(self.name, self.retry_after()) from None
+        except BaseException:
+            if self._granted(waiter):
+                # 已经分到名额时调用方断开，归还名额
+                self._release()
+            else:
+                self._dequeue(waiter)
+            raise
+        return Lease(self)
+
+    def try_acquire(self, priority: Priority) -> Lease | None:
+        """有空闲名额且没有排队的请求时立即取得，否则返回None，不排队"""
+        now = time.monotonic()
+        self._refill(now)
+        if self._queued == 0 and self._can_admit(now):
+            return self._admit(priority, 0.0)
+        return None
+
+    def throttle(self, retry_after: float):
+        """上游返回 429 时暂停放行 retry_after 秒"""
+        self.throttled += 1
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        logger.warning(f"{self.name}: 上游限流，暂停 {retry_after:.1f} 秒")
+
+    def retry_after(self) -> float:
+        """估计排队清空需要的时间"""
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        if self.rate > 0:
+            wait += (self._queued + 1) / self.rate
+        return max(1.0, wait if math.isinf(self.timeout) else min(wait, self.timeout))
+
+    async def call(self, priority: Priority, fn: Callable[[], Awaitable[T]], timeout: float | None = None) -> T:
+        """在名额内执行一次调用，上游限流时抛出 UpstreamOverloaded"""
+        async with await self.acquire(priority, timeout):
+            try:
+                return await fn()
+            except Exception as e:
+                raise self._translate(e)
+
+    async def stream(
+        self,
+        priority: Priority,
+        open_stream: Callable[[], AsyncIterator[T]],
+        timeout: float | None = None,
+        lease: Lease | None = None,
+    ) -> AsyncIterator[T]:
+        """
+        在名额内打开一个流，名额一直持有到流结束
+
+        先取到第一个分块再返回，上游在开始输出前出错（包括限流）时由调用方直接得到异常，
+        接口可以返回正确的状态码而不是在已经开始的响应中断开。
+        lease 为已经取得的名额，不传时排队取得。
+        """
+        if lease is None:
+            lease = await self.acquire(priority, timeout)
+        try:
+            stream = open_stream()
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            lease.release()
+            return LeasedStream(lease, stream)
+        except Exception as e:
+            lease.release()
+            raise self._translate(e)
+        except BaseException:
+            # 取消时同样归还名额
+            lease.release()
+            raise
+        return LeasedStream(lease, stream, first)
+
+    def _translate(self, error: Exception) -> Exception:
+        # 不为此导入 openai：还没有导入时错误不可能来自 openai 客户端
+        openai = sys.modules.get("openai")
+        if openai is not None and isinstance(error, openai.RateLimitError):
+            retry_after = _parse_retry_after(error.response.headers.get("retry-after"))
+            self.throttle(retry_after)
+            return UpstreamOverloaded(self.name, retry_after)
+        return error
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _can_admit(self, now: float) -> bool:
+        return (
+            self.active < self.concurrency
+            and now >= self._paused_until
+            and (self.rate <= 0 or self._tokens >= 1)
+        )
+
+    def _admit(self, priority: Priority, waited: float) -> Lease:
+        self._take(priority, waited)
+        return Lease(self)
+
+    def _take(self, priority: Priority, waited: float):
+        self.active += 1
+        if self.rate > 0:
+            self._tokens -= 1
+        lane = self.lanes[priority]
+        lane.admitted += 1
+        lane.wait_seconds += waited
+        lane.max_wait_seconds = max(lane.max_wait_seconds, waited)
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @staticmethod
+    def _granted(waiter: _Waiter) -> bool:
+        future = waiter.future
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _dequeue(self, waiter: _Waiter):
+        if waiter.queued:
+            waiter.queued = False
+            self._queued -= 1
+            self.lanes[waiter.priority].queued -= 1
+
+    def _lowest_waiter(self, priority: Priority) -> _Waiter | None:
+        candidates = [entry for entry in self._heap if entry[2].queued and entry[0] > priority]
+        return max(candidates, key=lambda entry: entry[:2])[2] if candidates else None
+
+    def _dispatch(self):
+        now = time.monotonic()
+        self._refill(now)
+        while self._heap:
+            priority, _, waiter = self._heap[0]
+            if not waiter.queued or waiter.future.done():
+                heapq.heappop(self._heap)
+                self._dequeue(waiter)
+                continue
+            if not self._can_admit(now):
+                break
+            heapq.heappop(self._heap)
+            self._dequeue(waiter)
+            self._take(waiter.priority, now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+        self._schedule()
+
+    def _schedule(self):
+        """名额被令牌或限流暂停卡住时，定时再次放行"""
+        if self._timer is not None or self._queued == 0 or self.active >= self.concurrency:
+            return
+        now = time.monotonic()
+        delay = max(0.0, self._paused_until - now)
+        if self.rate > 0 and self._tokens < 1:
+            delay = max(delay, (1 - self._tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+def _per_worker(limit: int) -> int:
+    """限额是整个服务的，多个 worker 进程时每个进程分到一份"""
+    return max(1, limit // settings.WORKERS)
+
+
+def _parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    try:
+        return max(0.0, float(value)) if value is not None else default
+    except ValueError:
+        return default
+
+
+ark_limiter = UpstreamLimiter(
+    "ark",
+    rate=settings.ARK_RATE_LIMIT / settings.WORKERS,
+    burst=_per_worker(settings.ARK_BURST),
+    concurrency=_per_worker(settings.ARK_CONCURRENCY),
+    queue_size=_per_worker(settings.ARK_QUEUE_SIZE),
+    timeout=settings.ARK_QUEUE_TIMEOUT,
+)
+
+song_limiter = UpstreamLimiter(
+    "gen_song",
+    rate=settings.SONG_RATE_LIMIT / settings.WORKERS,
+    burst=_per_worker(settings.SONG_BURST),
+    concurrency=_per_worker(settings.SONG_CONCURRENCY),
+    queue_size=_per_worker(settings.SONG_QUEUE_SIZE),
+    timeout=settings.SONG_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,571 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse
+
+import aiofiles
+import httpx
+
+from src.conf.env import settings
+from src.utils.file_lock import file_lock
+from src.utils.metrics import audio_download_duration, upstream_request_duration
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".index.json"
+INDEX_LOCK_FILENAME = ".index.lock"
+INDEX_VERSION = 1
+# 超过这么久没有写入的临时文件视为异常退出的残留；更新的可能属于其他 worker 正在进行的下载
+STALE_TMP_SECONDS = 600
+CONTENT_ADDRESSED_PATTERN = re.compile(r"^([0-9a-f]{32})\.[a-z0-9]+$")
+
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'audio/webm,audio/ogg,audio/wav,audio/mp3,audio/mpeg,*/*;q=0.9',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Referer': 'https://www.douyin.com/',
+}
+
+
+def guess_extension(url: str) -> str:
+    path = urlparse(url).path.lower()
+    if "wav" in path:
+        return ".wav"
+    elif "ogg" in path:
+        return ".ogg"
+    return ".mp3"
+
+
+def content_hash(filename: str) -> str | None:
+    """按内容寻址的文件名返回其内容哈希，其他文件名返回None"""
+    match = CONTENT_ADDRESSED_PATTERN.match(filename)
+    return match.group(1) if match else None
+
+
+class AudioCacheEntry:
+    __slots__ = ("size", "last_access", "source")
+
+    def __init__(self, size: int, last_access: float, source: str | None):
+        self.size = size
+        self.last_access = last_access
+        self.source = source
+
+
+class AudioDownload:
+    """
+    一次进行中的下载，供边下边播的读取方跟随已写入的数据
+    """
+
+    def __init__(self, url: str, name: str, part_path: Path):
+        self.url = url
+        self.name = name
+        self.part_path = part_path
+        self.written = 0
+        self.total: int | None = None
+        self.done = False
+        self.error: Exception | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def advance(self, size: int):
+        self.written += size
+        self._notify()
+
+    def finish(self, error: Exception | None = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def wait(self, offset: int):
+        """等到 offset 之后有数据可读，或下载结束"""
+        while self.written <= offset and not self.done:
+            await self._changed.wait()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class PartialFile:
+    """
+    其他 worker 进程正在下载的文件，通过临时文件跟随写入进度
+
+    临时文件变长即有新数据；临时文件被重命名为最终文件说明下载完成，被删除（链接数为 0）
+    说明下载失败。总大小未知，只能按完整内容发送。
+    """
+
+    total = None
+
+    def __init__(self, part_path: Path, poll_interval: float = 0.05):
+        """
+        Raises:
+            FileNotFoundError: 临时文件已经不存在（下载已结束）
+        """
+        self.part_path = part_path
+        self.poll_interval = poll_interval
+        self.written = 0
+        self.done = False
+        self.error: Exception | None = None
+        self._fd: int | None = None
+        self._fd = os.open(part_path, os.O_RDONLY)
+
+    async def wait(self, offset: int):
+        """等到 offset 之后有数据可读，或下载结束"""
+        while not self.done:
+            stat = os.fstat(self._fd)
+            self.written = stat.st_size
+            if stat.st_nlink == 0:
+                self._finish(RuntimeError("音频下载失败"))
+            elif not self.part_path.exists():
+                self._finish()
+            elif self.written > offset:
+                return
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    def _finish(self, error: Exception | None = None):
+        # 重命名前已写完，最后再读一次大小
+        self.written = os.fstat(self._fd).st_size
+        self.done = True
+        self.error = error
+        self._close()
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self._close()
+
+
+class AudioCache:
+    """
+    按内容寻址的音频缓存
+
+    文件以内容哈希命名，相同音频只存一份；按总字节数和最长保留时间做 LRU 淘汰。
+    大小、最近访问时间和来源记录在目录下的索引文件中，启动时只读索引，
+    仅在索引缺失时才扫描目录。
+
+    多个 worker 进程可以共享同一个目录：文件先写入临时文件再原子重命名；索引在文件锁内
+    与磁盘上的版本合并后写回，各进程的下载和淘汰互相可见；边下边播的临时文件名以符号链接
+    指向最终文件，其他进程收到该文件名的请求时跟随临时文件或解析链接。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = settings.AUDIO_CACHE_MAX_BYTES,
+        max_age: float = settings.AUDIO_CACHE_MAX_AGE,
+        index_flush_interval: float = 30.0,
+        download_concurrency: int = settings.AUDIO_DOWNLOAD_CONCURRENCY,
+        download_retries: int = settings.AUDIO_DOWNLOAD_RETRIES,
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总字节数上限
+            max_age: 文件最长保留时间（秒），按最近访问时间计算
+            index_flush_interval: 仅有访问更新时索引落盘的最小间隔（秒）
+            download_concurrency: 同时进行的下载数上限
+            download_retries: 下载中断后的续传次数
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_flush_interval = index_flush_interval
+        self.download_retries = download_retries
+        self.hits = 0
+        self.misses = 0
+        self.dedups = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, AudioCacheEntry] = OrderedDict()
+        self._sources: dict[str, str] = {}
+        # 边下边播的临时文件名 -> 最终文件名
+        self._aliases: dict[str, str] = {}
+        self._downloads: dict[str, AudioDownload] = {}
+        self._downloads_by_name: dict[str, AudioDownload] = {}
+        self._download_slots = asyncio.Semaphore(download_concurrency)
+        self._total_bytes = 0
+        # 自上次写入索引后新增或访问过的文件、被移除的文件，写索引时只合并这些变化
+        self._changed: set[str] = set()
+        self._removed: set[str] = set()
+        self._last_flush = 0.0
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "dedups": self.dedups,
+            "evictions": self.evictions,
+        }
+
+    async def start(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(self._load_index)
+        self._client = httpx.AsyncClient(timeout=60.0, follow_redirects=True)
+        self._evict()
+        # 启动时完整同步一次，去掉索引中文件已不存在的记录
+        await self.flush(full=True)
+
+    async def close(self):
+        tasks = [download.task for download in self._downloads.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await self.flush()
+
+    def path(self, filename: str) -> Path | None:
+        """返回缓存文件路径，非法文件名返回None"""
+        if not filename or filename.startswith(".") or "/" in filename or "\\" in filename:
+            return None
+        return self.cache_dir / filename
+
+    def touch(self, filename: str) -> bool:
+        """
+        记录一次访问用于 LRU 淘汰，返回文件是否在缓存中
+
+        不计入命中率：同一首歌播放时会有多次 Range 请求，命中和未命中只在 fetch 按来源地址查询时各计一次
+        """
+        entry = self._entries.get(filename)
+        if entry is None:
+            return False
+        entry.last_access = time.time()
+        self._entries.move_to_end(filename)
+        self._mark(filename)
+        if time.monotonic() - self._last_flush >= self.index_flush_interval and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+        return True
+
+    def discard(self, filename: str):
+        """移除索引中已不存在的文件"""
+        if self._drop(filename):
+            self._changed.discard(filename)
+            self._removed.add(filename)
+
+    def _drop(self, filename: str) -> bool:
+        """只从本进程的记录中移除"""
+        entry = self._entries.pop(filename, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry.size
+        if entry.source and self._sources.get(entry.source) == filename:
+            del self._sources[entry.source]
+        for alias in [alias for alias, target in self._aliases.items() if target == filename]:
+            del self._aliases[alias]
+            self._alias_path(alias).unlink(missing_ok=True)
+        return True
+
+    def _mark(self, filename: str):
+        self._changed.add(filename)
+        self._removed.discard(filename)
+
+    def resolve(self, filename: str) -> str:
+        """把边下边播时分配的临时文件名解析为最终的内容寻址文件名"""
+        target = self._aliases.get(filename)
+        if target is None and filename.startswith("p-") and self.path(filename) is not None:
+            # 可能是其他 worker 下载的
+            try:
+                target = self._aliases[filename] = os.readlink(self._alias_path(filename))
+            except OSError:
+                return filename
+        return target or filename
+
+    def active_download(self, filename: str) -> "AudioDownload | PartialFile | None":
+        """返回仍在下载中的文件，包括其他 worker 正在下载的"""
+        download = self._downloads_by_name.get(filename)
+        if download is None and filename.startswith("p-") and self.path(filename) is not None:
+            try:
+                return PartialFile(self._part_path(filename))
+            except FileNotFoundError:
+                return None
+        return download
+
+    def _part_path(self, name: str) -> Path:
+        return self.cache_dir / f".part-{name}"
+
+    def _alias_path(self, name: str) -> Path:
+        return self.cache_dir / f".alias-{name}"
+
+    def _link_alias(self, name: str, filename: str):
+        self._aliases[name] = filename
+        try:
+            os.symlink(filename, self._alias_path(name))
+        except OSError as e:
+            logger.warning(f"创建音频别名失败，其他 worker 无法解析 {name}: {str(e)}")
+
+    async def put(self, filename: str, data: bytes):
+        """保存随音频一起缓存的小文件（如歌词），文件名应按内容寻址，与音频一样参与淘汰"""
+        if self.touch(filename):
+            return
+        await asyncio.to_thread(self._write_file, filename, data)
+        self._entries[filename] = AudioCacheEntry(len(data), time.time(), None)
+        self._total_bytes += len(data)
+        self._mark(filename)
+        self._evict(keep=filename)
+        await self.flush()
+
+    def _write_file(self, filename: str, data: bytes):
+        tmp_path = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self.cache_dir / filename)
+
+    async def fetch(self, url: str, wait: bool = True) -> str:
+        """
+        下载并缓存音频，返回本地文件名
+
+        Args:
+            url: 音频地址
+            wait: 为True时等下载完成后返回内容寻址的文件名；为False时（边下边播）
+                收到第一块数据即返回临时文件名，下载完成后该文件名会解析到最终文件
+        """
+        filename = self._sources.get(url)
+        if filename is not None and filename in self._entries:
+            self.hits += 1
+            self.touch(filename)
+            return filename
+
+        download = self._downloads.get(url)
+        if download is not None:
+            # 同一地址正在下载，合并到已有下载中，不会再请求上游
+            self.hits += 1
+        else:
+            self.misses += 1
+            name = f"p-{uuid.uuid4().hex}{guess_extension(url)}"
+            download = AudioDownload(url=url, name=name, part_path=self._part_path(name))
+            self._downloads[url] = download
+            self._downloads_by_name[download.name] = download
+            download.task = asyncio.create_task(self._download(download))
+            download.task.add_done_callback(lambda task, d=download: self._download_done(d))
+
+        if wait:
+            return await asyncio.shield(download.task)
+        await download.wait(0)
+        if download.error is not None:
+            raise download.error
+        return download.name
+
+    async def _download(self, download: AudioDownload) -> str:
+        """下载到临时文件，同时供跟随读取；连接中断时用 Range 续传"""
+        digest = hashlib.sha256()
+        validator = None
+        attempt = 0
+        started_at = time.perf_counter()
+        logger.info(f"开始缓存音频文件: {download.url}")
+        try:
+            async with self._download_slots:
+                async with aiofiles.open(download.part_path, 'wb', buffering=0) as f:
+                    while True:
+                        headers = dict(DOWNLOAD_HEADERS)
+                        if download.written:
+                            headers["Range"] = f"bytes={download.written}-"
+                            if validator:
+                                headers["If-Range"] = validator
+                        try:
+                            requested_at = time.perf_counter()
+                            async with self._client.stream('GET', download.url, headers=headers) as response:
+                                upstream_request_duration.observe(time.perf_counter() - requested_at, "audio", "download")
+                                response.raise_for_status()
+                                validator = response.headers.get("etag") or response.headers.get("last-modified")
+                                # 上游不支持续传时会从头返回，跳过已写入的部分
+                                skip = download.written if response.status_code != 206 else 0
+                                if download.total is None and response.status_code == 200:
+                                    content_length = response.headers.get("content-length")
+                                    download.total = int(content_length) if content_length else None
+                                async for chunk in response.aiter_bytes(chunk_size=65536):
+                                    if skip:
+                                        dropped = min(skip, len(chunk))
+                                        chunk = chunk[dropped:]
+                                        skip -= dropped
+                                        if not chunk:
+                                            continue
+                                    await f.write(chunk)
+                                    digest.update(chunk)
+                                    download.advance(len(chunk))
+                            break
+                        except httpx.TransportError as e:
+                            attempt += 1
+                            if attempt > self.download_retries:
+                                raise
+                            logger.warning(f"音频下载中断，{attempt}秒后从{download.written}字节续传: {str(e)}")
+                            await asyncio.sleep(attempt)
+        except BaseException as e:
+            self._forget(download)
+            download.part_path.unlink(missing_ok=True)
+            download.finish(e if isinstance(e, Exception) else RuntimeError("音频下载已取消"))
+            raise
+
+        # 先登记别名再移动临时文件，之后的请求（包括其他 worker 收到的）直接读取最终文件
+        filename = f"{digest.hexdigest()[:32]}{guess_extension(download.url)}"
+        self._link_alias(download.name, filename)
+        self._forget(download)
+        # 内容相同的音频已存在时同样用重命名覆盖（内容不变），而不是删除临时文件：
+        # 其他 worker 据临时文件是否被删除判断下载是否失败
+        os.replace(download.part_path, self.cache_dir / filename)
+        if filename in self._entries:
+            self.dedups += 1
+        else:
+            self._entries[filename] = AudioCacheEntry(download.written, time.time(), download.url)
+            self._total_bytes += download.written
+        entry = self._entries[filename]
+        entry.last_access = time.time()
+        entry.source = download.url
+        self._entries.move_to_end(filename)
+        self._sources[download.url] = filename
+        self._mark(filename)
+        download.finish()
+        audio_download_duration.observe(time.perf_counter() - started_at)
+        logger.info(f"音频文件缓存成功: {filename}")
+
+        self._evict(keep=filename)
+        await self.flush()
+        return filename
+
+    def _forget(self, download: AudioDownload):
+        self._downloads.pop(download.url, None)
+        self._downloads_by_name.pop(download.name, None)
+
+    def _download_done(self, download: AudioDownload):
+        if not download.task.cancelled() and download.task.exception() is not None:
+            logger.error(f"缓存音频文件失败: {download.url}: {str(download.task.exception())}")
+
+    def _evict(self, keep: str | None = None):
+        """淘汰过期文件，并按最近访问顺序淘汰到字节上限以内"""
+        deadline = time.time() - self.max_age
+        for filename in list(self._entries):
+            if filename == keep:
+                continue
+            entry = self._entries[filename]
+            if entry.last_access >= deadline and self._total_bytes <= self.max_bytes:
+                break
+            self.discard(filename)
+            (self.cache_dir / filename).unlink(missing_ok=True)
+            self.evictions += 1
+            logger.info(f"淘汰缓存音频: {filename}")
+
+    async def flush(self, full: bool = False):
+        """
+        索引有变化时与磁盘上的索引合并后写入，同时得到其他 worker 的变化
+
+        平时只合并本进程的增量，各 worker 淘汰文件时自己从索引中删除记录；
+        full为True时写入全部记录，并检查索引中每个文件是否存在
+        """
+        async with self._flush_lock:
+            if not (full or self._changed or self._removed):
+                return
+            changed, removed = self._changed, self._removed
+            self._changed, self._removed = set(), set()
+            self._last_flush = time.monotonic()
+            names = list(self._entries) if full else changed
+            rows = [[name, e.size, round(e.last_access, 3), e.source] for name in names if (e := self._entries.get(name))]
+            snapshot = set(self._entries)
+            try:
+                merged = await asyncio.to_thread(self._sync_index, rows, removed, full)
+            except Exception:
+                # 留到下次写入，期间又有变化的以新的为准
+                self._changed |= changed - self._removed
+                self._removed |= removed - self._changed
+                raise
+            self._merge(snapshot, merged)
+
+    def _sync_index(self, rows: list, removed: set[str], full: bool) -> list:
+        with file_lock(self.cache_dir / INDEX_LOCK_FILENAME):
+            merged = {row[0]: row for row in self._read_index() or [] if row[0] not in removed}
+            for row in rows:
+                current = merged.get(row[0])
+                if current is None or row[2] >= current[2]:
+                    merged[row[0]] = [row[0], row[1], row[2], row[3] or (current[3] if current else None)]
+            # 只检查本次变化的文件，其他 worker 淘汰的文件已由其自己从索引中删除
+            checked = list(merged) if full else [row[0] for row in rows]
+            for name in checked:
+                if not (self.cache_dir / name).is_file():
+                    del merged[name]
+            rows = sorted(merged.values(), key=lambda row: row[2])
+            self._write_index(rows)
+        return rows
+
+    def _merge(self, snapshot: set[str], merged: list):
+        names = {row[0] for row in merged}
+        # 其他 worker 已淘汰的文件
+        for name in snapshot - names:
+            self._drop(name)
+        for name, size, last_access, source in merged:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = AudioCacheEntry(size, last_access, source)
+                self._total_bytes += size
+            else:
+                entry.last_access = max(entry.last_access, last_access)
+                entry.source = entry.source or source
+            if source and source not in self._sources:
+                self._sources[source] = name
+        self._entries = OrderedDict(sorted(self._entries.items(), key=lambda item: item[1].last_access))
+
+    def _write_index(self, rows: list):
+        index_path = self.cache_dir / INDEX_FILENAME
+        tmp_path = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp_path.write_text(json.dumps({"v": INDEX_VERSION, "entries": rows}, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+
+    def _read_index(self) -> list | None:
+        try:
+            data = json.loads((self.cache_dir / INDEX_FILENAME).read_text(encoding="utf-8"))
+            if data.get("v") == INDEX_VERSION:
+                return data["entries"]
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            logger.warning(f"音频缓存索引损坏，重新扫描目录: {str(e)}")
+        return None
+
+    def _load_index(self):
+        # 清理异常退出残留的临时文件，还在写入的可能属于其他 worker
+        deadline = time.time() - STALE_TMP_SECONDS
+        for tmp_path in [*self.cache_dir.glob(".tmp-*"), *self.cache_dir.glob(".part-*")]:
+            try:
+                if tmp_path.stat().st_mtime < deadline:
+                    tmp_path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+        # 目标已被淘汰的别名
+        for alias_path in self.cache_dir.glob(".alias-*"):
+            if not alias_path.exists():
+                alias_path.unlink(missing_ok=True)
+
+        rows = self._read_index()
+        if rows is None:
+            # 索引缺失时扫描一次目录重建
+            rows = []
+            for path in self.cache_dir.iterdir():
+                if path.name.startswith(".") or not path.is_file():
+                    continue
+                stat = path.stat()
+                rows.append([path.name, stat.st_size, stat.st_mtime, None])
+            rows.sort(key=lambda row: row[2])
+
+        for name, size, last_access, source in rows:
+            self._entries[name] = AudioCacheEntry(size, last_access, source)
+            self._total_bytes += size
+            if source:
+                self._sources[source] = name
@@ -0,0 +1,63 @@
+"""
+歌词字幕的列式格式
+
+音乐生成接口返回的 Captions 是嵌套在 JSON 里的 JSON 字符串，每个字都重复 attribute/start_time/end_time 等键，
+两分钟的歌有几十 KB。这里转换为按列存放的结构，时间单位为毫秒：
+
+    {
+        "v": 1,
+        "duration": 107737,
+        "lines": {"start": [...], "end": [...], "text": [...]},
+        "words": {"start": [...], "end": [...], "text": [...]},
+        "line_words": [0, 3, 6, ...]
+    }
+
+line_words 比行数多一个元素，第 i 行的字是 words 中下标 line_words[i] 到 line_words[i + 1] 的部分；
+各行按开始时间排列，播放定位时可以对 lines.start 二分查找。只用于延长上一个字时长的空字不保留。
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CAPTIONS_VERSION = 1
+
+
+def compact_captions(captions: str | dict | None) -> dict | None:
+    """把上游的 Captions 转换为列式结构，没有歌词或无法解析时返回None"""
+    if not captions:
+        return None
+    try:
+        data = json.loads(captions) if isinstance(captions, str) else captions
+        utterances = data.get("utterances") or []
+        lines = {"start": [], "end": [], "text": []}
+        words = {"start": [], "end": [], "text": []}
+        line_words = [0]
+        for utterance in sorted(utterances, key=lambda item: int(item.get("start_time", 0))):
+            lines["start"].append(int(utterance.get("start_time", 0)))
+            lines["end"].append(int(utterance.get("end_time", 0)))
+            lines["text"].append(utterance.get("text") or "")
+            for word in utterance.get("words") or []:
+                if not word.get("text"):
+                    continue
+                words["start"].append(int(word.get("start_time", 0)))
+                words["end"].append(int(word.get("end_time", 0)))
+                words["text"].append(word["text"])
+            line_words.append(len(words["text"]))
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"歌词数据解析失败: {str(e)}")
+        return None
+    if not lines["text"]:
+        return None
+    # 上游的总时长单位为秒；缺失或无法解析时取最后一行的结束时间，不因此丢掉歌词
+    try:
+        duration = round(float(data["duration"]) * 1000)
+    except (KeyError, ValueError, TypeError, OverflowError):
+        duration = 0
+    return {
+        "v": CAPTIONS_VERSION,
+        "duration": duration or max(lines["end"]),
+        "lines": lines,
+        "words": words,
+        "line_words": line_words,
+    }
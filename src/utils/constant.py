@@ -1 +1 @@
-VE_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3/"
+VE_LLM_MODEL = "kimi-k2-250905"
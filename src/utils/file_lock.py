@@ -0,0 +1,44 @@
+"""
+同一台机器上多个 worker 进程之间的文件锁
+
+基于 flock：锁跟随打开的文件描述符，进程退出时由内核释放，崩溃的 worker 不会留下永久的锁。
+不支持 flock 的平台（Windows）上不加锁，只能单进程运行。两个函数都会阻塞或做文件 IO，
+在事件循环中应通过 asyncio.to_thread 调用。
+"""
+import contextlib
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """阻塞直到取得 path 上的排他锁，退出时释放"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def try_claim(path: Path) -> int | None:
+    """
+    不等待地占有 path，成功时返回文件描述符，保持打开即持续占有，关闭即释放；
+    已被其他进程（或本进程的另一个描述符）占有时返回 None
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is None:
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
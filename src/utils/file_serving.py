@@ -0,0 +1,300 @@
+import asyncio
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import BinaryIO, Protocol
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(ValueError):
+    """请求的范围超出文件大小"""
+
+
+def parse_range_header(range_header: str, file_size: int) -> list[tuple[int, int]] | None:
+    """
+    解析 Range 请求头，支持 a-b、a-、-N（后缀）和逗号分隔的多段范围
+
+    Returns:
+        list: 合并重叠区间后的 (start, end) 闭区间列表；格式不合法时返回None（按完整文件响应）
+
+    Raises:
+        RangeNotSatisfiable: 所有范围都无法满足时
+    """
+    unit, _, range_set = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not range_set:
+        return None
+    ranges = []
+    for part in range_set.split(","):
+        start_str, sep, end_str = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if start_str:
+                start = int(start_str)
+                end = int(end_str) if end_str else file_size - 1
+                if end_str and start > end:
+                    return None
+            else:
+                # 后缀范围: 最后 N 个字节
+                suffix_length = int(end_str)
+                if suffix_length == 0:
+                    continue
+                start = max(file_size - suffix_length, 0)
+                end = file_size - 1
+        except ValueError:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(range_header)
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def is_not_modified(request_headers: Headers, etag: str, last_modified: float) -> bool:
+    """根据 If-None-Match / If-Modified-Since 判断是否可以返回304"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class GrowingFile(Protocol):
+    """仍在写入中的文件"""
+    written: int
+    total: int | None
+    done: bool
+    error: Exception | None
+
+    async def wait(self, offset: int) -> None: ...
+
+
+class FileRangeResponse(Response):
+    """
+    按区间发送文件内容的响应
+
+    服务器支持 ASGI zerocopysend 扩展时交给内核 sendfile，否则在线程池中
+    pread 读取，不阻塞事件循环。多段范围按 multipart/byteranges 编码。
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: Path,
+        ranges: list[tuple[int, int]],
+        file_size: int,
+        status_code: int,
+        headers: dict,
+        media_type: str,
+    ):
+        self.path = path
+        self.status_code = status_code
+        self.background = None
+        # (分段前缀, 起始偏移, 结束偏移)
+        self.parts: list[tuple[bytes, int, int]] = []
+        self.trailer = b""
+        headers = dict(headers)
+        if len(ranges) > 1:
+            boundary = uuid.uuid4().hex
+            content_length = 0
+            for index, (start, end) in enumerate(ranges):
+                prefix = (
+                    ("\r\n" if index else "")
+                    + f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+                    + f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((prefix, start, end))
+                content_length += len(prefix) + end - start + 1
+            self.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            content_length += len(self.trailer)
+            headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+        else:
+            start, end = ranges[0]
+            self.parts.append((b"", start, end))
+            content_length = end - start + 1
+            headers["Content-Type"] = media_type
+            if status_code == 206:
+                headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        headers["Content-Length"] = str(content_length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        file = await asyncio.to_thread(open, self.path, "rb", buffering=0)
+        try:
+            fd = file.fileno()
+            for prefix, start, end in self.parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": True,
+                    })
+                    continue
+                offset = start
+                while offset <= end:
+                    chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, end - offset + 1), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            file.close()
+
+
+def serve_file(
+    request: Request,
+    path: Path,
+    media_type: str,
+    etag: str | None = None,
+    cache_control: str = DEFAULT_CACHE_CONTROL,
+) -> Response:
+    """
+    提供文件下载，支持条件请求（ETag/Last-Modified）和单段、后缀、多段范围请求
+
+    Args:
+        request: 当前请求
+        path: 文件路径
+        media_type: MIME类型
+        etag: 强校验ETag，默认由文件大小和修改时间生成
+        cache_control: Cache-Control 响应头
+    """
+    stat = os.stat(path)
+    file_size = stat.st_size
+    etag = etag or f'"{file_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+
+    if is_not_modified(request.headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag or if_range == headers["Last-Modified"]):
+        try:
+            ranges = parse_range_header(range_header, file_size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{file_size}"
+            return Response(status_code=416, headers=headers)
+
+    if ranges is None:
+        if file_size == 0:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        return FileRangeResponse(path, [(0, file_size - 1)], file_size, 200, headers, media_type)
+    return FileRangeResponse(path, ranges, file_size, 206, headers, media_type)
+
+
+class GrowingFileResponse(Response):
+    """
+    跟随仍在写入的文件发送内容，读到已写入的末尾时等待新数据
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, file: BinaryIO, growing: GrowingFile, start: int, end: int | None, status_code: int, headers: dict):
+        self.file = file
+        self.growing = growing
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            fd = self.file.fileno()
+            offset = self.start
+            while self.end is None or offset <= self.end:
+                await self.growing.wait(offset)
+                if self.growing.error is not None:
+                    raise RuntimeError(f"源文件下载失败: {self.growing.error}")
+                available = self.growing.written if self.end is None else min(self.growing.written, self.end + 1)
+                if offset >= available:
+                    break
+                while offset < available:
+                    chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, available - offset), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+
+
+def serve_growing_file(request: Request, path: Path, growing: GrowingFile, media_type: str) -> Response:
+    """
+    提供仍在写入中的文件
+
+    总大小已知时支持单段范围请求，未知时忽略 Range 并以分块编码发送完整内容。
+    """
+    headers = {"Content-Type": media_type, "Cache-Control": "no-cache"}
+    total = growing.total
+    start, end, status_code = 0, None, 200
+    if total is not None:
+        headers["Accept-Ranges"] = "bytes"
+        end = total - 1
+        range_header = request.headers.get("range")
+        if range_header:
+            try:
+                ranges = parse_range_header(range_header, total)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{total}"
+                return Response(status_code=416, headers=headers)
+            # 多段范围在文件写完前不支持，按完整文件返回
+            if ranges is not None and len(ranges) == 1:
+                start, end = ranges[0]
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        headers["Content-Length"] = str(end - start + 1)
+    # 在路由里同步打开，避免下载完成后临时文件被重命名导致打开失败
+    file = open(path, "rb", buffering=0)
+    return GrowingFileResponse(file, growing, start, end, status_code, headers)
@@ -0,0 +1,76 @@
+"""
+增量 JSON 差分
+
+在 JSON Patch (RFC 6902) 的 add/replace 之外增加 append 操作，用于表示字符串
+在末尾追加的文本，适合流式解析出的、只会不断变长的 JSON 对象。
+"""
+import copy
+from typing import Any
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def json_delta(prev: Any, curr: Any, path: str = "") -> list[dict]:
+    """
+    计算从 prev 到 curr 的增量操作列表
+
+    - 字符串在原内容后追加: {"op": "append", "path": ..., "value": 追加的文本}
+    - 新增字段或列表末尾新增元素: {"op": "add", "path": ..., "value": ...}
+    - 其他变化: {"op": "replace", "path": ..., "value": ...}
+    """
+    # 先做一次整体比较，未变化的子树不再递归
+    if type(prev) is type(curr) and prev == curr:
+        return []
+    if isinstance(prev, dict) and isinstance(curr, dict):
+        if any(key not in curr for key in prev):
+            return [{"op": "replace", "path": path, "value": curr}]
+        ops = []
+        for key, value in curr.items():
+            child = f"{path}/{_escape(key)}"
+            if key in prev:
+                ops += json_delta(prev[key], value, child)
+            else:
+                ops.append({"op": "add", "path": child, "value": value})
+        return ops
+    if isinstance(prev, list) and isinstance(curr, list):
+        if len(curr) < len(prev):
+            return [{"op": "replace", "path": path, "value": curr}]
+        ops = []
+        for index, value in enumerate(prev):
+            ops += json_delta(value, curr[index], f"{path}/{index}")
+        for value in curr[len(prev):]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        return ops
+    if isinstance(prev, str) and isinstance(curr, str) and curr.startswith(prev):
+        return [{"op": "append", "path": path, "value": curr[len(prev):]}]
+    return [{"op": "replace", "path": path, "value": curr}]
+
+
+def apply_json_delta(document: Any, ops: list[dict]) -> Any:
+    """把 json_delta 生成的操作应用到 document 上，返回新的对象"""
+    document = copy.deepcopy(document)
+    for op in ops:
+        tokens = [_unescape(token) for token in op["path"].split("/")[1:]]
+        if not tokens:
+            document = copy.deepcopy(op["value"])
+            continue
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            if last == "-":
+                parent.append(copy.deepcopy(op["value"]))
+                continue
+            last = int(last)
+        if op["op"] == "append":
+            parent[last] += op["value"]
+        else:
+            parent[last] = copy.deepcopy(op["value"])
+    return document
@@ -0,0 +1,151 @@
+"""
+中文文档分块
+
+按段落和句子切分，尽量不在句子中间断开：句子以。！？；…等结尾（连同其后的右引号、右括号），
+超长句子再按，、：切分，最后才按字数硬切。“第X章/第X条”、“一、”“（一）”等标题处在
+当前分块已过半时另起一块，避免一个分块横跨两个章节。相邻分块之间重叠若干完整句子。
+篇幅较短、层级清楚的制度文本可用 split_sections 按标题整节切分。
+"""
+import hashlib
+import re
+
+from src.conf.env import settings
+from src.model.knowledge import DocumentChunk
+
+_SENTENCE = re.compile(r"[^。！？!?；;…]+(?:[。！？!?；;…]+[”’」』）)》]*)?|[。！？!?；;…]+[”’」』）)》]*")
+_CLAUSE = re.compile(r"[^，,、：:]+[，,、：:]*|[，,、：:]+")
+_HEADING = re.compile(r"^(第[一二三四五六七八九十百千零〇\d]+[编章节条]|[一二三四五六七八九十]+、|（[一二三四五六七八九十]+）|#+\s)")
+# split_sections 使用的各级标题，由高到低
+_SECTION_LEVELS = (
+    re.compile(r"^第[一二三四五六七八九十百千零〇\d]+[编章]"),
+    re.compile(r"^([一二三四五六七八九十]+、|第[一二三四五六七八九十百千零〇\d]+节)"),
+    re.compile(r"^(（[一二三四五六七八九十]+）|第[一二三四五六七八九十百千零〇\d]+条)"),
+)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _pieces(pattern: re.Pattern, text: str, limit: int) -> list[str]:
+    """按 pattern 切分，再把相邻的小片段合并到不超过 limit"""
+    pieces = []
+    for piece in pattern.findall(text):
+        if pieces and len(pieces[-1]) + len(piece) <= limit:
+            pieces[-1] += piece
+        else:
+            pieces.append(piece)
+    return pieces
+
+
+def _units(paragraph: str, chunk_size: int) -> list[str]:
+    """把段落切成不超过 chunk_size 的句子或子句"""
+    units = []
+    for sentence in _SENTENCE.findall(paragraph):
+        if len(sentence) <= chunk_size:
+            units.append(sentence)
+            continue
+        for clause in _pieces(_CLAUSE, sentence, chunk_size):
+            units += [clause[i:i + chunk_size] for i in range(0, len(clause), chunk_size)]
+    return units
+
+
+def split_text(
+    text: str,
+    chunk_size: int = settings.KNOWLEDGE_CHUNK_SIZE,
+    overlap: int = settings.KNOWLEDGE_CHUNK_OVERLAP,
+) -> list[str]:
+    """
+    把文本切成不超过 chunk_size 字的分块
+
+    Args:
+        text: 文档全文
+        chunk_size: 分块最大字数
+        overlap: 相邻分块重叠的最大字数，按完整句子计算
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+
+    def emit():
+        content = "".join(current).strip()
+        if content:
+            chunks.append(content)
+
+    for paragraph in text.splitlines():
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        is_heading = bool(_HEADING.match(paragraph))
+        for index, unit in enumerate(_units(paragraph, chunk_size)):
+            if index == 0 and current:
+                unit = "\n" + unit
+            if index == 0 and is_heading and size >= chunk_size // 2:
+                # 章节标题处另起一块，不带重叠
+                emit()
+                current, size = [], 0
+                unit = unit.lstrip("\n")
+            elif current and size + len(unit) > chunk_size:
+                emit()
+                tail: list[str] = []
+                tail_size = 0
+                for previous in reversed(current):
+                    if tail_size + len(previous) > overlap:
+                        break
+                    tail.insert(0, previous)
+                    tail_size += len(previous)
+                if tail_size + len(unit) > chunk_size:
+                    tail, tail_size = [], 0
+                current, size = tail, tail_size
+            current.append(unit)
+            size += len(unit)
+    emit()
+    return chunks
+
+
+def chunk_document(
+    doc_id: str,
+    title: str,
+    text: str,
+    chunk_size: int = settings.KNOWLEDGE_CHUNK_SIZE,
+    overlap: int = settings.KNOWLEDGE_CHUNK_OVERLAP,
+) -> list[DocumentChunk]:
+    """切分文档，同一文档中内容完全相同的分块只保留第一个"""
+    chunks = []
+    seen = set()
+    for content in split_text(text, chunk_size, overlap):
+        digest = content_hash(content)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        chunks.append(DocumentChunk(doc_id=doc_id, title=title, position=len(chunks), content=content, content_hash=digest))
+    return chunks
+
+
+def split_sections(text: str) -> list[str]:
+    """
+    按章节标题把结构化的制度文本切成小节，不限制长度
+
+    每个小节以其所属的各级标题开头，单独检索时也能看出上下文；只有标题没有正文的层级并入下一级小节。
+    """
+    sections: list[str] = []
+    path: list[tuple[int, str]] = []
+    body: list[str] = []
+
+    def emit():
+        if body:
+            sections.append("\n".join([heading for _, heading in path] + body))
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        level = next((index for index, pattern in enumerate(_SECTION_LEVELS) if pattern.match(line)), None)
+        if level is None:
+            body.append(line)
+            continue
+        emit()
+        path = [(depth, heading) for depth, heading in path if depth < level] + [(level, line)]
+        body = []
+    emit()
+    return sections
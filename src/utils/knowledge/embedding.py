@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+import numpy as np
+import openai
+from openai import AsyncOpenAI
+
+from src.agent.llm_pool import llm_registry
+from src.agent.resilience import is_transient, retrying
+from src.conf.env import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """向量化不经过准入控制，限流时同样退避重试"""
+    return is_transient(error) or isinstance(error, openai.RateLimitError)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化，之后内积即余弦相似度"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class Embedder:
+    """
+    文本向量化
+
+    按 batch_size 分批，最多 concurrency 个批次同时请求，限流、连接错误和服务端错误时
+    退避重试。返回归一化后的 float32 矩阵，行顺序与输入一致。
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI | None = None,
+        model: str = settings.EMBEDDING_MODEL,
+        dimensions: int = settings.EMBEDDING_DIMENSIONS,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        concurrency: int = settings.EMBEDDING_CONCURRENCY,
+        retries: int = settings.EMBEDDING_RETRIES,
+    ):
+        """
+        Args:
+            client: OpenAI 兼容客户端，默认使用共享连接池访问方舟
+            model: 向量化模型
+            dimensions: 向量维度
+            batch_size: 每次请求的文本条数
+            concurrency: 同时进行的请求数
+            retries: 失败后的重试次数
+        """
+        self.client = client or llm_registry.get_openai_client()
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.requests = 0
+        self.texts = 0
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch, semaphore) for batch in batches))
+        return np.vstack(results)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+    async def _embed_batch(self, batch: list[str], semaphore: asyncio.Semaphore) -> np.ndarray:
+        async with semaphore:
+            async for attempt in retrying(self.retries, retry_if=is_retryable):
+                with attempt:
+                    response = await self.client.embeddings.create(model=self.model, input=batch, encoding_format="float")
+        self.requests += 1
+        self.texts += len(batch)
+        data = sorted(response.data, key=lambda item: item.index)
+        vectors = np.asarray([item.embedding for item in data], dtype=np.float32)
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"向量维度为{vectors.shape[1]}，与配置的EMBEDDING_DIMENSIONS={self.dimensions}不一致")
+        return normalize(vectors)
@@ -0,0 +1,151 @@
+"""
+混合检索：字符 n-gram BM25 + 向量相似度
+
+中文不分词，按单字和双字 n-gram 计算 BM25，对短的制度小节足够准确且没有额外依赖。
+两路结果按倒数排名融合（RRF）。向量一路是可选的：小节向量在后台计算，查询向量有超时，
+任何一步不可用时只使用 BM25，不阻塞请求。
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from src.model.knowledge import DocumentChunk, SearchResult
+from src.utils.knowledge.embedding import Embedder
+from src.utils.result_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def char_ngrams(text: str, sizes: tuple[int, ...] = (1, 2)) -> list[str]:
+    text = _NON_WORD.sub("", normalize_text(text))
+    grams = []
+    for size in sizes:
+        grams += [text[i:i + size] for i in range(len(text) - size + 1)]
+    return grams
+
+
+class CharNgramBM25:
+    def __init__(self, documents: list[str], sizes: tuple[int, ...] = (1, 2), k1: float = 1.5, b: float = 0.75):
+        self.sizes = sizes
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        # 倒排表: n-gram -> [(文档下标, 词频)]
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for index, document in enumerate(documents):
+            grams = Counter(char_ngrams(document, sizes))
+            lengths.append(sum(grams.values()))
+            for gram, count in grams.items():
+                self.postings.setdefault(gram, []).append((index, count))
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if documents else 0.0
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for gram, query_count in Counter(char_ngrams(query, self.sizes)).items():
+            postings = self.postings.get(gram)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / self.average_length)
+                scores[index] += query_count * idf * count * (self.k1 + 1) / (count + norm)
+        return scores
+
+
+class HybridRetriever:
+    def __init__(
+        self,
+        chunks: list[DocumentChunk],
+        embedder: Embedder | None = None,
+        embed_timeout: float = 0.5,
+        rrf_k: int = 60,
+        retry_interval: float = 60.0,
+        query_cache_size: int = 256,
+    ):
+        """
+        Args:
+            chunks: 待检索的分块
+            embedder: 向量化客户端，为None时只使用 BM25
+            embed_timeout: 查询向量化的超时时间（秒），超时只使用 BM25
+            rrf_k: 倒数排名融合的平滑常数
+            retry_interval: 分块向量化失败后再次尝试的间隔（秒）
+            query_cache_size: 缓存的查询向量条数
+        """
+        self.chunks = chunks
+        self.embedder = embedder
+        self.embed_timeout = embed_timeout
+        self.rrf_k = rrf_k
+        self.retry_interval = retry_interval
+        self.query_cache_size = query_cache_size
+        self.bm25 = CharNgramBM25([chunk.content for chunk in chunks])
+        self._embeddings: np.ndarray | None = None
+        self._embedding_task: asyncio.Task | None = None
+        self._retry_at = 0.0
+        self._queries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.vector_searches = 0
+        self.bm25_only_searches = 0
+
+    async def search(self, query: str, k: int) -> list[SearchResult]:
+        """按融合分数返回前 k 个分块"""
+        fused = np.zeros(len(self.chunks), dtype=np.float32)
+        bm25 = self.bm25.scores(query)
+        self._fuse(fused, bm25, mask=bm25 > 0)
+
+        vector = await self._vector_scores(query)
+        if vector is not None:
+            self._fuse(fused, vector, mask=np.ones(len(vector), dtype=bool))
+            self.vector_searches += 1
+        else:
+            self.bm25_only_searches += 1
+
+        order = np.argsort(-fused, kind="stable")[:k]
+        return [SearchResult(chunk=self.chunks[index], score=float(fused[index])) for index in order]
+
+    def _fuse(self, fused: np.ndarray, scores: np.ndarray, mask: np.ndarray):
+        order = np.argsort(-scores, kind="stable")
+        for rank, index in enumerate(order):
+            if mask[index]:
+                fused[index] += 1 / (self.rrf_k + rank + 1)
+
+    async def _vector_scores(self, query: str) -> np.ndarray | None:
+        if self.embedder is None or not self._ensure_embeddings():
+            return None
+        key = normalize_text(query)
+        embedding = self._queries.get(key)
+        if embedding is None:
+            try:
+                embedding = await asyncio.wait_for(self.embedder.embed_query(query), self.embed_timeout)
+            except Exception as e:
+                logger.warning(f"查询向量化失败，只使用BM25: {type(e).__name__} {str(e)}")
+                return None
+            self._queries[key] = embedding
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        self._queries.move_to_end(key)
+        return self._embeddings @ embedding
+
+    def _ensure_embeddings(self) -> bool:
+        """分块向量已就绪时返回True，否则在后台开始计算"""
+        if self._embeddings is not None:
+            return True
+        if self._embedding_task is None and time.monotonic() >= self._retry_at:
+            self._embedding_task = asyncio.create_task(self._embed_chunks())
+        return False
+
+    async def _embed_chunks(self):
+        try:
+            self._embeddings = await self.embedder.embed([chunk.content for chunk in self.chunks])
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.retry_interval
+            logger.warning(f"分块向量化失败，{self.retry_interval:.0f}秒后重试: {str(e)}")
+        finally:
+            self._embedding_task = None
@@ -0,0 +1,159 @@
+"""
+政策文件知识库
+
+把党章、团章、党代会报告等文档分块、向量化后写入向量存储。以 (文档, 分块内容哈希)
+为主键增量更新：重新导入时只对新增或修改的分块计算向量，删除文档中已不存在的分块。
+用法: python -m src.utils.knowledge.knowledge_base <目录或文件...> [--query 问题]
+目录中的 .txt/.md 文件以相对路径为文档id，第一行非空文本为标题。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.agent.llm_pool import llm_registry
+from src.conf.env import settings
+from src.model.knowledge import DocumentChunk, SearchResult
+from src.utils.knowledge.chunking import chunk_document
+from src.utils.knowledge.embedding import Embedder
+from src.utils.knowledge.vector_store import NumpyVectorStore, PgVectorStore, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# 每攒够这么多待向量化的分块就写入一次，控制内存占用
+UPSERT_BATCH = 2048
+
+
+@dataclass
+class IngestStats:
+    documents: int = 0
+    added: int = 0
+    kept: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+    # 向量化请求数
+    requests: int = 0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.added / self.seconds if self.seconds else 0.0
+
+
+class KnowledgeBase:
+    def __init__(
+        self,
+        store: VectorStore,
+        embedder: Embedder,
+        chunk_size: int = settings.KNOWLEDGE_CHUNK_SIZE,
+        overlap: int = settings.KNOWLEDGE_CHUNK_OVERLAP,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    @staticmethod
+    def embedding_text(chunk: DocumentChunk) -> str:
+        # 带上文档标题，短分块也能检索到所属文件
+        return f"{chunk.title}\n{chunk.content}"
+
+    async def ingest(self, documents: list[tuple[str, str, str]]) -> IngestStats:
+        """
+        增量导入文档
+
+        Args:
+            documents: (文档id, 标题, 全文) 列表
+        """
+        start = time.perf_counter()
+        requests = self.embedder.requests
+        stats = IngestStats(documents=len(documents))
+        pending: list[DocumentChunk] = []
+        for doc_id, title, text in documents:
+            chunks = chunk_document(doc_id, title, text, self.chunk_size, self.overlap)
+            existing = await self.store.hashes(doc_id)
+            current = {chunk.content_hash for chunk in chunks}
+            removed = existing - current
+            if removed:
+                await self.store.delete(doc_id, removed)
+            kept = [chunk for chunk in chunks if chunk.content_hash in existing]
+            if kept:
+                await self.store.update(kept)
+            pending += [chunk for chunk in chunks if chunk.content_hash not in existing]
+            stats.kept += len(kept)
+            stats.removed += len(removed)
+            if len(pending) >= UPSERT_BATCH:
+                stats.added += await self._flush(pending)
+                pending = []
+        stats.added += await self._flush(pending)
+        stats.seconds = time.perf_counter() - start
+        stats.requests = self.embedder.requests - requests
+        logger.info(
+            f"知识库导入 {stats.documents} 个文档: 新增 {stats.added} 块, 未变 {stats.kept} 块, "
+            f"删除 {stats.removed} 块, 用时 {stats.seconds:.1f} 秒"
+        )
+        return stats
+
+    async def _flush(self, chunks: list[DocumentChunk]) -> int:
+        if not chunks:
+            return 0
+        embeddings = await self.embedder.embed([self.embedding_text(chunk) for chunk in chunks])
+        await self.store.upsert(chunks, embeddings)
+        return len(chunks)
+
+    async def search(self, query: str, k: int = 5) -> list[SearchResult]:
+        embedding = await self.embedder.embed_query(query)
+        return await self.store.search(embedding, k)
+
+
+def read_documents(paths: list[Path]) -> list[tuple[str, str, str]]:
+    documents = []
+    for path in paths:
+        files = sorted(p for p in path.rglob("*") if p.suffix in (".txt", ".md")) if path.is_dir() else [path]
+        for file in files:
+            text = file.read_text(encoding="utf-8")
+            title = next((line.strip().lstrip("#").strip() for line in text.splitlines() if line.strip()), file.stem)
+            doc_id = file.relative_to(path).as_posix() if path.is_dir() else file.name
+            documents.append((doc_id, title, text))
+    return documents
+
+
+async def create_vector_store() -> VectorStore:
+    """配置了 DATABASE_URL 时使用 pgvector，否则使用进程内存储"""
+    if settings.DATABASE_URL:
+        store = PgVectorStore(settings.DATABASE_URL)
+        await store.start()
+        await store.create_index()
+        return store
+    logger.warning("未配置DATABASE_URL，使用进程内向量存储")
+    return NumpyVectorStore()
+
+
+async def run(paths: list[Path], queries: list[str]):
+    store = await create_vector_store()
+    try:
+        knowledge_base = KnowledgeBase(store, Embedder())
+        stats = await knowledge_base.ingest(read_documents(paths))
+        print(f"新增 {stats.added}, 未变 {stats.kept}, 删除 {stats.removed}, "
+              f"{stats.chunks_per_second:.1f} 块/秒, {stats.requests} 次向量化请求")
+        for query in queries:
+            print(f"\n> {query}")
+            for result in await knowledge_base.search(query):
+                print(f"{result.score:.3f} [{result.chunk.doc_id}#{result.chunk.position}] {result.chunk.content[:60]}")
+    finally:
+        if isinstance(store, PgVectorStore):
+            await store.close()
+        await llm_registry.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", type=Path, nargs="+")
+    parser.add_argument("--query", action="append", default=[])
+    args = parser.parse_args()
+    asyncio.run(run(args.paths, args.query))
+
+
+if __name__ == "__main__":
+    main()
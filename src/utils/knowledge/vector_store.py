@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from src.conf.env import settings
+from src.model.knowledge import DocumentChunk, SearchResult
+
+logger = logging.getLogger(__name__)
+
+# pgvector 的 vector 类型最多支持 2000 维建 HNSW 索引，更高维度使用 halfvec（最多 4000 维）
+MAX_VECTOR_INDEX_DIMENSIONS = 2000
+
+
+class VectorStore(Protocol):
+    """知识库分块的向量存储，分块以 (doc_id, content_hash) 为主键"""
+
+    async def hashes(self, doc_id: str) -> set[str]:
+        """文档已入库分块的 content_hash"""
+        ...
+
+    async def upsert(self, chunks: list[DocumentChunk], embeddings: np.ndarray) -> None:
+        """写入分块和对应的归一化向量"""
+        ...
+
+    async def update(self, chunks: list[DocumentChunk]) -> None:
+        """只更新已入库分块的标题和序号"""
+        ...
+
+    async def delete(self, doc_id: str, hashes: set[str]) -> None:
+        ...
+
+    async def search(self, embedding: np.ndarray, k: int) -> list[SearchResult]:
+        """按余弦相似度返回最相近的 k 个分块"""
+        ...
+
+    async def count(self) -> int:
+        ...
+
+
+class NumpyVectorStore:
+    """
+    进程内暴力检索的向量存储，用于本地开发和测试，不依赖 PostgreSQL
+
+    向量按行存放在预分配的矩阵中，容量不足时翻倍；删除时用最后一行填补空位。
+    """
+
+    # 超过该条数时在线程池中计算，避免阻塞事件循环
+    THREAD_THRESHOLD = 50_000
+
+    def __init__(self, dimensions: int = settings.EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self._vectors = np.empty((1024, dimensions), dtype=np.float32)
+        self._chunks: list[DocumentChunk] = []
+        self._rows: dict[tuple[str, str], int] = {}
+        self._docs: dict[str, set[str]] = {}
+
+    async def hashes(self, doc_id: str) -> set[str]:
+        return set(self._docs.get(doc_id, ()))
+
+    async def upsert(self, chunks: list[DocumentChunk], embeddings: np.ndarray) -> None:
+        needed = len(self._chunks) + len(chunks)
+        if needed > len(self._vectors):
+            capacity = len(self._vectors)
+            while capacity < needed:
+                capacity *= 2
+            vectors = np.empty((capacity, self.dimensions), dtype=np.float32)
+            vectors[:len(self._chunks)] = self._vectors[:len(self._chunks)]
+            self._vectors = vectors
+        for chunk, embedding in zip(chunks, embeddings):
+            key = (chunk.doc_id, chunk.content_hash)
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._chunks)
+                self._chunks.append(chunk)
+                self._rows[key] = row
+                self._docs.setdefault(chunk.doc_id, set()).add(chunk.content_hash)
+            else:
+                self._chunks[row] = chunk
+            self._vectors[row] = embedding
+
+    async def update(self, chunks: list[DocumentChunk]) -> None:
+        for chunk in chunks:
+            row = self._rows.get((chunk.doc_id, chunk.content_hash))
+            if row is not None:
+                self._chunks[row] = chunk
+
+    async def delete(self, doc_id: str, hashes: set[str]) -> None:
+        for digest in hashes:
+            row = self._rows.pop((doc_id, digest), None)
+            if row is None:
+                continue
+            last = len(self._chunks) - 1
+            if row != last:
+                moved = self._chunks[last]
+                self._chunks[row] = moved
+                self._vectors[row] = self._vectors[last]
+                self._rows[(moved.doc_id, moved.content_hash)] = row
+            self._chunks.pop()
+            self._docs[doc_id].discard(digest)
+        if not self._docs.get(doc_id, True):
+            del self._docs[doc_id]
+
+    async def search(self, embedding: np.ndarray, k: int) -> list[SearchResult]:
+        count = len(self._chunks)
+        if count == 0 or k <= 0:
+            return []
+        if count >= self.THREAD_THRESHOLD:
+            rows, scores = await asyncio.to_thread(self._top_k, embedding, k)
+        else:
+            rows, scores = self._top_k(embedding, k)
+        return [SearchResult(chunk=self._chunks[row], score=float(score)) for row, score in zip(rows, scores)]
+
+    def _top_k(self, embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = self._vectors[:len(self._chunks)] @ embedding.astype(np.float32, copy=False)
+        k = min(k, len(scores))
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    async def count(self) -> int:
+        return len(self._chunks)
+
+    def save(self, path: Path):
+        """保存为 path.npy（向量）和 path.json（分块）"""
+        path = Path(path)
+        np.save(path.with_suffix(".npy"), self._vectors[:len(self._chunks)])
+        path.with_suffix(".json").write_text(
+            json.dumps([chunk.model_dump() for chunk in self._chunks], ensure_ascii=False), encoding="utf-8"
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "NumpyVectorStore":
+        path = Path(path)
+        vectors = np.load(path.with_suffix(".npy"))
+        chunks = [DocumentChunk.model_validate(item) for item in json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))]
+        store = cls(vectors.shape[1])
+        store._vectors = np.empty((max(len(chunks), 1024), vectors.shape[1]), dtype=np.float32)
+        for chunk, vector in zip(chunks, vectors):
+            store._rows[(chunk.doc_id, chunk.content_hash)] = len(store._chunks)
+            store._vectors[len(store._chunks)] = vector
+            store._chunks.append(chunk)
+            store._docs.setdefault(chunk.doc_id, set()).add(chunk.content_hash)
+        return store
+
+
+class PgVectorStore:
+    """
+    PostgreSQL + pgvector 向量存储
+
+    余弦距离的 HNSW 索引，查询时按 ef_search 设置候选列表大小。大批量首次导入时
+    先写入数据再调用 create_index 建索引更快；之后的增量写入由索引自动维护。
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        dimensions: int = settings.EMBEDDING_DIMENSIONS,
+        table: str = "policy_chunks",
+        m: int = settings.KNOWLEDGE_HNSW_M,
+        ef_construction: int = settings.KNOWLEDGE_HNSW_EF_CONSTRUCTION,
+        ef_search: int = settings.KNOWLEDGE_HNSW_EF_SEARCH,
+    ):
+        """
+        Args:
+            dsn: PostgreSQL 连接地址
+            dimensions: 向量维度
+            table: 表名
+            m: HNSW 每个节点的连接数
+            ef_construction: 建索引时的候选列表大小
+            ef_search: 查询时的候选列表大小
+        """
+        self.dsn = dsn
+        self.dimensions = dimensions
+        self.table = table
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.half = dimensions > MAX_VECTOR_INDEX_DIMENSIONS
+        self.vector_type = "halfvec" if self.half else "vector"
+        self._pool = None
+
+    async def start(self):
+        import asyncpg
+        from pgvector.asyncpg import register_vector
+
+        async def init(conn):
+            await register_vector(conn)
+
+        # 先建扩展，之后的连接才能注册 vector 类型
+        conn = await asyncpg.connect(self.dsn)
+        try:
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        finally:
+            await conn.close()
+        self._pool = await asyncpg.create_pool(self.dsn, init=init)
+        await self._pool.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                doc_id text NOT NULL,
+                content_hash text NOT NULL,
+                title text NOT NULL,
+                position integer NOT NULL,
+                content text NOT NULL,
+                embedding {self.vector_type}({self.dimensions}) NOT NULL,
+                updated_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (doc_id, content_hash)
+            )
+        """)
+
+    async def create_index(self):
+        """建立 HNSW 索引，已存在时跳过"""
+        await self._pool.execute(f"""
+            CREATE INDEX IF NOT EXISTS {self.table}_embedding_hnsw ON {self.table}
+            USING hnsw (embedding {self.vector_type}_cosine_ops)
+            WITH (m = {int(self.m)}, ef_construction = {int(self.ef_construction)})
+        """)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def _vector(self, embedding: np.ndarray):
+        if self.half:
+            from pgvector import HalfVector
+            return HalfVector(embedding)
+        return embedding
+
+    async def hashes(self, doc_id: str) -> set[str]:
+        rows = await self._pool.fetch(f"SELECT content_hash FROM {self.table} WHERE doc_id = $1", doc_id)
+        return {row["content_hash"] for row in rows}
+
+    async def upsert(self, chunks: list[DocumentChunk], embeddings: np.ndarray) -> None:
+        await self._pool.executemany(
+            f"""
+            INSERT INTO {self.table} (doc_id, content_hash, title, position, content, embedding)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (doc_id, content_hash) DO UPDATE
+            SET title = EXCLUDED.title, position = EXCLUDED.position, embedding = EXCLUDED.embedding, updated_at = now()
+            """,
+            [
+                (chunk.doc_id, chunk.content_hash, chunk.title, chunk.position, chunk.content, self._vector(embedding))
+                for chunk, embedding in zip(chunks, embeddings)
+            ],
+        )
+
+    async def update(self, chunks: list[DocumentChunk]) -> None:
+        await self._pool.executemany(
+            f"UPDATE {self.table} SET title = $3, position = $4 WHERE doc_id = $1 AND content_hash = $2"
+            f" AND (title <> $3 OR position <> $4)",
+            [(chunk.doc_id, chunk.content_hash, chunk.title, chunk.position) for chunk in chunks],
+        )
+
+    async def delete(self, doc_id: str, hashes: set[str]) -> None:
+        await self._pool.execute(
+            f"DELETE FROM {self.table} WHERE doc_id = $1 AND content_hash = ANY($2::text[])", doc_id, list(hashes)
+        )
+
+    async def search(self, embedding: np.ndarray, k: int) -> list[SearchResult]:
+        async with self._pool.acquire() as conn, conn.transaction():
+            await conn.execute(f"SET LOCAL hnsw.ef_search = {int(max(self.ef_search, k))}")
+            rows = await conn.fetch(
+                f"""
+                SELECT doc_id, content_hash, title, position, content, 1 - (embedding <=> $1) AS score
+                FROM {self.table} ORDER BY embedding <=> $1 LIMIT $2
+                """,
+                self._vector(embedding),
+                k,
+            )
+        return [
+            SearchResult(
+                chunk=DocumentChunk(
+                    doc_id=row["doc_id"],
+                    title=row["title"],
+                    position=row["position"],
+                    content=row["content"],
+                    content_hash=row["content_hash"],
+                ),
+                score=row["score"],
+            )
+            for row in rows
+        ]
+
+    async def count(self) -> int:
+        return await self._pool.fetchval(f"SELECT count(*) FROM {self.table}")
@@ -0,0 +1,42 @@
+import asyncio
+import importlib
+import sys
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    按需导入的模块
+
+    智能体模块依赖 langchain、openai 等较重的包，导入需要一秒以上。服务启动时不导入，
+    第一次用到（或启动预热）时在线程中导入，不阻塞事件循环；同时到达的多个调用方共享同一次导入。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._module: ModuleType | None = None
+        self._loading: asyncio.Task | None = None
+
+    @property
+    def module(self) -> ModuleType | None:
+        """已经导入完成时返回模块，否则返回 None，不触发导入"""
+        if self._module is None:
+            module = sys.modules.get(self.name)
+            # 其他线程正在执行该模块时 __spec__._initializing 为 True，此时模块还不完整
+            if module is not None and not getattr(module.__spec__, "_initializing", False):
+                self._module = module
+        return self._module
+
+    async def load(self) -> ModuleType:
+        if self.module is not None:
+            return self._module
+        if self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(importlib.import_module, self.name))
+            self._loading.add_done_callback(self._loaded)
+        # 某个调用方断开不影响导入本身
+        return await asyncio.shield(self._loading)
+
+    def _loaded(self, task: asyncio.Task):
+        self._loading = None
+        if not task.cancelled() and task.exception() is None:
+            self._module = task.result()
@@ -0,0 +1,198 @@
+"""
+进程内指标，按 Prometheus 文本格式导出
+
+请求路径上只记录 Histogram，一次记录只是一次字典查找、一次二分查找和两次加法；
+各组件已经自己统计的计数（缓存命中、准入队列等）通过 collector 在抓取时读取，
+不在请求路径上产生额外开销。不依赖 prometheus_client。
+"""
+import bisect
+import math
+import time
+from collections.abc import Callable, Iterable
+
+from starlette.routing import Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# 请求耗时类指标的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+
+Sample = tuple[tuple[str, ...], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # 标签 -> [各分桶计数..., 总和]；分桶只记录落在该桶的次数，导出时再累加
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Collector:
+    """抓取时调用 collect 读取各组件已有的统计值"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], Iterable[Sample]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.collect():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[Histogram | Collector] = []
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: tuple[str, ...],
+        collect: Callable[[], Iterable[Sample]],
+    ) -> Collector:
+        """
+        Args:
+            kind: counter 或 gauge
+            collect: 返回 (标签值, 数值) 列表的函数
+        """
+        return self._register(Collector(name, documentation, kind, labelnames, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class MetricsMiddleware:
+    """按路由模板记录每个请求的耗时，流式响应计到最后一块发送完毕"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 用路由模板而不是实际路径做标签，避免路径参数造成标签爆炸
+            route = scope.get("route")
+            if isinstance(route, Mount) or (route is None and "endpoint" in scope):
+                # 挂载的子应用（静态文件）按挂载路径记录
+                path = scope.get("root_path") or "/"
+            elif route is None:
+                path = "unmatched"
+            else:
+                path = route.path
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], path, str(status))
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "接口从收到请求到响应发送完毕的耗时", ("method", "route", "status")
+)
+llm_time_to_first_token = registry.histogram(
+    "llm_time_to_first_token_seconds", "大模型流式响应的首个分块耗时", ("agent", "model")
+)
+llm_tokens_per_second = registry.histogram(
+    "llm_tokens_per_second", "大模型流式响应首个分块之后的输出速度", ("agent", "model"), RATE_BUCKETS
+)
+upstream_request_duration = registry.histogram(
+    "upstream_request_duration_seconds", "上游 HTTP 请求从发出到收到响应头的耗时", ("upstream", "operation")
+)
+audio_download_duration = registry.histogram(
+    "audio_download_duration_seconds", "上游音频完整下载的耗时"
+)
+sse_stream_duration = registry.histogram(
+    "sse_stream_duration_seconds", "SSE 流从开始到结束的耗时", ("stream",)
+)
+sse_stream_bytes = registry.histogram(
+    "sse_stream_bytes", "每个 SSE 流发送的字节数", ("stream",), SIZE_BUCKETS
+)
+music_job_wait = registry.histogram(
+    "music_job_wait_seconds", "音乐生成任务从提交到开始向上游提交的等待时间"
+)
@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from pathlib import Path
+
+import aiohttp
+from redis.asyncio import Redis
+
+from src.conf.env import settings
+from src.model.music import MusicGenerateParam, MusicJob
+from src.utils.admission import Priority, UpstreamOverloaded, song_limiter
+from src.utils.file_lock import try_claim
+from src.utils.metrics import music_job_wait
+from src.utils.ve_music.GenSongDemo import submit_song
+from src.utils.ve_music.SongPoller import QuerySongPoller, query_song_poller
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class MusicJobQueueFull(RuntimeError):
+    """排队任务数已达上限"""
+
+
+class MusicJobManager:
+    """
+    音乐生成任务管理器
+
+    提交后立即返回任务，由固定数量的 worker 在后台提交 GenSongForTime、
+    通过共享的 QuerySong 轮询器等待结果并缓存音频。任务状态以 JSON 文件
+    落盘，重启后未完成的任务（包括已拿到 TaskID 的）会重新入队继续处理。
+    上游繁忙（429 或被更高优先级的请求挤出队列）时按指数退避重新入队，超过重试次数才标记失败。
+
+    多个 worker 进程共享任务目录时，任务由接收它的进程处理，处理期间持有该任务的文件锁；
+    启动时只接手没有被其他进程持有的未完成任务（进程退出时锁自动释放）。配置了 Redis 时
+    任务状态同时写入 Redis 并发布更新，其他进程收到的查询和 SSE 订阅从 Redis 读取。
+    """
+
+    def __init__(
+        self,
+        cache_audio: Callable[[str], Awaitable[str]],
+        cache_captions: Callable[[str | None], Awaitable[str | None]],
+        job_dir: Path,
+        workers: int = settings.MUSIC_JOB_WORKERS,
+        queue_size: int = settings.MUSIC_JOB_QUEUE_SIZE,
+        poller: QuerySongPoller = query_song_poller,
+        retention: float = settings.MUSIC_JOB_RETENTION,
+        redis: Redis | None = None,
+        namespace: str = "music_job",
+        max_retries: int = 8,
+        retry_base_delay: float = 5.0,
+        retry_max_delay: float = 300.0,
+    ):
+        """
+        Args:
+            cache_audio: 下载并缓存音频的函数，返回本地文件名
+            cache_captions: 缓存歌词的函数，返回歌词地址
+            job_dir: 任务状态保存目录
+            workers: worker 数量
+            queue_size: 排队任务上限
+            poller: QuerySong 轮询器
+            retention: 已结束任务的保留时间（秒）
+            redis: Redis 客户端，为None时任务状态只在本进程可见
+            namespace: Redis 键和频道前缀
+            max_retries: 上游繁忙时的最多重试次数
+            retry_base_delay: 第一次重试的等待时间（秒），之后每次翻倍，不短于上游给出的 Retry-After
+            retry_max_delay: 重试等待时间上限（秒）
+        """
+        self.cache_audio = cache_audio
+        self.cache_captions = cache_captions
+        self.job_dir = job_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self.poller = poller
+        self.retention = retention
+        self.redis = redis
+        self.namespace = namespace
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._jobs: dict[str, MusicJob] = {}
+        # 本进程持有的任务锁
+        self._claims: dict[str, int] = {}
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        # 等待重试的任务: 已重试次数和重新入队的定时器
+        self._retries: dict[str, int] = {}
+        self._retry_timers: dict[str, asyncio.TimerHandle] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        """加载落盘的任务并启动 worker"""
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        self._session = aiohttp.ClientSession()
+        for job in await asyncio.to_thread(self._load_jobs):
+            if job.status not in FINISHED_STATUSES:
+                # 其他进程正在处理的任务不接手
+                job = await asyncio.to_thread(self._claim, job.job_id)
+                if job is None:
+                    continue
+                logger.info(f"恢复音乐生成任务: {job.job_id} (TaskID: {job.task_id})")
+                self._queue.put_nowait(job.job_id)
+            self._jobs[job.job_id] = job
+        self._prune()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止 worker，未完成的任务保留在磁盘上等待下次启动"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        for job_id in list(self._claims):
+            self._release(job_id)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def submit(self, param: MusicGenerateParam) -> MusicJob:
+        """提交任务并立即返回"""
+        if self._queue.qsize() >= self.queue_size:
+            raise MusicJobQueueFull("音乐生成任务排队已满，请稍后再试")
+        self._prune()
+        now = time.time()
+        job = MusicJob(job_id=uuid.uuid4().hex, param=param, created_at=now, updated_at=now)
+        self._claims[job.job_id] = await asyncio.to_thread(try_claim, self._lock_path(job.job_id))
+        self._jobs[job.job_id] = job
+        await self._save(job)
+        self._queue.put_nowait(job.job_id)
+        return job
+
+    async def get(self, job_id: str) -> MusicJob | None:
+        job = self._jobs.get(job_id)
+        if job is None and self.redis is not None:
+            # 其他进程接收的任务
+            try:
+                data = await self.redis.get(f"{self.namespace}:{job_id}")
+            except Exception as e:
+                logger.warning(f"读取Redis音乐生成任务失败: {str(e)}")
+                data = None
+            if data is not None:
+                job = MusicJob.model_validate_json(data)
+        return job
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[MusicJob]:
+        """依次产出任务的当前状态和后续每次更新，直到任务结束"""
+        if job_id not in self._jobs and self.redis is not None:
+            async for job in self._subscribe_remote(job_id):
+                yield job
+            return
+        queue: asyncio.Queue[MusicJob] = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            snapshot = self._jobs[job_id].model_copy()
+            yield snapshot
+            while snapshot.status not in FINISHED_STATUSES:
+                snapshot = await queue.get()
+                yield snapshot
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    async def _subscribe_remote(self, job_id: str) -> AsyncIterator[MusicJob]:
+        """其他进程处理中的任务，通过 Redis 发布订阅接收更新"""
+        key = f"{self.namespace}:{job_id}"
+        pubsub = self.redis.pubsub()
+        try:
+            # 先订阅再读取当前状态，两者之间的更新不会丢失
+            await pubsub.subscribe(key)
+            data = await self.redis.get(key)
+            if data is None:
+                return
+            snapshot = MusicJob.model_validate_json(data)
+            yield snapshot
+            messages = pubsub.listen()
+            while snapshot.status not in FINISHED_STATUSES:
+                message = await anext(messages)
+                if message["type"] != "message":
+                    continue
+                job = MusicJob.model_validate_json(message["data"])
+                # 订阅后、读取前发布的更新会重复收到
+                if job.updated_at > snapshot.updated_at:
+                    snapshot = job
+                    yield snapshot
+        finally:
+            await pubsub.aclose()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            retrying = False
+            try:
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except UpstreamOverloaded as e:
+                retrying = self._retry(job, e)
+                if not retrying:
+                    logger.error(f"音乐生成任务重试{self.max_retries}次后上游仍然繁忙: {job_id}")
+                    await self._fail(job, e)
+            except Exception as e:
+                logger.error(f"音乐生成任务失败: {job_id}: {str(e)}")
+                await self._fail(job, e)
+            finally:
+                self._queue.task_done()
+            if not retrying:
+                self._retries.pop(job_id, None)
+                self._release(job_id, finished=True)
+
+    async def _fail(self, job: MusicJob, error: Exception):
+        """标记任务失败；保存失败时只记录日志，不能让 worker 退出"""
+        try:
+            await self._update(job, status="failed", error=str(error))
+        except Exception as e:
+            logger.error(f"保存音乐生成任务失败状态出错: {job.job_id}: {str(e)}")
+
+    def _retry(self, job: MusicJob, error: UpstreamOverloaded) -> bool:
+        """上游繁忙时延迟后重新入队，期间继续持有任务锁；超过重试次数时返回False"""
+        attempt = self._retries.get(job.job_id, 0) + 1
+        if attempt > self.max_retries:
+            return False
+        self._retries[job.job_id] = attempt
+        delay = min(self.retry_max_delay, max(error.retry_after, self.retry_base_delay * 2 ** (attempt - 1)))
+        logger.warning(f"上游繁忙，音乐生成任务 {job.job_id} 在{delay:.0f}秒后第{attempt}次重试")
+        self._retry_timers[job.job_id] = asyncio.get_running_loop().call_later(delay, self._requeue, job.job_id)
+        return True
+
+    def _requeue(self, job_id: str):
+        self._retry_timers.pop(job_id, None)
+        self._queue.put_nowait(job_id)
+
+    async def _run(self, job: MusicJob):
+        # 后台任务排在同步接口之后，不设排队期限；名额持有到生成完成
+        async with await song_limiter.acquire(Priority.BACKGROUND, timeout=math.inf):
+            if job.task_id is None:
+                # 上游繁忙重新入队的任务不重复记录
+                if job.job_id not in self._retries:
+                    music_job_wait.observe(time.time() - job.created_at)
+                param = job.param
+                task_id, predicted_wait_time = await submit_song(
+                    self._session, param.prompt, param.gender, param.genre, param.mood
+                )
+                await self._update(job, status="submitted", task_id=task_id, predicted_wait_time=predicted_wait_time)
+
+            async def on_progress(progress: int):
+                await self._update(job, status="running", progress=progress)
+
+            song_detail = await self.poller.wait(job.task_id, job.predicted_wait_time, on_progress=on_progress)
+        filename, captions_url = await asyncio.gather(
+            self.cache_audio(song_detail.get('AudioUrl')), self.cache_captions(song_detail.get('Captions'))
+        )
+        await self._update(
+            job,
+            status="succeeded",
+            progress=100,
+            music_url=f"/music/cache/{filename}",
+            captions_url=captions_url,
+        )
+
+    async def _update(self, job: MusicJob, **fields):
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = time.time()
+        await self._save(job)
+        for queue in self._subscribers.get(job.job_id, ()):
+            queue.put_nowait(job.model_copy())
+
+    def _lock_path(self, job_id: str) -> Path:
+        return self.job_dir / f"{job_id}.lock"
+
+    def _claim(self, job_id: str) -> MusicJob | None:
+        """取得任务锁后重新读取任务，期间已被其他进程完成的不再处理"""
+        fd = try_claim(self._lock_path(job_id))
+        if fd is None:
+            return None
+        try:
+            job = MusicJob.model_validate_json((self.job_dir / f"{job_id}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            job = None
+        if job is None or job.status in FINISHED_STATUSES:
+            os.close(fd)
+            return None
+        self._claims[job_id] = fd
+        return job
+
+    def _release(self, job_id: str, finished: bool = False):
+        fd = self._claims.pop(job_id, None)
+        if fd is not None:
+            if finished:
+                # 已结束的任务不会再被接手，持有锁时删除锁文件
+                self._lock_path(job_id).unlink(missing_ok=True)
+            os.close(fd)
+
+    def _prune(self):
+        """清理超过保留时间的已结束任务"""
+        deadline = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATUSES and job.updated_at < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            (self.job_dir / f"{job_id}.json").unlink(missing_ok=True)
+
+    async def _save(self, job: MusicJob):
+        job = job.model_copy()
+        await asyncio.to_thread(self._write_job, job)
+        if self.redis is not None:
+            key = f"{self.namespace}:{job.job_id}"
+            data = job.model_dump_json()
+            try:
+                await self.redis.set(key, data, ex=int(self.retention))
+                await self.redis.publish(key, data)
+            except Exception as e:
+                logger.warning(f"写入Redis音乐生成任务失败: {str(e)}")
+
+    def _write_job(self, job: MusicJob):
+        # 先写临时文件再原子替换，避免进程中断留下半个文件
+        path = self.job_dir / f"{job.job_id}.json"
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(job.model_dump_json(), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _load_jobs(self) -> list[MusicJob]:
+        jobs = []
+        for path in self.job_dir.glob("*.json"):
+            try:
+                jobs.append(MusicJob.model_validate_json(path.read_text(encoding="utf-8")))
+            except ValueError as e:
+                logger.warning(f"忽略损坏的任务文件 {path}: {str(e)}")
+        return jobs
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from src.conf.env import settings
+from src.model.music import MusicGenerateParam
+from src.utils.result_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class MusicPromptPool:
+    """
+    预生成的音乐 prompt 池
+
+    /music/prompt_generate 的结果与请求无关，提前在后台生成一批校验过的
+    MusicGenerateParam，请求时直接取出。剩余数量低于 low_water 时在后台补充到 size，
+    池内和最近取出的 prompt 按归一化文本去重。池的内容落盘，重启后继续使用。
+    池为空时（首次启动或补充跟不上）退回直接生成。
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[], Awaitable[MusicGenerateParam]],
+        path: Path,
+        size: int = settings.MUSIC_PROMPT_POOL_SIZE,
+        low_water: int = settings.MUSIC_PROMPT_POOL_LOW_WATER,
+        concurrency: int = settings.MUSIC_PROMPT_POOL_CONCURRENCY,
+        recent_size: int = 200,
+    ):
+        """
+        Args:
+            generate: 生成一个 prompt 的函数
+            path: 落盘文件路径
+            size: 补充到的目标数量
+            low_water: 剩余数量低于该值时开始补充
+            concurrency: 补充时同时进行的生成请求数
+            recent_size: 参与去重的最近取出的 prompt 数
+        """
+        self.generate = generate
+        self.path = path
+        self.size = size
+        self.low_water = low_water
+        self.concurrency = concurrency
+        self.recent_size = recent_size
+        self._pool: deque[MusicGenerateParam] = deque()
+        self._keys: set[str] = set()
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._refill_task: asyncio.Task | None = None
+        self._save_task: asyncio.Task | None = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    async def start(self):
+        """加载落盘的 prompt 并开始补充"""
+        for param in await asyncio.to_thread(self._load):
+            self._add(param)
+        logger.info(f"音乐prompt池已加载 {len(self._pool)} 个")
+        self._maybe_refill()
+
+    async def stop(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+        await asyncio.to_thread(self._write, list(self._pool))
+
+    async def pop(self) -> MusicGenerateParam:
+        """取出一个 prompt，池为空时直接生成"""
+        if self._pool:
+            param = self._pool.popleft()
+            key = self._key(param)
+            self._keys.discard(key)
+            self._remember(key)
+            self.hits += 1
+            self._schedule_save()
+            self._maybe_refill()
+            return param
+        self.misses += 1
+        self._maybe_refill()
+        param = self._validate(await self.generate())
+        self._remember(self._key(param))
+        return param
+
+    @staticmethod
+    def _key(param: MusicGenerateParam) -> str:
+        return normalize_text(param.prompt or "")
+
+    @staticmethod
+    def _validate(param: MusicGenerateParam) -> MusicGenerateParam:
+        param = MusicGenerateParam.model_validate(param)
+        if not param.prompt or not param.prompt.strip():
+            raise ValueError("生成的音乐prompt为空")
+        return param
+
+    def _remember(self, key: str):
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+
+    def _add(self, param: MusicGenerateParam) -> bool:
+        key = self._key(param)
+        if key in self._keys or key in self._recent:
+            self.duplicates += 1
+            return False
+        self._pool.append(param)
+        self._keys.add(key)
+        return True
+
+    def _maybe_refill(self):
+        if len(self._pool) < self.low_water and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        failures = 0
+        while len(self._pool) < self.size:
+            batch = min(self.concurrency, self.size - len(self._pool))
+            results = await asyncio.gather(*(self.generate() for _ in range(batch)), return_exceptions=True)
+            added = 0
+            for result in results:
+                if isinstance(result, BaseException):
+                    self.failures += 1
+                    logger.warning(f"预生成音乐prompt失败: {str(result)}")
+                    continue
+                try:
+                    param = self._validate(result)
+                except ValueError as e:
+                    self.failures += 1
+                    logger.warning(f"预生成的音乐prompt无效: {str(e)}")
+                    continue
+                self.generated += 1
+                added += self._add(param)
+            if added:
+                failures = 0
+                self._schedule_save()
+            else:
+                # 连续失败或全部重复时退避，避免持续消耗大模型调用
+                failures += 1
+                await asyncio.sleep(min(2 ** failures, 60))
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save())
+
+    async def _save(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await asyncio.to_thread(self._write, list(self._pool))
+            except OSError as e:
+                logger.warning(f"保存音乐prompt池失败: {str(e)}")
+
+    def _write(self, pool: list[MusicGenerateParam]):
+        # 先写临时文件再原子替换，避免进程中断留下半个文件；多个 worker 进程写同一个文件，临时文件名各不相同
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps([param.model_dump() for param in pool], ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> list[MusicGenerateParam]:
+        try:
+            return [MusicGenerateParam.model_validate(item) for item in json.loads(self.path.read_text(encoding="utf-8"))]
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            logger.warning(f"音乐prompt池文件损坏，已忽略: {str(e)}")
+            return []
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+
+from redis.asyncio import Redis
+
+from src.conf.env import settings
+
+logger = logging.getLogger(__name__)
+
+# REDIS_URL 为该值时使用进程内的替身
+LOCAL_REDIS_URL = "memory://"
+
+_redis: "Redis | LocalRedis | None" = None
+
+
+class LocalPubSub:
+    def __init__(self, redis: "LocalRedis"):
+        self._redis = redis
+        self._channels: set[str] = set()
+        self._queue: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self._redis._subscribers.setdefault(channel, set()).add(self)
+            self._channels.add(channel)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or list(self._channels):
+            subscribers = self._redis._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self._redis._subscribers[channel]
+            self._channels.discard(channel)
+
+    async def listen(self) -> AsyncIterator[dict]:
+        while self._channels:
+            yield await self._queue.get()
+
+    async def aclose(self):
+        await self.unsubscribe()
+
+
+class LocalRedis:
+    """
+    进程内的 Redis 替身，只实现本项目用到的命令：get、set（ex/nx）、delete、publish 和 pubsub
+
+    REDIS_URL=memory:// 时使用，让测试和单进程开发在没有 Redis 的环境里也走共享状态的代码路径。
+    数据不在进程间共享，不能用于多 worker 部署。
+    """
+
+    def __init__(self):
+        # 键 -> (过期时间, 值)
+        self._data: dict[str, tuple[float | None, str]] = {}
+        self._subscribers: dict[str, set[LocalPubSub]] = {}
+
+    async def get(self, name: str) -> str | None:
+        item = self._data.get(name)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    async def set(self, name: str, value: str, ex: int | None = None, nx: bool = False) -> bool | None:
+        if nx and await self.get(name) is not None:
+            return None
+        self._data[name] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def publish(self, channel: str, message: str) -> int:
+        subscribers = self._subscribers.get(channel, set())
+        for pubsub in subscribers:
+            pubsub._queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(subscribers)
+
+    def pubsub(self) -> LocalPubSub:
+        return LocalPubSub(self)
+
+    async def aclose(self):
+        self._data.clear()
+
+
+def get_redis() -> "Redis | LocalRedis | None":
+    """返回共享的 Redis 客户端，未配置 REDIS_URL 时返回None"""
+    global _redis
+    if _redis is None and settings.REDIS_URL:
+        if settings.REDIS_URL == LOCAL_REDIS_URL:
+            _redis = LocalRedis()
+            logger.info("使用进程内的Redis替身")
+        else:
+            _redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+            logger.info("已连接Redis")
+    return _redis
+
+
+def shares_state() -> bool:
+    """是否有可以在多个进程间共享状态的 Redis"""
+    return isinstance(get_redis(), Redis)
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、去掉首尾空白、合并连续空白并转小写，用于生成缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+def make_key(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    两级结果缓存
+
+    进程内 LRU 在前，配置了 Redis 时作为第二级在多个进程间共享，
+    两级使用相同的 TTL。Redis 出错时只记录日志，不影响请求。
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int, redis: Redis | None = None):
+        """
+        Args:
+            namespace: Redis 键前缀
+            ttl: 过期时间（秒）
+            maxsize: 进程内缓存条目上限
+            redis: Redis 客户端，为None时只使用进程内缓存
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.redis = redis
+        self.hits = 0
+        self.misses = 0
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        item = self._local.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._local[key]
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(f"{self.namespace}:{key}")
+            except Exception as e:
+                logger.warning(f"读取Redis缓存失败: {str(e)}")
+                value = None
+            if value is not None:
+                self._set_local(key, value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        self._set_local(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.namespace}:{key}", value, ex=int(self.ttl))
+            except Exception as e:
+                logger.warning(f"写入Redis缓存失败: {str(e)}")
+
+    async def delete(self, key: str):
+        self._local.pop(key, None)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(f"{self.namespace}:{key}")
+            except Exception as e:
+                logger.warning(f"删除Redis缓存失败: {str(e)}")
+
+    def _set_local(self, key: str, value: str):
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
@@ -0,0 +1,127 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+from src.model.policy import PolicyQaMessage, PolicySession
+
+logger = logging.getLogger(__name__)
+
+# 单条消息在 JSON 中除内容外的固定开销
+MESSAGE_OVERHEAD_BYTES = 40
+
+
+class PolicySessionStore:
+    """
+    政策问答会话存储
+
+    进程内按总字节数限制的 LRU；配置了 Redis 时以 Redis 为准，多个进程共享会话，
+    进程内的副本只在 Redis 出错时兜底。会话每保存一次重新计算过期时间。
+    消息只在末尾追加，保持历史前缀稳定；超过单个会话的大小上限时一次性丢弃
+    最早的若干轮，降到上限的四分之三，避免之后每轮都改变前缀。
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_bytes: int,
+        session_max_bytes: int,
+        redis: Redis | None = None,
+        namespace: str = "policy_session",
+    ):
+        """
+        Args:
+            ttl: 会话过期时间（秒）
+            max_bytes: 进程内缓存的总字节数上限
+            session_max_bytes: 单个会话的字节数上限
+            redis: Redis 客户端，为None时只使用进程内缓存
+            namespace: Redis 键前缀
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.redis = redis
+        self.namespace = namespace
+        # session_id -> (过期时间, 序列化后的会话)
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._local_bytes = 0
+        self.trimmed_messages = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._local)
+
+    async def create(self, messages: list[PolicyQaMessage] | None = None) -> PolicySession:
+        """创建新会话并立即保存，本轮回答失败或客户端断开时返回的会话id同样可用"""
+        session = PolicySession(session_id=uuid.uuid4().hex, messages=list(messages or []))
+        await self.save(session)
+        return session
+
+    async def get(self, session_id: str) -> PolicySession | None:
+        data = None
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(f"{self.namespace}:{session_id}")
+                if data is None:
+                    self._pop_local(session_id)
+                    return None
+            except Exception as e:
+                logger.warning(f"读取Redis会话失败: {str(e)}")
+        if data is None:
+            item = self._local.get(session_id)
+            if item is None:
+                return None
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                self._pop_local(session_id)
+                return None
+            self._local.move_to_end(session_id)
+        return PolicySession.model_validate_json(data)
+
+    async def append(self, session: PolicySession, *messages: PolicyQaMessage):
+        """在会话末尾追加消息并保存"""
+        session.messages.extend(messages)
+        await self.save(session)
+
+    async def save(self, session: PolicySession):
+        self._trim(session)
+        data = session.model_dump_json()
+        self._set_local(session.session_id, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(f"{self.namespace}:{session.session_id}", data, ex=int(self.ttl))
+            except Exception as e:
+                logger.warning(f"写入Redis会话失败: {str(e)}")
+
+    def _trim(self, session: PolicySession):
+        sizes = [len(message.content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES for message in session.messages]
+        total = sum(sizes)
+        if total <= self.session_max_bytes:
+            return
+        target = self.session_max_bytes * 3 // 4
+        drop = 0
+        # 按轮丢弃，保证剩余历史从用户消息开始
+        while drop < len(sizes) and (total > target or session.messages[drop].role != "user"):
+            total -= sizes[drop]
+            drop += 1
+        # 至少保留最新的一条消息
+        drop = min(drop, len(sizes) - 1)
+        del session.messages[:drop]
+        session.context_start = max(session.context_start - drop, 0)
+        self.trimmed_messages += drop
+        logger.info(f"会话 {session.session_id} 超出大小上限，丢弃最早的 {drop} 条消息")
+
+    def _set_local(self, session_id: str, data: str):
+        self._pop_local(session_id)
+        self._local[session_id] = (time.monotonic() + self.ttl, data)
+        self._local_bytes += len(data)
+        while self._local_bytes > self.max_bytes and len(self._local) > 1:
+            _, (_, evicted) = self._local.popitem(last=False)
+            self._local_bytes -= len(evicted)
+
+    def _pop_local(self, session_id: str):
+        item = self._local.pop(session_id, None)
+        if item is not None:
+            self._local_bytes -= len(item[1])
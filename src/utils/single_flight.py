@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Flight:
+    """
+    一次进行中的流式生成，已产出的分块全部保留，供后加入的订阅者从头回放
+
+    cumulative 为True时每个分块都是到目前为止的完整结果，只保留最新的一个
+    """
+
+    def __init__(self, cumulative: bool = False):
+        self.cumulative = cumulative
+        self.chunks: list[Any] = []
+        # 已产出的分块数，cumulative 时大于 chunks 的长度
+        self.count = 0
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: Any):
+        if self.cumulative:
+            self.chunks = [chunk]
+        else:
+            self.chunks.append(chunk)
+        self.count += 1
+        self._notify()
+
+    def finish(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def wait(self, offset: int):
+        """等到 offset 之后有新分块，或生成结束"""
+        while self.count <= offset and not self.done:
+            await self._changed.wait()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class Subscription:
+    """
+    一个订阅者读取 Flight 的流，结束、出错或关闭时退订
+
+    使用类而不是异步生成器：StreamingResponse 在客户端提前断开时可能从未开始迭代，
+    异步生成器的 finally 不会执行，而对象回收时 __del__ 总会退订。
+    """
+
+    def __init__(self, flight: Flight, leave: Callable[[], None]):
+        self._flight = flight
+        self._leave = leave
+        self._loop = asyncio.get_running_loop()
+        self._offset = 0
+        self._closed = False
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self):
+        flight = self._flight
+        try:
+            while not self._closed:
+                if flight.count > self._offset:
+                    if flight.cumulative:
+                        # 落后时跳过中间结果，直接读取最新的
+                        self._offset = flight.count
+                        return flight.chunks[-1]
+                    chunk = flight.chunks[self._offset]
+                    self._offset += 1
+                    return chunk
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    break
+                await flight.wait(self._offset)
+            raise StopAsyncIteration
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._leave()
+
+    async def aclose(self):
+        self.close()
+
+    def __del__(self):
+        # 回收可能发生在其他线程，交给事件循环退订
+        if not self._closed:
+            self._closed = True
+            try:
+                self._loop.call_soon_threadsafe(self._leave)
+            except RuntimeError:
+                pass
+
+
+class SingleFlight:
+    """
+    合并相同的进行中请求
+
+    同一个键同时只有一次上游调用：第一个调用方发起，之后相同键的调用方等待同一个结果。
+    流式结果由后台任务读取上游并分发给所有订阅者，后加入的订阅者先回放已产出的分块；
+    所有订阅者（包括发起的调用方）都断开时取消上游。调用结束后即从表中移除，不缓存结果。
+    """
+
+    def __init__(self, name: str, cumulative: bool = False):
+        """
+        Args:
+            name: 名称，用于日志和指标
+            cumulative: 流的每个分块是否都是到目前为止的完整结果（如 JSON 解析器输出的部分结果），
+                是时只保留最新的分块，后加入的订阅者从最新分块开始读取
+        """
+        self.name = name
+        self.cumulative = cumulative
+        self._calls: dict[str, asyncio.Task] = {}
+        self._flights: dict[str, Flight] = {}
+        # 实际发起的上游调用数和被合并（节省）的调用数
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._calls) + len(self._flights)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """执行 fn 并返回结果，相同键进行中时等待已有的调用"""
+        task = self._calls.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._call_done(key, done))
+        else:
+            self.coalesced += 1
+            logger.info(f"{self.name}: 合并进行中的相同请求")
+        # 某个调用方断开不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, open_stream: Callable[[], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """
+        订阅 open_stream 打开的流，相同键进行中时加入已有的流并先回放已产出的分块
+
+        等到第一个分块产出后才返回，上游在开始输出前出错时每个调用方都直接得到该异常。
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            self.upstream_calls += 1
+            flight = Flight(self.cumulative)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, open_stream))
+        else:
+            self.coalesced += 1
+            logger.info(f"{self.name}: 加入进行中的相同请求，回放 {len(flight.chunks)} 个分块")
+        # 等待第一个分块期间就计为订阅者，发起的调用方在此期间断开同样可以取消上游
+        flight.subscribers += 1
+        subscription = Subscription(flight, lambda: self._leave(key, flight))
+        try:
+            await flight.wait(0)
+            if flight.count == 0 and flight.error is not None:
+                raise flight.error
+        except BaseException:
+            subscription.close()
+            raise
+        return subscription
+
+    def _leave(self, key: str, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # 没有订阅者了，停止上游；之后的相同请求重新发起
+            self._forget(key, flight)
+            flight.task.cancel()
+
+    async def _drive(self, key: str, flight: Flight, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]):
+        try:
+            async for chunk in await open_stream():
+                flight.append(chunk)
+        except asyncio.CancelledError:
+            # 不把取消传给其他任务中还没开始读取的订阅者
+            flight.finish(RuntimeError("生成已取消"))
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            self._forget(key, flight)
+
+    def _forget(self, key: str, flight: Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _call_done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            # 所有调用方都已断开时异常无人读取，这里记录下来
+            logger.debug(f"{self.name}: 上游调用失败: {str(task.exception())}")
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import TypeVar
+
+from src.conf.env import settings
+from src.utils.metrics import sse_stream_bytes, sse_stream_duration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DONE_FRAME = "data: [DONE]\n\n"
+HEARTBEAT_FRAME = ": ping\n\n"
+
+# OpenAI chat.completion.chunk 信封中不变的部分，只有 content 需要序列化
+CHAT_CHUNK_PREFIX = 'data: {"id": "chatcmpl-xxx", "object": "chat.completion.chunk", "choices": [{"delta": {"content": '
+CHAT_CHUNK_SUFFIX = '}, "index": 0, "finish_reason": null}]}\n\n'
+
+
+def render_chat_chunk(content: str) -> str:
+    return CHAT_CHUNK_PREFIX + json.dumps(content, ensure_ascii=False) + CHAT_CHUNK_SUFFIX
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END = object()
+
+
+class SSEEncoder:
+    """
+    合并输出的 SSE 编码器
+
+    第一个元素立即发送以保证首字延迟；之后的元素先攒起来，等待时间达到
+    window 秒或累计大小达到 max_bytes 时合并成一帧发送。空闲超过
+    heartbeat 秒发送注释帧保持连接。每个流统计发送的帧数和字节数。
+    """
+
+    def __init__(
+        self,
+        name: str = "sse",
+        window: float = settings.SSE_COALESCE_WINDOW,
+        max_bytes: int = settings.SSE_COALESCE_BYTES,
+        heartbeat: float = settings.SSE_HEARTBEAT_INTERVAL,
+    ):
+        """
+        Args:
+            name: 流的名称，用于指标
+            window: 合并等待时间（秒），为0时不合并
+            max_bytes: 累计大小达到该值时立即发送
+            heartbeat: 心跳间隔（秒）
+        """
+        self.name = name
+        self.window = window
+        self.max_bytes = max_bytes
+        self.heartbeat = heartbeat
+        self.frames = 0
+        self.bytes = 0
+
+    def frame(self, frame: str) -> str:
+        """记录一帧直接发送的内容"""
+        self.frames += 1
+        self.bytes += len(frame.encode("utf-8"))
+        return frame
+
+    async def stream(
+        self,
+        source: AsyncIterator[T],
+        render: Callable[[list[T]], str | None],
+        size: Callable[[T], int] = lambda item: 0,
+    ) -> AsyncIterator[str]:
+        """
+        Args:
+            source: 上游元素流
+            render: 把一批元素渲染成一帧，返回None时跳过
+            size: 元素大小，用于 max_bytes 判断
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for item in source:
+                    queue.put_nowait(item)
+            except Exception as e:
+                queue.put_nowait(_Failure(e))
+            queue.put_nowait(_END)
+
+        started_at = time.perf_counter()
+        pump_task = asyncio.create_task(pump())
+        pending: list[T] = []
+        pending_bytes = 0
+        deadline = 0.0
+        last_sent = loop.time()
+        sent_any = False
+        try:
+            while True:
+                if queue.empty():
+                    timeout = (deadline if pending else last_sent + self.heartbeat) - loop.time()
+                    try:
+                        item = await asyncio.wait_for(queue.get(), max(timeout, 0))
+                    except TimeoutError:
+                        if pending:
+                            frame = render(pending)
+                            pending, pending_bytes = [], 0
+                            if frame is None:
+                                continue
+                        else:
+                            frame = HEARTBEAT_FRAME
+                        last_sent = loop.time()
+                        yield self.frame(frame)
+                        continue
+                else:
+                    item = queue.get_nowait()
+
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+
+                if not pending:
+                    deadline = loop.time() + self.window
+                pending.append(item)
+                pending_bytes += size(item)
+                if not sent_any or pending_bytes >= self.max_bytes or loop.time() >= deadline:
+                    frame = render(pending)
+                    pending, pending_bytes = [], 0
+                    if frame is not None:
+                        sent_any = True
+                        last_sent = loop.time()
+                        yield self.frame(frame)
+
+            if pending:
+                frame = render(pending)
+                if frame is not None:
+                    yield self.frame(frame)
+        finally:
+            pump_task.cancel()
+            sse_stream_duration.observe(time.perf_counter() - started_at, self.name)
+            sse_stream_bytes.observe(self.bytes, self.name)
+            logger.debug(f"SSE流结束: {self.frames}帧, {self.bytes}字节")
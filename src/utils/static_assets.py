@@ -0,0 +1,357 @@
+"""
+前端静态资源的构建和提供
+
+启动时构建一次，结果按内容哈希保存在构建目录中，内容不变的文件重启后直接复用，多个 worker 并发构建互不影响：
+1. 页面用到的 HTML 片段（components/ 和 agent-templates.html）以 <template data-path="..."> 内联进 index.html，
+   前端优先读取内联的模板，不再逐个请求；
+2. CSS 的本地 @import 合并进引用它的文件，CSS/JS/图片的本地引用改写为带内容哈希的文件名，
+   带哈希的地址永久缓存（immutable），入口页面为模块脚本的依赖加上 modulepreload；
+3. 文本资源预先压缩为 gzip，按 Accept-Encoding 选择；
+4. 其余地址（页面本身、原始文件名）返回 no-cache，依靠 ETag 重新验证。
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from src.utils.file_serving import IMMUTABLE_CACHE_CONTROL, serve_file
+
+logger = logging.getLogger(__name__)
+
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 内联进入口页面的 HTML 片段
+INLINE_TEMPLATES = ("components/*.html", "agent-templates.html")
+TEXT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+    ".md": "text/markdown; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+}
+# 按偏好顺序排列的预压缩编码和文件后缀
+ENCODINGS = (("gzip", ".gz"),)
+# 太小或压缩效果不明显的文件不压缩
+MIN_COMPRESS_SIZE = 256
+MIN_COMPRESS_RATIO = 0.9
+# 构建目录中不再被引用的文件保留一段时间，滚动发布时旧版本的 worker 仍可能在使用
+STALE_BUILD_SECONDS = 24 * 3600
+
+HTML_REF_RE = re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])([^"']+)\2""", re.IGNORECASE)
+CSS_URL_RE = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+CSS_IMPORT_RE = re.compile(r"""@import\s+(?:url\(\s*)?(["'])([^"']+)\1\s*\)?\s*([^;]*);""")
+JS_IMPORT_RE = re.compile(r"""(\b(?:import|export)\b[^'";]*?\bfrom\s*|\bimport\s*)(["'])([^"']+)\2""")
+MODULE_SCRIPT_RE = re.compile(r"""<script\b[^>]*\btype=["']module["'][^>]*\bsrc=["']([^"']+)["'][^>]*>""", re.IGNORECASE)
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    media_type: str
+    etag: str
+    cache_control: str = REVALIDATE_CACHE_CONTROL
+    # 编码 -> 预压缩文件
+    encodings: dict[str, Path] = field(default_factory=dict)
+
+
+def choose_encoding(accept_encoding: str | None, available: dict[str, Path]) -> str | None:
+    """按 Accept-Encoding 从预压缩的编码中选择，q 值相同时按 ENCODINGS 的顺序"""
+    if not accept_encoding or not available:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding, _ in ENCODINGS:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if coding in available and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class StaticAssets:
+    """
+    前端静态资源的 ASGI 应用，替代 StaticFiles 挂载在根路径
+
+    目录请求返回其中的 index.html；文件内容不变时 ETag 不变，跨进程、跨重启一致。
+    """
+
+    def __init__(self, source_dir: Path, build_dir: Path, index: str = "index.html", inline_templates=INLINE_TEMPLATES):
+        """
+        Args:
+            source_dir: 前端源文件目录
+            build_dir: 构建结果目录
+            index: 入口页面，内联模板并为模块脚本加上 modulepreload
+            inline_templates: 内联进入口页面的 HTML 片段（相对 source_dir 的 glob）
+        """
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.index = index
+        self.inline_templates = inline_templates
+        # 请求路径（不含开头的 /）-> 资源
+        self._assets: dict[str, StaticAsset] = {}
+        # 构建过程中的状态
+        self._urls: dict[str, str] = {}
+        self._contents: dict[str, bytes] = {}
+        self._module_deps: dict[str, list[str]] = {}
+        self._building: set[str] = set()
+        self._written: set[str] = set()
+
+    async def build(self):
+        started = time.perf_counter()
+        await asyncio.to_thread(self._build)
+        raw = sum(asset.path.stat().st_size for asset in self._assets.values())
+        logger.info(f"前端资源构建完成: {len(self._assets)} 个地址，{raw / 1024:.0f} KB，"
+                    f"耗时 {time.perf_counter() - started:.2f} 秒")
+
+    def _build(self):
+        self.build_dir.mkdir(parents=True, exist_ok=True)
+        self._urls.clear()
+        self._contents.clear()
+        self._module_deps.clear()
+        self._written.clear()
+        assets = {}
+        for path in sorted(self.source_dir.rglob("*")):
+            rel = path.relative_to(self.source_dir).as_posix()
+            if not path.is_file() or any(part.startswith(".") for part in rel.split("/")):
+                continue
+            asset = self._asset(rel)
+            assets[rel] = asset
+            fingerprinted = self._url(rel).lstrip("/")
+            if fingerprinted != rel:
+                assets[fingerprinted] = StaticAsset(
+                    asset.path, asset.media_type, asset.etag, IMMUTABLE_CACHE_CONTROL, asset.encodings
+                )
+            if posixpath.basename(rel) == "index.html":
+                directory = posixpath.dirname(rel)
+                assets[f"{directory}/" if directory else ""] = asset
+        self._assets = assets
+        self._prune()
+
+    def _asset(self, rel: str) -> StaticAsset:
+        suffix = posixpath.splitext(rel)[1].lower()
+        media_type = TEXT_TYPES.get(suffix) or mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if suffix not in TEXT_TYPES:
+            # 二进制文件直接提供源文件
+            path = self.source_dir / rel
+            stat = path.stat()
+            return StaticAsset(path, media_type, f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"')
+        content = self._content(rel)
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._store(digest, content)
+        encodings = {}
+        if len(content) >= MIN_COMPRESS_SIZE:
+            for coding, extension in ENCODINGS:
+                compressed_path = self._compress(digest, content, extension)
+                if compressed_path is not None:
+                    encodings[coding] = compressed_path
+        return StaticAsset(path, media_type, f'"{digest[:16]}"', encodings=encodings)
+
+    def _content(self, rel: str) -> bytes:
+        """改写引用后的文件内容"""
+        content = self._contents.get(rel)
+        if content is not None:
+            return content
+        raw = (self.source_dir / rel).read_bytes()
+        suffix = posixpath.splitext(rel)[1].lower()
+        self._building.add(rel)
+        try:
+            text = raw.decode("utf-8")
+            if suffix == ".css":
+                text = self._rewrite_css(rel, text)
+            elif suffix == ".js":
+                text = self._rewrite_js(rel, text)
+            elif rel == self.index:
+                text = self._rewrite_index(text)
+            content = text.encode("utf-8")
+        except UnicodeDecodeError:
+            content = raw
+        finally:
+            self._building.discard(rel)
+        self._contents[rel] = content
+        return content
+
+    def _url(self, rel: str) -> str:
+        """带内容哈希的地址，页面本身不加哈希"""
+        url = self._urls.get(rel)
+        if url is None:
+            stem, suffix = posixpath.splitext(rel)
+            if suffix.lower() == ".html":
+                url = f"/{rel}"
+            else:
+                content = self._content(rel) if suffix.lower() in TEXT_TYPES else (self.source_dir / rel).read_bytes()
+                url = f"/{stem}.{hashlib.sha256(content).hexdigest()[:10]}{suffix}"
+            self._urls[rel] = url
+        return url
+
+    def _resolve(self, base: str, ref: str) -> str | None:
+        """把 base 文件中的本地引用解析为相对 source_dir 的路径，外部或不存在的引用返回None"""
+        if not ref or ref.startswith(("#", "data:", "//")) or re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*:", ref):
+            return None
+        path = ref.split("#", 1)[0].split("?", 1)[0]
+        if not path:
+            return None
+        rel = posixpath.normpath(path.lstrip("/") if path.startswith("/") else posixpath.join(posixpath.dirname(base), path))
+        if rel.startswith("..") or not (self.source_dir / rel).is_file():
+            return None
+        return rel
+
+    def _rewrite_ref(self, base: str, ref: str) -> str:
+        rel = self._resolve(base, ref)
+        # 循环引用时保留原地址
+        if rel is None or rel in self._building:
+            return ref
+        suffix = ref[len(ref.split("#", 1)[0].split("?", 1)[0]):]
+        return self._url(rel) + suffix
+
+    def _rewrite_css(self, rel: str, text: str) -> str:
+        imports = list(CSS_IMPORT_RE.finditer(text))
+        local = [self._resolve(rel, match.group(2)) for match in imports]
+        # @import 必须位于其他规则之前，只有全部是无条件的本地导入时才能原地合并
+        if imports and all(local) and not any(match.group(3).strip() for match in imports):
+            def inline(match: re.Match) -> str:
+                imported = self._resolve(rel, match.group(2))
+                if imported in self._building:
+                    return match.group(0)
+                return self._content(imported).decode("utf-8")
+            text = CSS_IMPORT_RE.sub(inline, text)
+        else:
+            text = CSS_IMPORT_RE.sub(
+                lambda m: m.group(0).replace(m.group(2), self._rewrite_ref(rel, m.group(2))), text
+            )
+        return CSS_URL_RE.sub(lambda m: f"url({m.group(1)}{self._rewrite_ref(rel, m.group(2))}{m.group(1)})", text)
+
+    def _rewrite_js(self, rel: str, text: str) -> str:
+        deps = self._module_deps[rel] = []
+
+        def rewrite(match: re.Match) -> str:
+            dep = self._resolve(rel, match.group(3))
+            if dep is not None:
+                deps.append(dep)
+            return f"{match.group(1)}{match.group(2)}{self._rewrite_ref(rel, match.group(3))}{match.group(2)}"
+
+        return JS_IMPORT_RE.sub(rewrite, text)
+
+    def _rewrite_index(self, text: str) -> str:
+        entries = [self._resolve(self.index, match.group(1)) for match in MODULE_SCRIPT_RE.finditer(text)]
+        # 内联的片段插入到入口页面中，其中的相对地址按入口页面解析
+        templates = []
+        for pattern in self.inline_templates:
+            for path in sorted(self.source_dir.glob(pattern)):
+                rel = path.relative_to(self.source_dir).as_posix()
+                fragment = self._rewrite_html(self.index, path.read_text(encoding="utf-8"))
+                templates.append(f'<template data-path="{rel}">{fragment}</template>')
+        text = self._rewrite_html(self.index, text)
+
+        preloads = []
+        for entry in filter(None, entries):
+            for dep in self._module_closure(entry):
+                preloads.append(f'<link rel="modulepreload" href="{self._url(dep)}">')
+        if preloads:
+            text = text.replace("</head>", "    " + "\n    ".join(preloads) + "\n</head>", 1)
+        if templates:
+            text = text.replace("</body>", "\n".join(templates) + "\n</body>", 1)
+        return text
+
+    def _rewrite_html(self, base: str, text: str) -> str:
+        return HTML_REF_RE.sub(lambda m: f"{m.group(1)}{m.group(2)}{self._rewrite_ref(base, m.group(3))}{m.group(2)}", text)
+
+    def _module_closure(self, entry: str) -> list[str]:
+        """entry 静态导入的全部模块（不含 entry 本身）"""
+        seen, stack = [], [entry]
+        while stack:
+            rel = stack.pop()
+            self._url(rel)
+            for dep in self._module_deps.get(rel, ()):
+                if dep != entry and dep not in seen:
+                    seen.append(dep)
+                    stack.append(dep)
+        return seen
+
+    def _store(self, name: str, data: bytes) -> Path:
+        """按内容哈希命名写入构建目录，已存在时直接复用；先写临时文件再原子重命名"""
+        path = self.build_dir / name
+        self._written.add(name)
+        if not path.exists():
+            tmp_path = self.build_dir / f".{uuid.uuid4().hex}.tmp"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def _compress(self, digest: str, content: bytes, extension: str) -> Path | None:
+        name = digest + extension
+        path = self.build_dir / name
+        if not path.exists():
+            data = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(data) > len(content) * MIN_COMPRESS_RATIO:
+                return None
+            self._store(name, data)
+        self._written.add(name)
+        return path
+
+    def _prune(self):
+        """删除很久没有被任何构建引用的文件"""
+        now = time.time()
+        for path in self.build_dir.iterdir():
+            if path.name in self._written:
+                # 更新修改时间，标记仍在使用
+                os.utime(path)
+                continue
+            try:
+                if now - path.stat().st_mtime > STALE_BUILD_SECONDS:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return
+        request = Request(scope)
+        if request.method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            response = self.response(request)
+        await response(scope, receive, send)
+
+    def response(self, request: Request) -> Response:
+        asset = self._assets.get(request.scope["path"].lstrip("/"))
+        if asset is None:
+            return PlainTextResponse("Not Found", status_code=404)
+        return serve_asset(request, asset)
+
+
+def serve_asset(request: Request, asset: StaticAsset) -> Response:
+    """按 Accept-Encoding 提供资源本身或预压缩的版本，各版本的 ETag 不同"""
+    coding = choose_encoding(request.headers.get("accept-encoding"), asset.encodings)
+    if coding is None:
+        path, etag = asset.path, asset.etag
+    else:
+        path, etag = asset.encodings[coding], f'{asset.etag[:-1]}-{coding}"'
+    response = serve_file(request, path, asset.media_type, etag=etag, cache_control=asset.cache_control)
+    if asset.encodings:
+        response.headers["Vary"] = "Accept-Encoding"
+    if coding is not None:
+        response.headers["Content-Encoding"] = coding
+    return response
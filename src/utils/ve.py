@@ -1,21 +1,47 @@
-import volcenginesdkcore,volcenginesdkecs
-from volcenginesdkcore.rest import ApiException
-from volcenginesdkcore.interceptor import RuntimeOption
+"""
+火山引擎 SDK 配置
+
+SDK 导入较慢，且 set_default 会修改进程级的全局配置，导入本模块时不做这些事，
+第一次访问 configuration、runtime_options 或 ApiException 时才导入 SDK 并完成设置。
+"""
+import functools
+
 from src.conf.env import settings
 
-# 全局设置
-configuration = volcenginesdkcore.Configuration()
-configuration.ak = settings.VE_AK
-configuration.sk = settings.VE_SK
-configuration.debug = True
-volcenginesdkcore.Configuration.set_default(configuration)
-
-# 接口级别运行时参数设置,会覆盖全局配置
-runtime_options = RuntimeOption(
-  ak =  settings.VE_AK, 
-  sk = settings.VE_SK, 
-  client_side_validation = True, # 开启客户端校验,默认开启
-)
+
+@functools.cache
+def configure():
+    import volcenginesdkcore
+    from volcenginesdkcore.interceptor import RuntimeOption
+
+    # 全局设置
+    configuration = volcenginesdkcore.Configuration()
+    configuration.ak = settings.VE_AK
+    configuration.sk = settings.VE_SK
+    configuration.debug = True
+    volcenginesdkcore.Configuration.set_default(configuration)
+
+    # 接口级别运行时参数设置,会覆盖全局配置
+    runtime_options = RuntimeOption(
+      ak =  settings.VE_AK, 
+      sk = settings.VE_SK, 
+      client_side_validation = True, # 开启客户端校验,默认开启
+    )
+    return configuration, runtime_options
+
+
+def __getattr__(name: str):
+    if name == "configuration":
+        return configure()[0]
+    if name == "runtime_options":
+        return configure()[1]
+    if name == "ApiException":
+        from volcenginesdkcore.rest import ApiException
+        return ApiException
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# import volcenginesdkecs
 # api_instance = volcenginesdkecs.ECSApi()
 # create_command_request = volcenginesdkecs.CreateCommandRequest(
 #     command_content="ls -l",
@@ -1,9 +1,13 @@
 import json
 import asyncio
+import time
 from typing import Optional, Dict, Any, Coroutine
+from urllib.parse import urlparse
 
 import aiohttp
 
+from src.utils.admission import UpstreamOverloaded, song_limiter
+from src.utils.metrics import upstream_request_duration
 from src.utils.ve_music import Sign
 from src.conf.env import settings
 
@@ -21,166 +25,160 @@ def get_response(response_text: str) -> tuple[int, str, Dict[str, Any], Dict[str
         'ResponseMetadata')
 
 
-async def generate_music_async(
-    prompt: str,
-    gender: str = None,
-    genre: str = None,
-    mood: str = None,
+API_VERSION = "2024-08-12"
+API_REGION = "cn-beijing"
+API_SERVICE = "imagination"
+API_PATH = "/"
+
+
+async def call_api(
+    session: aiohttp.ClientSession,
+    action: str,
+    body: Dict[str, Any],
     ak: Optional[str] = None,
     sk: Optional[str] = None,
-    query_interval: float = 5.0,
-    verbose: bool = True
-) -> tuple[Any, Any] | None:
+    verbose: bool = False
+) -> Dict[str, Any]:
     """
-    异步生成音乐
+    签名并调用一次音乐生成 OpenAPI
 
     Args:
-        prompt: 音乐生成提示词
-        gender: 歌曲性别 (Male/Female)
-        genre: 音乐风格 (Pop等)
-        mood: 情绪 (Happy等)
+        session: 复用的 aiohttp 会话
+        action: 接口名 (GenSongForTime/QuerySong)
+        body: 请求体
         ak: Access Key (默认从settings获取)
         sk: Secret Key (默认从settings获取)
-        query_interval: 查询间隔时间（秒）
         verbose: 是否打印详细日志
 
     Returns:
-        str: 生成的音频URL，失败返回None
+        dict: 响应中的 Result 字段
 
     Raises:
-        RuntimeError: 当API调用失败时
+        RuntimeError: 当HTTP或API调用失败时
     """
-    # 使用默认的ak/sk如果没有提供
     if ak is None:
         ak = settings.VE_AK
     if sk is None:
         sk = settings.VE_SK
 
-    # API配置
-    action = "GenSongForTime"
-    version = "2024-08-12"
-    region = "cn-beijing"
-    service = 'imagination'
-    host = "open.volcengineapi.com"
-    path = "/"
-    query = {'Action': action, 'Version': version}
+    query = {'Action': action, 'Version': API_VERSION}
+    payload = json.dumps(body)
+    signer = Sign.Signer(ak, sk, service=API_SERVICE, region=API_REGION)
+    host = urlparse(settings.VE_MUSIC_ENDPOINT).netloc
+    headers = signer.sign_headers("POST", host, query, payload)
+    if verbose:
+        print(f"===>authorization:{headers['Authorization']}")
+
+    url = f"{settings.VE_MUSIC_ENDPOINT.rstrip('/')}{API_PATH}?Action={action}&Version={API_VERSION}"
+    started_at = time.perf_counter()
+    async with session.post(url, data=payload, headers=headers) as response:
+        upstream_request_duration.observe(time.perf_counter() - started_at, "volc_music", action)
+        if response.status == 429:
+            # 上游限流，暂停提交新的生成请求
+            retry_after = response.headers.get("Retry-After")
+            retry_after = float(retry_after) if retry_after and retry_after.isdigit() else 1.0
+            song_limiter.throttle(retry_after)
+            raise UpstreamOverloaded(song_limiter.name, retry_after)
+        if not response.ok:
+            raise RuntimeError(f"HTTP Error: {response.status}")
+        response_text = await response.text()
+
+    if verbose:
+        print(f"===>Response:{response_text}")
+
+    code, message, result, response_metadata = get_response(response_text)
+    if code != STATUS_CODE_SUCCESS:
+        raise RuntimeError(f"API Error: {message}")
+    return result
 
-    # 请求体
+
+async def submit_song(
+    session: aiohttp.ClientSession,
+    prompt: str,
+    gender: str = None,
+    genre: str = None,
+    mood: str = None,
+    ak: Optional[str] = None,
+    sk: Optional[str] = None,
+    verbose: bool = False
+) -> tuple[str, float]:
+    """
+    提交音乐生成任务
+
+    Returns:
+        tuple: (TaskID, 预计等待时间（秒）)
+    """
     body = {
         'Prompt': prompt,
         'Gender': gender,
         'Genre': genre,
         'Mood': mood,
     }
+    result = await call_api(session, "GenSongForTime", body, ak=ak, sk=sk, verbose=verbose)
+    return result['TaskID'], result['PredictedWaitTime']
 
-    # 准备请求头
-    x_content_sha256 = Sign.hash_sha256(json.dumps(body))
-    headers = {
-        "Content-Type": 'application/json',
-        'Host': host,
-        'X-Date': Sign.get_x_date(),
-        'X-Content-Sha256': x_content_sha256
-    }
-
-    # 获取签名
-    authorization = Sign.get_authorization(
-        "POST", headers=headers, query=query,
-        service=service, region=region, ak=ak, sk=sk
-    )
-
-    if verbose:
-        print(f"===>authorization:{authorization}")
-
-    headers["Authorization"] = authorization
-
-    # 发送生成请求
-    url = Sign.get_url(host, path, action, version)
 
-    async with aiohttp.ClientSession() as session:
-        # 发送音乐生成请求
-        async with session.post(url, data=json.dumps(body), headers=headers) as response:
-            if not response.ok:
-                raise RuntimeError(f"HTTP Error: {response.status}")
-
-            response_text = await response.text()
-            if verbose:
-                print(f"===>Response:{response_text}")
-
-            # 解析响应
-            code, message, result, response_metadata = get_response(response_text)
+async def query_song(
+    session: aiohttp.ClientSession,
+    task_id: str,
+    ak: Optional[str] = None,
+    sk: Optional[str] = None,
+    verbose: bool = False
+) -> Dict[str, Any]:
+    """
+    查询音乐生成任务，返回包含 Status/Progress/SongDetail 的 Result
+    """
+    return await call_api(session, "QuerySong", {'TaskID': task_id}, ak=ak, sk=sk, verbose=verbose)
 
-            if code != STATUS_CODE_SUCCESS:
-                raise RuntimeError(f"API Error: {message}")
 
-            task_id = result['TaskID']
-            predicted_wait_time = result['PredictedWaitTime'] + 5  # 预计等待时间，单位：秒
+async def generate_music_async(
+    prompt: str,
+    gender: str = None,
+    genre: str = None,
+    mood: str = None,
+    ak: Optional[str] = None,
+    sk: Optional[str] = None,
+    verbose: bool = True
+) -> tuple[Any, Any]:
+    """
+    异步生成音乐
 
-            if verbose:
-                print('===>waiting...')
+    Args:
+        prompt: 音乐生成提示词
+        gender: 歌曲性别 (Male/Female)
+        genre: 音乐风格 (Pop等)
+        mood: 情绪 (Happy等)
+        ak: Access Key (默认从settings获取)
+        sk: Secret Key (默认从settings获取)
+        verbose: 是否打印详细日志
 
-            # 等待预测时间
-            await asyncio.sleep(predicted_wait_time)
+    Returns:
+        tuple: (生成的音频URL, 歌词时间轴)
 
-            # 准备查询请求
-            query_body = {'TaskID': task_id}
-            x_content_sha256 = Sign.hash_sha256(json.dumps(query_body))
+    Raises:
+        RuntimeError: 当API调用失败时
+    """
+    # 轮询器与生成模块互相引用，延迟导入
+    from src.utils.ve_music.SongPoller import query_song_poller
 
-            query_headers = headers.copy()
-            query_headers['X-Content-Sha256'] = x_content_sha256
-            query_headers['X-Date'] = Sign.get_x_date()
+    async with aiohttp.ClientSession() as session:
+        # 发送音乐生成请求
+        task_id, predicted_wait_time = await submit_song(
+            session, prompt, gender, genre, mood, ak=ak, sk=sk, verbose=verbose
+        )
 
-            query_action = 'QuerySong'
-            query["Action"] = query_action
+    if verbose:
+        print('===>waiting...')
 
-            authorization = Sign.get_authorization(
-                "POST", headers=query_headers, query=query,
-                service=service, region=region, ak=ak, sk=sk
-            )
+    # 由共享的轮询器按进度自适应查询结果
+    song_detail = await query_song_poller.wait(task_id, predicted_wait_time)
 
-            if verbose:
-                print(f"===>authorization:{authorization}")
-
-            query_headers["Authorization"] = authorization
-            query_url = Sign.get_url(host, path, query_action, version)
-
-            # 轮询查询结果
-            song_detail = None
-            while True:
-                async with session.post(query_url, data=json.dumps(query_body), headers=query_headers) as query_response:
-                    if not query_response.ok:
-                        raise RuntimeError(f"HTTP Error: {query_response.status}")
-
-                    query_response_text = await query_response.text()
-                    code, message, result, response_metadata = get_response(query_response_text)
-
-                    progress = result.get('Progress')
-                    status = result.get('Status')
-
-                    if status == QUERY_STATUS_CODE_FAILED:
-                        raise RuntimeError(f"Generation failed: {query_response_text}")
-                    elif status == QUERY_STATUS_CODE_SUCCESS:
-                        song_detail = result.get('SongDetail')
-                        if verbose:
-                            print(f"===>query finished:{progress}")
-                        break
-                    elif status == QUERY_STATUS_CODE_WAITING or status == QUERY_STATUS_CODE_HANDING:
-                        if verbose:
-                            print(f"===>Progress:{progress}")
-                        await asyncio.sleep(query_interval)
-                    else:
-                        if verbose:
-                            print(f"Unknown status: {query_response_text}")
-                        break
-
-            # 返回音频URL
-            if song_detail is not None:
-                audio_url = song_detail.get('AudioUrl')
-                audio_captions = song_detail.get('Captions')
-                if verbose:
-                    print(f"===>AudioUrl:{audio_url}")
-                return audio_url, audio_captions
-            else:
-                return None
+    # 返回音频URL
+    audio_url = song_detail.get('AudioUrl')
+    audio_captions = song_detail.get('Captions')
+    if verbose:
+        print(f"===>AudioUrl:{audio_url}")
+    return audio_url, audio_captions
 
 
 # 保持原有的同步函数作为向后兼容
@@ -191,9 +189,8 @@ def generate_music_sync(
     mood: str = "Happy",
     ak: Optional[str] = None,
     sk: Optional[str] = None,
-    query_interval: float = 5.0,
     verbose: bool = True
-) -> Optional[str]:
+) -> tuple[Any, Any]:
     """
     同步版本的生成音乐函数（内部使用asyncio运行）
     """
@@ -204,7 +201,6 @@ def generate_music_sync(
         mood=mood,
         ak=ak,
         sk=sk,
-        query_interval=query_interval,
         verbose=verbose
     ))
 
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from src.conf.env import settings
+from src.utils.ve_music.GenSongDemo import (
+    query_song,
+    QUERY_STATUS_CODE_WAITING,
+    QUERY_STATUS_CODE_HANDING,
+    QUERY_STATUS_CODE_SUCCESS,
+    QUERY_STATUS_CODE_FAILED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedTask:
+    def __init__(self, task_id: str, predicted_wait_time: float, now: float, first_delay: float):
+        self.task_id = task_id
+        self.predicted_wait_time = predicted_wait_time
+        self.started_at = now
+        self.next_query_at = now + first_delay
+        self.progress = 0
+        self.stalls = 0
+        self.errors = 0
+        self.waiters = 0
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.listeners: set[asyncio.Queue] = set()
+
+
+class QuerySongPoller:
+    """
+    QuerySong 多路轮询器
+
+    所有等待中的 TaskID 由同一个协程轮询：根据 Progress 和 PredictedWaitTime
+    估算剩余时间来安排下一次查询，进度停滞时退避，接近完成时加密查询，
+    结果通过 future 唤醒等待方。没有任务时轮询协程自动退出。
+    """
+
+    def __init__(
+        self,
+        query: Callable[..., Awaitable[Dict[str, Any]]] = query_song,
+        min_interval: float = settings.MUSIC_POLL_MIN_INTERVAL,
+        max_interval: float = settings.MUSIC_POLL_MAX_INTERVAL,
+        stall_backoff: float = settings.MUSIC_POLL_STALL_BACKOFF,
+        near_completion: int = 90,
+        max_errors: int = 5,
+    ):
+        """
+        Args:
+            query: 查询函数，签名同 query_song
+            min_interval: 最小查询间隔（秒）
+            max_interval: 最大查询间隔（秒）
+            stall_backoff: 进度停滞时每次查询间隔的放大倍数
+            near_completion: 进度达到该值后按最小间隔查询
+            max_errors: 连续查询出错次数上限，超过后任务失败
+        """
+        self.query = query
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stall_backoff = stall_backoff
+        self.near_completion = near_completion
+        self.max_errors = max_errors
+        self.query_count = 0
+        self._tasks: dict[str, _TrackedTask] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+
+    async def wait(
+        self,
+        task_id: str,
+        predicted_wait_time: Optional[float] = None,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        等待任务完成
+
+        Args:
+            task_id: GenSongForTime 返回的 TaskID
+            predicted_wait_time: 预计等待时间（秒），未知时按最大间隔估算
+            on_progress: 进度变化时的回调
+
+        Returns:
+            dict: SongDetail
+
+        Raises:
+            RuntimeError: 生成失败或查询持续出错时
+        """
+        tracked = self._track(task_id, predicted_wait_time)
+        tracked.waiters += 1
+        queue: asyncio.Queue[int | None] = asyncio.Queue()
+        if on_progress is not None:
+            tracked.listeners.add(queue)
+        try:
+            if on_progress is not None:
+                while (progress := await queue.get()) is not None:
+                    await on_progress(progress)
+            return await asyncio.shield(tracked.future)
+        finally:
+            tracked.listeners.discard(queue)
+            tracked.waiters -= 1
+            # 所有等待方都已离开时停止轮询该任务
+            if tracked.waiters == 0:
+                if self._tasks.get(task_id) is tracked:
+                    del self._tasks[task_id]
+                if tracked.future.done():
+                    # 没有人再读取结果，取出异常避免 "exception was never retrieved"
+                    if not tracked.future.cancelled():
+                        tracked.future.exception()
+                else:
+                    tracked.future.cancel()
+
+    async def aclose(self):
+        """停止轮询并取消所有等待"""
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for tracked in list(self._tasks.values()):
+            tracked.future.cancel()
+            self._finish(tracked)
+
+    def _track(self, task_id: str, predicted_wait_time: Optional[float]) -> _TrackedTask:
+        tracked = self._tasks.get(task_id)
+        if tracked is None:
+            predicted_wait_time = predicted_wait_time or self.max_interval
+            first_delay = min(max(predicted_wait_time / 2, self.min_interval), self.max_interval)
+            now = asyncio.get_running_loop().time()
+            tracked = _TrackedTask(task_id, predicted_wait_time, now, first_delay)
+            self._tasks[task_id] = tracked
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return tracked
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        session = aiohttp.ClientSession()
+        try:
+            while self._tasks:
+                now = loop.time()
+                due = [tracked for tracked in self._tasks.values() if tracked.next_query_at <= now]
+                if due:
+                    await asyncio.gather(*(self._poll(session, tracked) for tracked in due))
+                    continue
+                next_query_at = min(tracked.next_query_at for tracked in self._tasks.values())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_query_at - now)
+                except TimeoutError:
+                    pass
+        finally:
+            # 先同步地让出 runner，保证之后新加入的任务会启动新的轮询协程
+            self._runner = None
+            await session.close()
+
+    async def _poll(self, session: aiohttp.ClientSession, tracked: _TrackedTask):
+        loop = asyncio.get_running_loop()
+        self.query_count += 1
+        try:
+            result = await self.query(session, tracked.task_id)
+        except Exception as e:
+            tracked.errors += 1
+            logger.warning(f"QuerySong查询失败({tracked.errors}/{self.max_errors}): {tracked.task_id}: {str(e)}")
+            if tracked.errors >= self.max_errors:
+                self._finish(tracked, exception=RuntimeError(f"QuerySong failed: {str(e)}"))
+            else:
+                delay = self.min_interval * self.stall_backoff ** tracked.errors
+                tracked.next_query_at = loop.time() + min(delay, self.max_interval)
+            return
+        tracked.errors = 0
+
+        status = result.get('Status')
+        progress = result.get('Progress') or 0
+        if status == QUERY_STATUS_CODE_FAILED:
+            self._finish(tracked, exception=RuntimeError(f"Generation failed: {result}"))
+        elif status == QUERY_STATUS_CODE_SUCCESS:
+            self._finish(tracked, result=result.get('SongDetail') or {})
+        elif status == QUERY_STATUS_CODE_WAITING or status == QUERY_STATUS_CODE_HANDING:
+            self._schedule(tracked, progress, loop.time())
+        else:
+            self._finish(tracked, exception=RuntimeError(f"Unknown status: {result}"))
+
+    def _schedule(self, tracked: _TrackedTask, progress: int, now: float):
+        if progress > tracked.progress:
+            tracked.progress = progress
+            tracked.stalls = 0
+            for queue in tracked.listeners:
+                queue.put_nowait(progress)
+        else:
+            tracked.stalls += 1
+
+        # 有进度时按已用时间外推剩余时间，否则参考 PredictedWaitTime
+        elapsed = now - tracked.started_at
+        if 0 < progress < 100:
+            remaining = elapsed * (100 - progress) / progress
+        else:
+            remaining = tracked.predicted_wait_time - elapsed
+        if progress >= self.near_completion or remaining <= self.min_interval:
+            interval = self.min_interval
+        else:
+            interval = remaining / 2
+        interval *= self.stall_backoff ** tracked.stalls
+        tracked.next_query_at = now + min(max(interval, self.min_interval), self.max_interval)
+
+    def _finish(self, tracked: _TrackedTask, result: Any = None, exception: Exception | None = None):
+        if self._tasks.get(tracked.task_id) is tracked:
+            del self._tasks[tracked.task_id]
+        if not tracked.future.done():
+            if exception is not None:
+                tracked.future.set_exception(exception)
+            else:
+                tracked.future.set_result(result)
+        for queue in tracked.listeners:
+            queue.put_nowait(None)
+
+
+query_song_poller = QuerySongPoller()